@@ -2,18 +2,34 @@
 Soulpull MVP — Django Admin Configuration
 """
 
-from django.contrib import admin
+from typing import Optional
+
+from django.contrib import admin, messages
+from django.db import transaction
+from django.utils import timezone
+from django.utils.html import format_html_join
 
 from .models import (
+    REFERRAL_SLOT_LIMIT,
     AuthorCode,
     IdempotencyKey,
+    JettonWalletCache,
     Participation,
     ParticipationStatus,
     PayoutRequest,
+    PointsLedgerEntry,
+    ReferralNode,
     RiskEvent,
+    SystemFlag,
+    TonApiCursor,
     TonProofPayload,
     UserProfile,
+    WebhookEvent,
 )
+from .services import leaderboard, referral_tree, system_flags
+from .services.participations import SLOT_STATUSES, record_referral_transition, reserve_referral_slot
+
+ADMIN_TREE_DEPTH = 3
 
 
 @admin.register(UserProfile)
@@ -27,6 +43,18 @@ class UserProfileAdmin(admin.ModelAdmin):
     )
     search_fields = ("telegram_id", "username", "wallet")
     list_filter = ("created_at",)
+    # Очки меняются только через журнал (PointsLedgerEntry, reason ADJUSTMENT)
+    exclude = ("points",)
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.save()
+            return
+        # Полный save() записал бы points, прочитанные при открытии формы,
+        # поверх того, что rollup_points свернул с тех пор
+        obj.save(update_fields=[
+            f.name for f in obj._meta.concrete_fields if not f.primary_key and f.name != "points"
+        ])
 
 
 @admin.register(AuthorCode)
@@ -40,16 +68,138 @@ class ParticipationAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "referrer", "status", "tx_hash", "created_at", "confirmed_at")
     search_fields = ("tx_hash", "user__telegram_id", "referrer__telegram_id")
     list_filter = ("status",)
-    
+
     actions = ["confirm_selected", "reject_selected"]
-    
+
     @admin.action(description="Confirm selected participations")
     def confirm_selected(self, request, queryset):
-        queryset.update(status=ParticipationStatus.CONFIRMED)
-    
+        self._report(request, ParticipationStatus.CONFIRMED, *_set_status(queryset, ParticipationStatus.CONFIRMED))
+
     @admin.action(description="Reject selected participations")
     def reject_selected(self, request, queryset):
-        queryset.update(status=ParticipationStatus.REJECTED)
+        self._report(request, ParticipationStatus.REJECTED, *_set_status(queryset, ParticipationStatus.REJECTED))
+
+    def _report(self, request, status: str, changed: int, skipped: dict[int, str]) -> None:
+        self.message_user(request, f"{changed} participation(s) marked {status}.", messages.SUCCESS)
+        if skipped:
+            details = ", ".join(f"#{pk}: {reason}" for pk, reason in sorted(skipped.items()))
+            self.message_user(request, f"{len(skipped)} skipped — {details}", messages.WARNING)
+
+
+# Из каких статусов admin может перевести участие
+ADMIN_TRANSITIONS = {
+    ParticipationStatus.CONFIRMED: (ParticipationStatus.NEW, ParticipationStatus.PENDING, ParticipationStatus.EXPIRED),
+    ParticipationStatus.REJECTED: (ParticipationStatus.NEW, ParticipationStatus.PENDING, ParticipationStatus.CONFIRMED),
+}
+
+
+def _set_status(queryset, status: str) -> tuple[int, dict[int, str]]:
+    """
+    Массовая смена статуса вместе со счётчиками рефереров.
+
+    Каждая запись переводится условным UPDATE ... WHERE status=<прочитанный>
+    в своём savepoint. Участие, которое возвращается в слот реферера
+    (EXPIRED → CONFIRMED), сначала занимает слот тем же
+    reserve_referral_slot, что и /intent; нет слота — запись пропускается.
+
+    Returns:
+        (число переведённых, {id: причина} пропущенных)
+    """
+    allowed = ADMIN_TRANSITIONS[status]
+    changed, skipped = 0, {}
+    for pk, user_id, referrer_id, old in queryset.values_list("id", "user_id", "referrer_id", "status"):
+        if old == status:
+            continue
+        if old not in allowed:
+            skipped[pk] = f"{old} cannot become {status}"
+            continue
+        with transaction.atomic():
+            counted_old = old
+            if old not in SLOT_STATUSES and status in SLOT_STATUSES:
+                reason = _reclaim_slot(pk, user_id, referrer_id)
+                if reason:
+                    skipped[pk] = reason
+                    transaction.set_rollback(True)
+                    continue
+                # Слот уже занят reserve_referral_slot, как при None → NEW
+                counted_old = ParticipationStatus.NEW
+            fields = {"status": status}
+            if status == ParticipationStatus.CONFIRMED:
+                fields["confirmed_at"] = timezone.now()
+            elif old == ParticipationStatus.CONFIRMED:
+                # Счётчики слотов держит только CONFIRMED участие реферера
+                fields["used_slots"] = fields["confirmed_l1"] = 0
+            if not Participation.objects.filter(pk=pk, status=old).update(**fields):
+                skipped[pk] = "changed concurrently"
+                transaction.set_rollback(True)
+                continue
+            record_referral_transition(referrer_id, counted_old, status)
+            UserProfile.bump_me_version(user_id, referrer_id)
+            if status == ParticipationStatus.CONFIRMED:
+                system_flags.set_flag(system_flags.SEEDED)
+            delta = referral_tree.volume_delta(old, status)
+            referral_tree.record_volume(user_id, delta)
+            leaderboard.record(referrer_id, leaderboard.L1, delta)
+        changed += 1
+    return changed, skipped
+
+
+def _reclaim_slot(pk: int, user_id: int, referrer_id: Optional[int]) -> str:
+    """Занять слот для участия, вернувшегося в SLOT_STATUSES; "" — успех, иначе причина пропуска."""
+    if Participation.objects.filter(user_id=user_id, status__in=SLOT_STATUSES).exclude(pk=pk).exists():
+        return "user already has an active participation"
+    if not referrer_id:
+        return ""
+    holder_id = (
+        Participation.objects.filter(user_id=referrer_id, status=ParticipationStatus.CONFIRMED)
+        .values_list("id", flat=True)
+        .first()
+    )
+    if holder_id is None:
+        return "referrer is not confirmed"
+    if not reserve_referral_slot(holder_id):
+        return f"referrer has no free slots ({REFERRAL_SLOT_LIMIT}/{REFERRAL_SLOT_LIMIT})"
+    return ""
+
+
+@admin.register(ReferralNode)
+class ReferralNodeAdmin(admin.ModelAdmin):
+    list_display = ("user", "parent", "depth", "team_size", "team_volume")
+    list_select_related = ("user", "parent")
+    search_fields = ("user__telegram_id", "parent__telegram_id")
+    readonly_fields = ("user", "parent", "depth", "team_size", "team_volume", "downline")
+
+    @admin.display(description=f"Downline (depth ≤ {ADMIN_TREE_DEPTH})")
+    def downline(self, obj):
+        rows = referral_tree.subtree(obj.user_id, ADMIN_TREE_DEPTH)
+        return format_html_join(
+            "\n", "<div>{}{} — team {}, volume {}</div>",
+            (
+                ("\u2003" * (r.depth - 1), r.descendant, r.descendant.referral_node.team_size, r.descendant.referral_node.team_volume)
+                for r in rows
+            ),
+        ) or "—"
+
+
+@admin.register(PointsLedgerEntry)
+class PointsLedgerEntryAdmin(admin.ModelAdmin):
+    """Append-only: новые записи (ADJUSTMENT) можно добавлять, менять и удалять — нет."""
+    list_display = ("id", "user", "amount", "reason", "participation", "created_at", "rolled_up_at")
+    list_select_related = ("user",)
+    search_fields = ("user__telegram_id",)
+    list_filter = ("reason",)
+    raw_id_fields = ("user", "participation")
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SystemFlag)
+class SystemFlagAdmin(admin.ModelAdmin):
+    list_display = ("key", "set_at")
 
 
 @admin.register(PayoutRequest)
@@ -77,3 +227,22 @@ class TonProofPayloadAdmin(admin.ModelAdmin):
 class IdempotencyKeyAdmin(admin.ModelAdmin):
     list_display = ("key", "created_at")
     search_fields = ("key",)
+
+
+@admin.register(TonApiCursor)
+class TonApiCursorAdmin(admin.ModelAdmin):
+    list_display = ("account", "last_lt", "last_event_id", "resume_before_lt", "updated_at")
+    search_fields = ("account",)
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ("event_id", "source", "account_id", "lt", "received_at")
+    search_fields = ("event_id", "account_id")
+    list_filter = ("source",)
+
+
+@admin.register(JettonWalletCache)
+class JettonWalletCacheAdmin(admin.ModelAdmin):
+    list_display = ("owner_raw", "master_raw", "jetton_wallet", "created_at")
+    search_fields = ("owner_raw", "jetton_wallet")
@@ -0,0 +1,50 @@
+"""
+manage.py confirm_usdt_payments — автоподтверждение участий по USDT переводам.
+
+Пример (sidecar рядом с gunicorn):
+    python manage.py confirm_usdt_payments --loop --interval 5
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.tonapi import TonApiError
+from api.services.usdt_payments import confirm_usdt_payments, usdt_master, usdt_receiver
+
+
+class Command(BaseCommand):
+    help = "Confirm open participations paid with a USDT JettonTransfer (Soulpull:<id> comment)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--receiver", default="", help="Receiver owner address (default: RECEIVER_WALLET)")
+        parser.add_argument("--limit", type=int, default=100, help="Events per TonAPI page")
+        parser.add_argument("--max-pages", type=int, default=20, help="Max pages to scan back per pass")
+        parser.add_argument("--loop", action="store_true", help="Run forever")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between passes in --loop mode")
+
+    def handle(self, *args, **options):
+        receiver = (options["receiver"] or usdt_receiver()).strip()
+        if not receiver:
+            raise CommandError("RECEIVER_WALLET is not configured")
+        if not usdt_master():
+            raise CommandError("USDT_JETTON_MASTER is not configured")
+
+        while True:
+            try:
+                result = confirm_usdt_payments(
+                    receiver, limit=options["limit"], max_pages=options["max_pages"],
+                )
+                if result.confirmed or result.rejected or options["verbosity"] > 1:
+                    self.stdout.write(
+                        f"[USDT] open={result.open} fetched={result.fetched} "
+                        f"confirmed={len(result.confirmed)} rejected={len(result.rejected)}"
+                    )
+            except TonApiError as e:
+                self.stderr.write(f"[USDT] TonAPI error: {e}")
+                if not options["loop"]:
+                    raise CommandError(str(e))
+
+            if not options["loop"]:
+                return
+            time.sleep(max(0.1, options["interval"]))
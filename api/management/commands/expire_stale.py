@@ -0,0 +1,31 @@
+"""
+manage.py expire_stale — плановое истечение PaymentOrder и NEW Participation.
+
+Пример (cron или sidecar):
+    python manage.py expire_stale --loop --interval 60
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.services.expiry import EXPIRY_CHUNK_SIZE, sweep_expired
+
+
+class Command(BaseCommand):
+    help = "Expire overdue pending PaymentOrders and release stale NEW participations"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=EXPIRY_CHUNK_SIZE, help="Rows per UPDATE")
+        parser.add_argument("--loop", action="store_true", help="Run forever")
+        parser.add_argument("--interval", type=float, default=60.0, help="Seconds between passes in --loop mode")
+
+    def handle(self, *args, **options):
+        while True:
+            result = sweep_expired(chunk_size=max(1, options["chunk_size"]))
+            if result.orders or result.participations or options["verbosity"] > 1:
+                self.stdout.write(f"[Expiry] orders={result.orders} participations={result.participations}")
+
+            if not options["loop"]:
+                return
+            time.sleep(max(0.1, options["interval"]))
@@ -0,0 +1,50 @@
+"""
+manage.py ingest_payments — фоновый воркер проверки PaymentOrder через TonAPI.
+
+Пример (sidecar рядом с gunicorn):
+    python manage.py ingest_payments --loop --interval 2
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.payment_ingest import ingest_receiver_events, receiver_address
+from api.services.tonapi import TonApiError
+
+
+class Command(BaseCommand):
+    help = "Tail receiver wallet events from TonAPI and mark matching PaymentOrders as paid"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--receiver", default="", help="Receiver address (default: PAYMENT_RECEIVER_TON)")
+        parser.add_argument("--limit", type=int, default=100, help="Events per TonAPI page")
+        parser.add_argument("--max-pages", type=int, default=20, help="Max pages to scan back per pass")
+        parser.add_argument("--loop", action="store_true", help="Run forever")
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds between passes in --loop mode")
+
+    def handle(self, *args, **options):
+        receiver = (options["receiver"] or receiver_address()).strip()
+        if not receiver:
+            raise CommandError("PAYMENT_RECEIVER_TON is not configured")
+
+        while True:
+            try:
+                result = ingest_receiver_events(
+                    receiver, limit=options["limit"], max_pages=options["max_pages"],
+                )
+                if not result.complete:
+                    self.stderr.write("[Ingest] scan hit --max-pages; cursor kept, older events will be rescanned")
+                if result.new_events or options["verbosity"] > 1:
+                    self.stdout.write(
+                        f"[Ingest] fetched={result.fetched} new={result.new_events} "
+                        f"paid={len(result.paid)} cursor_lt={result.cursor_lt}"
+                    )
+            except TonApiError as e:
+                self.stderr.write(f"[Ingest] TonAPI error: {e}")
+                if not options["loop"]:
+                    raise CommandError(str(e))
+
+            if not options["loop"]:
+                return
+            time.sleep(max(0.1, options["interval"]))
@@ -0,0 +1,20 @@
+"""
+manage.py rebuild_leaderboard — пересчитать лидерборды из participations и user_profiles.
+
+Нужен после правки points в admin или записи мимо services.leaderboard.record.
+
+Пример:
+    python manage.py rebuild_leaderboard
+"""
+
+from django.core.management.base import BaseCommand
+
+from api.services.leaderboard import rebuild_leaderboard
+
+
+class Command(BaseCommand):
+    help = "Rebuild leaderboard entries and score buckets"
+
+    def handle(self, *args, **options):
+        entries = rebuild_leaderboard()
+        self.stdout.write(f"[Leaderboard] entries={entries}")
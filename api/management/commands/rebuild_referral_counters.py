@@ -0,0 +1,32 @@
+"""
+manage.py rebuild_referral_counters — сверка used_slots / confirmed_l1 с participations.
+
+Пример:
+    python manage.py rebuild_referral_counters --check   # только отчёт, exit 1 при расхождениях
+    python manage.py rebuild_referral_counters           # отчёт + исправление
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.participations import rebuild_referral_counters
+
+
+class Command(BaseCommand):
+    help = "Verify and repair denormalized referral counters (used_slots, confirmed_l1)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Report drift without fixing it")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Rows per bulk UPDATE")
+
+    def handle(self, *args, **options):
+        drift = rebuild_referral_counters(fix=not options["check"], chunk_size=max(1, options["chunk_size"]))
+        for d in drift:
+            if options["verbosity"] > 1 or len(drift) <= 50:
+                self.stdout.write(
+                    f"participation #{d.participation_id} (user {d.user_id}): "
+                    f"used_slots {d.used_slots[0]}→{d.used_slots[1]}, "
+                    f"confirmed_l1 {d.confirmed_l1[0]}→{d.confirmed_l1[1]}"
+                )
+        if options["check"] and drift:
+            raise CommandError(f"{len(drift)} participations with drifted referral counters")
+        self.stdout.write(f"[Counters] drifted={len(drift)} fixed={0 if options['check'] else len(drift)}")
@@ -0,0 +1,25 @@
+"""
+manage.py rebuild_referral_tree — пересобрать дерево рефералов из participations.
+
+Один потоковый проход по participations (в порядке создания), затем
+ReferralNode / ReferralClosure пишутся пачками в одной транзакции.
+migrate 0016 строит дерево сам; команда — для подозрения на расхождения.
+
+Пример:
+    python manage.py rebuild_referral_tree --chunk-size 1000
+"""
+
+from django.core.management.base import BaseCommand
+
+from api.services.referral_tree import TREE_BATCH_SIZE, rebuild_referral_tree
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized referral tree (closure table and subtree aggregates)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=TREE_BATCH_SIZE, help="Rows per read and bulk INSERT")
+
+    def handle(self, *args, **options):
+        nodes = rebuild_referral_tree(chunk_size=max(1, options["chunk_size"]))
+        self.stdout.write(f"[Tree] nodes={nodes}")
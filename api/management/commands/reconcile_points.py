@@ -0,0 +1,27 @@
+"""
+manage.py reconcile_points — сверка UserProfile.points с журналом очков.
+
+Пример:
+    python manage.py reconcile_points --check   # только отчёт, exit 1 при расхождениях
+    python manage.py reconcile_points           # отчёт + исправление по журналу
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.points import reconcile_points
+
+
+class Command(BaseCommand):
+    help = "Verify user points against the points ledger and repair drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Report drift without fixing it")
+
+    def handle(self, *args, **options):
+        drift = reconcile_points(fix=not options["check"])
+        for d in drift:
+            if options["verbosity"] > 1 or len(drift) <= 50:
+                self.stdout.write(f"user {d.user_id}: points {d.points}→{d.expected}")
+        if options["check"] and drift:
+            raise CommandError(f"{len(drift)} users with points drifted from the ledger")
+        self.stdout.write(f"[Points] drifted={len(drift)} fixed={0 if options['check'] else len(drift)}")
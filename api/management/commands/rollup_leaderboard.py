@@ -0,0 +1,32 @@
+"""
+manage.py rollup_leaderboard — свернуть журнал переносов между корзинами
+лидербордов (LeaderboardBucketDelta) в LeaderboardBucket.
+
+Пример (cron или sidecar):
+    python manage.py rollup_leaderboard --loop --interval 5
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.services.leaderboard import ROLLUP_CHUNK_SIZE, rollup_leaderboard
+
+
+class Command(BaseCommand):
+    help = "Apply pending leaderboard bucket deltas to the rank histogram"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=ROLLUP_CHUNK_SIZE, help="Journal rows per transaction")
+        parser.add_argument("--loop", action="store_true", help="Run forever")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between passes in --loop mode")
+
+    def handle(self, *args, **options):
+        while True:
+            applied = rollup_leaderboard(chunk_size=max(1, options["chunk_size"]))
+            if applied or options["verbosity"] > 1:
+                self.stdout.write(f"[Leaderboard] deltas={applied}")
+
+            if not options["loop"]:
+                return
+            time.sleep(max(0.1, options["interval"]))
@@ -0,0 +1,31 @@
+"""
+manage.py rollup_points — свернуть ещё не свёрнутые записи журнала очков в UserProfile.points.
+
+Пример (cron или sidecar):
+    python manage.py rollup_points --loop --interval 5
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.services.points import ROLLUP_CHUNK_SIZE, rollup_points
+
+
+class Command(BaseCommand):
+    help = "Apply new points ledger entries to user points"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=ROLLUP_CHUNK_SIZE, help="Ledger entries per transaction")
+        parser.add_argument("--loop", action="store_true", help="Run forever")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between passes in --loop mode")
+
+    def handle(self, *args, **options):
+        while True:
+            result = rollup_points(chunk_size=max(1, options["chunk_size"]))
+            if result.entries or options["verbosity"] > 1:
+                self.stdout.write(f"[Points] entries={result.entries} users={result.users}")
+
+            if not options["loop"]:
+                return
+            time.sleep(max(0.1, options["interval"]))
@@ -0,0 +1,32 @@
+"""
+manage.py rollup_referral_tree — свернуть журнал ReferralTreeDelta в агрегаты
+дерева (team_size / team_volume).
+
+Пример (cron или sidecar):
+    python manage.py rollup_referral_tree --loop --interval 5
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.services.referral_tree import TREE_BATCH_SIZE, rollup_referral_tree
+
+
+class Command(BaseCommand):
+    help = "Apply pending referral tree deltas to subtree aggregates"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=TREE_BATCH_SIZE, help="Journal rows per transaction")
+        parser.add_argument("--loop", action="store_true", help="Run forever")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between passes in --loop mode")
+
+    def handle(self, *args, **options):
+        while True:
+            applied = rollup_referral_tree(chunk_size=max(1, options["chunk_size"]))
+            if applied or options["verbosity"] > 1:
+                self.stdout.write(f"[Tree] deltas={applied}")
+
+            if not options["loop"]:
+                return
+            time.sleep(max(0.1, options["interval"]))
@@ -0,0 +1,43 @@
+"""
+manage.py send_tonapi_webhook — локальный stand-in отправителя TonAPI webhook.
+
+Шлёт подписанное уведомление с событием, которое оплачивает заказ:
+    python manage.py send_tonapi_webhook --order <public_id> \
+        --url http://127.0.0.1:8000/api/v1/webhooks/tonapi
+"""
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import PaymentOrder
+from api.services.payment_ingest import receiver_address
+from api.services.webhooks import build_standin_notification, encode_signed, webhook_secret
+
+
+class Command(BaseCommand):
+    help = "Send a signed stand-in TonAPI webhook that pays the given PaymentOrder"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--order", required=True, help="PaymentOrder public_id")
+        parser.add_argument("--url", default="http://127.0.0.1:8000/api/v1/webhooks/tonapi")
+        parser.add_argument("--times", type=int, default=1, help="Deliver the same notification N times (dedup check)")
+
+    def handle(self, *args, **options):
+        secret = webhook_secret()
+        if not secret:
+            raise CommandError("TONAPI_WEBHOOK_SECRET is not configured")
+        receiver = receiver_address()
+        if not receiver:
+            raise CommandError("PAYMENT_RECEIVER_TON is not configured")
+
+        order = PaymentOrder.objects.filter(public_id=options["order"]).first()
+        if not order:
+            raise CommandError(f"Order {options['order']} not found")
+
+        body, headers = encode_signed(build_standin_notification(order, receiver=receiver), secret)
+        for _ in range(max(1, options["times"])):
+            try:
+                r = requests.post(options["url"], data=body, headers=headers, timeout=10)
+            except requests.RequestException as e:
+                raise CommandError(f"delivery failed: {e}")
+            self.stdout.write(f"[Webhook] {r.status_code} {r.text[:300]}")
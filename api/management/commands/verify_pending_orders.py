@@ -0,0 +1,40 @@
+"""
+manage.py verify_pending_orders — пакетная сверка всех pending PaymentOrder.
+
+Один проход: все pending заказы одним запросом, по одному скану TonAPI
+на получателя, paid/expired пачками. Пример (sidecar):
+    python manage.py verify_pending_orders --loop --interval 5
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.payment_ingest import sweep_pending_orders
+
+
+class Command(BaseCommand):
+    help = "Verify all pending PaymentOrders against TonAPI in one batch and mark them paid/expired"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=100, help="Events per TonAPI page")
+        parser.add_argument("--max-pages", type=int, default=20, help="Max pages to scan back per receiver")
+        parser.add_argument("--loop", action="store_true", help="Run forever")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between passes in --loop mode")
+
+    def handle(self, *args, **options):
+        while True:
+            result = sweep_pending_orders(limit=options["limit"], max_pages=options["max_pages"])
+            for receiver, error in result.errors.items():
+                self.stderr.write(f"[Sweep] TonAPI error for {receiver}: {error}")
+            if result.pending or options["verbosity"] > 1:
+                self.stdout.write(
+                    f"[Sweep] pending={result.pending} receivers={result.receivers} "
+                    f"fetched={result.fetched} paid={len(result.paid)} expired={result.expired}"
+                )
+
+            if not options["loop"]:
+                if result.errors and not result.paid:
+                    raise CommandError("TonAPI unavailable for: " + ", ".join(result.errors))
+                return
+            time.sleep(max(0.1, options["interval"]))
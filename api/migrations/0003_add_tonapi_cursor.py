@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_add_payment_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TonApiCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(db_index=True, max_length=128, unique=True)),
+                ('last_lt', models.BigIntegerField(default=0)),
+                ('last_event_id', models.CharField(blank=True, default='', max_length=128)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'tonapi_cursors',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_add_tonapi_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(db_index=True, max_length=128, unique=True)),
+                ('source', models.CharField(default='tonapi', max_length=32)),
+                ('account_id', models.CharField(blank=True, default='', max_length=128)),
+                ('lt', models.BigIntegerField(default=0)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'webhook_events',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_add_webhook_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentorder',
+            name='receiver_address',
+            field=models.CharField(blank=True, default='', max_length=128),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_add_payment_order_receiver'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='participation',
+            name='status',
+            field=models.CharField(choices=[('NEW', 'NEW'), ('PENDING', 'PENDING'), ('CONFIRMED', 'CONFIRMED'), ('REJECTED', 'REJECTED'), ('EXPIRED', 'EXPIRED')], db_index=True, default='NEW', max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='paymentorder',
+            index=models.Index(fields=['status', 'expires_at'], name='payment_ord_status_11e76e_idx'),
+        ),
+    ]
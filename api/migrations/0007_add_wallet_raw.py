@@ -0,0 +1,83 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:24
+
+import base64
+import binascii
+import re
+
+from django.db import migrations, models
+
+# Копия нормализации из api.services.ton_address на момент миграции:
+# правки кода приложения не должны менять её результат.
+RAW_ADDRESS_RE = re.compile(r"^(-?\d+):([0-9a-fA-F]{64})$")
+
+
+def _crc16_xmodem(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+    return crc
+
+
+def canonical_raw(addr) -> str:
+    """Канонический raw "<wc>:<hex lowercase>"; "" для нераспознанного адреса."""
+    s = (addr or "").strip()
+    if not s:
+        return ""
+    if ":" in s:
+        m = RAW_ADDRESS_RE.match(s)
+        if not m or not -128 <= int(m.group(1)) <= 127:
+            return ""
+        return f"{int(m.group(1))}:{m.group(2).lower()}"
+    if len(s) != 48:
+        return ""
+    try:
+        data = base64.urlsafe_b64decode(s.replace("+", "-").replace("/", "_"))
+    except (binascii.Error, ValueError):
+        return ""
+    if len(data) != 36:
+        return ""
+    body = data[:34]
+    if _crc16_xmodem(body) != int.from_bytes(data[34:], "big"):
+        return ""
+    if body[0] & ~0x80 not in (0x11, 0x51):
+        return ""
+    wc = body[1] - 256 if body[1] > 127 else body[1]
+    return f"{wc}:{body[2:34].hex()}"
+
+
+def backfill_wallet_raw(apps, schema_editor):
+    for model_name, field in (("UserProfile", "wallet"), ("PaymentOrder", "wallet_address")):
+        model = apps.get_model("api", model_name)
+        batch = []
+        for obj in model.objects.exclude(**{f"{field}__isnull": True}).exclude(**{field: ""}).iterator(chunk_size=1000):
+            obj.wallet_raw = canonical_raw(getattr(obj, field))
+            batch.append(obj)
+            if len(batch) >= 1000:
+                model.objects.bulk_update(batch, ["wallet_raw"])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ["wallet_raw"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_add_expiry_sweeper_support'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentorder',
+            name='wallet_raw',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=70),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='wallet_raw',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=70),
+        ),
+        migrations.RunPython(backfill_wallet_raw, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_add_wallet_raw'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JettonWalletCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner_raw', models.CharField(max_length=128)),
+                ('master_raw', models.CharField(max_length=128)),
+                ('jetton_wallet', models.CharField(max_length=128)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'jetton_wallet_cache',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='jettonwalletcache',
+            constraint=models.UniqueConstraint(fields=('owner_raw', 'master_raw'), name='uniq_jetton_wallet_owner_master'),
+        ),
+    ]
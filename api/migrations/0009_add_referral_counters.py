@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:10
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+SLOT_STATUSES = ("NEW", "PENDING", "CONFIRMED")
+
+
+def backfill_referral_counters(apps, schema_editor):
+    Participation = apps.get_model("api", "Participation")
+    referrals = Participation.objects.filter(referrer_id=OuterRef("user_id")).order_by().values("referrer_id")
+    used = referrals.filter(status__in=SLOT_STATUSES).annotate(n=Count("id")).values("n")
+    confirmed = referrals.filter(
+        status="CONFIRMED",
+        created_at__gt=OuterRef("created_at"),
+    ).annotate(n=Count("user_id", distinct=True)).values("n")
+    Participation.objects.filter(status="CONFIRMED").update(
+        used_slots=Coalesce(Subquery(used, output_field=IntegerField()), 0),
+        confirmed_l1=Coalesce(Subquery(confirmed, output_field=IntegerField()), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_add_jetton_wallet_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participation',
+            name='confirmed_l1',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='participation',
+            name='used_slots',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_referral_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:38
+
+from django.db import migrations, models
+
+
+def backfill_seeded(apps, schema_editor):
+    Participation = apps.get_model("api", "Participation")
+    SystemFlag = apps.get_model("api", "SystemFlag")
+    if Participation.objects.filter(status="CONFIRMED").exists():
+        SystemFlag.objects.get_or_create(key="seeded")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_add_me_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SystemFlag',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('set_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'system_flags',
+            },
+        ),
+        migrations.RunPython(backfill_seeded, migrations.RunPython.noop),
+    ]
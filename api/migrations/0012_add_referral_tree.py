@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_add_system_flags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferralNode',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='referral_node', serialize=False, to='api.userprofile')),
+                ('depth', models.PositiveIntegerField(default=0)),
+                ('team_size', models.PositiveIntegerField(default=0)),
+                ('team_volume', models.PositiveIntegerField(default=0)),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='referral_children', to='api.userprofile')),
+            ],
+            options={
+                'db_table': 'referral_nodes',
+            },
+        ),
+        migrations.CreateModel(
+            name='ReferralClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.userprofile')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.userprofile')),
+            ],
+            options={
+                'db_table': 'referral_closure',
+                'indexes': [models.Index(fields=['ancestor', 'depth', 'descendant'], name='referral_closure_anc_depth'), models.Index(fields=['descendant'], name='referral_closure_desc')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='referralclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='uniq_referral_closure_pair'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:14
+
+from django.db import migrations, models
+
+
+def clamp_used_slots(apps, schema_editor):
+    # Переполнение 3/3 из времён до атомарного резервирования
+    Participation = apps.get_model("api", "Participation")
+    Participation.objects.filter(used_slots__gt=3).update(used_slots=3)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_add_referral_tree'),
+    ]
+
+    operations = [
+        migrations.RunPython(clamp_used_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='participation',
+            constraint=models.CheckConstraint(check=models.Q(('used_slots__lte', 3)), name='participation_used_slots_lte_limit'),
+        ),
+    ]
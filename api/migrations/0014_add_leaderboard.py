@@ -0,0 +1,75 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:41
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def backfill_leaderboard(apps, schema_editor):
+    Participation = apps.get_model("api", "Participation")
+    UserProfile = apps.get_model("api", "UserProfile")
+    LeaderboardEntry = apps.get_model("api", "LeaderboardEntry")
+    LeaderboardBucket = apps.get_model("api", "LeaderboardBucket")
+
+    confirmed = (
+        Participation.objects.filter(referrer_id=OuterRef("pk"), status="CONFIRMED")
+        .order_by().values("referrer_id").annotate(n=Count("id")).values("n")
+    )
+    scored = (
+        UserProfile.objects.annotate(lb_l1=Coalesce(Subquery(confirmed), 0))
+        .filter(Q(lb_l1__gt=0) | ~Q(points=0))
+        .values_list("id", "lb_l1", "points")
+    )
+    entries = [LeaderboardEntry(user_id=uid, confirmed_l1=l1, points=points) for uid, l1, points in scored]
+    buckets = Counter()
+    for e in entries:
+        if e.confirmed_l1 > 0:
+            buckets["l1", e.confirmed_l1] += 1
+        if e.points > 0:
+            buckets["points", e.points] += 1
+    LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+    LeaderboardBucket.objects.bulk_create(
+        [LeaderboardBucket(board=b, score=s, users=n) for (b, s), n in buckets.items()], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_add_used_slots_check'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=16)),
+                ('score', models.IntegerField()),
+                ('users', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'leaderboard_buckets',
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='leaderboard', serialize=False, to='api.userprofile')),
+                ('confirmed_l1', models.IntegerField(default=0)),
+                ('points', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'leaderboard_entries',
+                'indexes': [models.Index(models.OrderBy(models.F('confirmed_l1'), descending=True), models.F('user'), name='leaderboard_l1_rank'), models.Index(models.OrderBy(models.F('points'), descending=True), models.F('user'), name='leaderboard_points_rank')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardbucket',
+            constraint=models.UniqueConstraint(fields=('board', 'score'), name='uniq_leaderboard_bucket'),
+        ),
+        migrations.RunPython(backfill_leaderboard, migrations.RunPython.noop),
+    ]
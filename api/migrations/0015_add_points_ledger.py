@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:08
+
+from django.db import migrations, models
+from django.db.models import Max
+import django.db.models.deletion
+
+
+def opening_balances(apps, schema_editor):
+    UserProfile = apps.get_model("api", "UserProfile")
+    PointsLedgerEntry = apps.get_model("api", "PointsLedgerEntry")
+    PointsRollupCursor = apps.get_model("api", "PointsRollupCursor")
+    PointsLedgerEntry.objects.bulk_create(
+        [
+            PointsLedgerEntry(user_id=uid, amount=points, reason="OPENING_BALANCE")
+            for uid, points in UserProfile.objects.exclude(points=0).values_list("id", "points")
+        ],
+        batch_size=1000,
+    )
+    # Остатки уже в UserProfile.points
+    last = PointsLedgerEntry.objects.aggregate(m=Max("id"))["m"] or 0
+    PointsRollupCursor.objects.create(pk=1, last_entry_id=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_add_leaderboard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsRollupCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_entry_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'points_rollup_cursor',
+            },
+        ),
+        migrations.CreateModel(
+            name='PointsLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField()),
+                ('reason', models.CharField(choices=[('OPENING_BALANCE', 'OPENING_BALANCE'), ('AUTHOR_CODE_USER', 'AUTHOR_CODE_USER'), ('AUTHOR_CODE_OWNER', 'AUTHOR_CODE_OWNER'), ('ADJUSTMENT', 'ADJUSTMENT')], max_length=32)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('participation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.participation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_entries', to='api.userprofile')),
+            ],
+            options={
+                'db_table': 'points_ledger',
+                'indexes': [models.Index(fields=['user', 'id'], name='points_ledg_user_id_31bc43_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pointsledgerentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('participation__isnull', False)), fields=('participation', 'user', 'reason'), name='uniq_points_award_per_participation'),
+        ),
+        migrations.RunPython(opening_balances, migrations.RunPython.noop),
+    ]
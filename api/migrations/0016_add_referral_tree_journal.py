@@ -0,0 +1,94 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:40
+
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+CONFIRMED = "CONFIRMED"
+
+
+# Копия api.services.referral_tree._plan на момент миграции:
+# правки кода приложения не должны менять её результат.
+def _plan(rows):
+    chains = {}
+    team_size = Counter()
+    team_volume = Counter()
+    for user_id, referrer_id, status in rows:
+        if user_id not in chains:
+            if referrer_id is None:
+                chain = ()
+            else:
+                chain = chains.setdefault(referrer_id, ()) + (referrer_id,)
+            chains[user_id] = chain
+            team_size.update(chain)
+        if status == CONFIRMED:
+            team_volume.update(chains[user_id])
+    return chains, team_size, team_volume
+
+
+def backfill_referral_tree(apps, schema_editor):
+    """
+    Построить дерево по participations, существовавшим до 0012: иначе их
+    рефереры попали бы в дерево корнями первым же intent. Модели здесь
+    исторические.
+    """
+    Participation = apps.get_model("api", "Participation")
+    ReferralNode = apps.get_model("api", "ReferralNode")
+    ReferralClosure = apps.get_model("api", "ReferralClosure")
+
+    rows = (
+        Participation.objects.order_by("created_at", "id")
+        .values_list("user_id", "referrer_id", "status")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    chains, team_size, team_volume = _plan(rows)
+
+    ReferralClosure.objects.all().delete()
+    ReferralNode.objects.all().delete()
+    ReferralNode.objects.bulk_create(
+        [
+            ReferralNode(
+                user_id=user_id,
+                parent_id=chain[-1] if chain else None,
+                depth=len(chain),
+                team_size=team_size[user_id],
+                team_volume=team_volume[user_id],
+            )
+            for user_id, chain in chains.items()
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    ReferralClosure.objects.bulk_create(
+        [
+            ReferralClosure(ancestor_id=ancestor_id, descendant_id=user_id, depth=len(chain) - i)
+            for user_id, chain in chains.items()
+            for i, ancestor_id in enumerate(chain + (user_id,))
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_add_points_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferralTreeDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('team_size', models.IntegerField(default=0)),
+                ('team_volume', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.userprofile')),
+            ],
+            options={
+                'db_table': 'referral_tree_deltas',
+            },
+        ),
+        migrations.RunPython(backfill_referral_tree, migrations.RunPython.noop),
+    ]
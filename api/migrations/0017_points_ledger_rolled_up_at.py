@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:05
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_rolled_up(apps, schema_editor):
+    # Всё, что было до курсора, уже в UserProfile.points
+    PointsLedgerEntry = apps.get_model("api", "PointsLedgerEntry")
+    PointsRollupCursor = apps.get_model("api", "PointsRollupCursor")
+    cursor = PointsRollupCursor.objects.filter(pk=1).first()
+    if cursor:
+        PointsLedgerEntry.objects.filter(id__lte=cursor.last_entry_id).update(rolled_up_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_add_referral_tree_journal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pointsledgerentry',
+            name='rolled_up_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_rolled_up, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='PointsRollupCursor',
+        ),
+        migrations.AddIndex(
+            model_name='pointsledgerentry',
+            index=models.Index(condition=models.Q(('rolled_up_at__isnull', True)), fields=['id'], name='points_ledger_pending'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_points_ledger_rolled_up_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardBucketDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=16)),
+                ('score', models.IntegerField()),
+                ('delta', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'leaderboard_bucket_deltas',
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_add_leaderboard_bucket_journal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tonapicursor',
+            name='resume_before_lt',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tonapicursor',
+            name='resume_high_lt',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -10,9 +10,23 @@ Soulpull MVP — Models (согласно ТЗ §4, §13.1)
 - TonProofPayload: nonce для TON Proof
 """
 
-from django.db import models
+from typing import Optional
+
+from django.db import models, transaction
 from django.utils import timezone
 
+from api.services.ton_address import canonical_raw
+
+
+def _with_wallet_raw(update_fields):
+    """update_fields для save(): wallet_raw пересчитывается вместе с адресом."""
+    if update_fields is None:
+        return None
+    update_fields = set(update_fields)
+    if update_fields & {"wallet", "wallet_address"}:
+        update_fields.add("wallet_raw")
+    return update_fields
+
 
 class UserProfile(models.Model):
     """
@@ -23,7 +37,12 @@ class UserProfile(models.Model):
     username = models.CharField(max_length=64, blank=True, null=True)
     first_name = models.CharField(max_length=64, blank=True, null=True)
     wallet = models.CharField(max_length=128, blank=True, null=True, unique=True, db_index=True)
+    # Канонический raw ("<wc>:<hex>") для поиска по ==; "" если wallet не распознан
+    wallet_raw = models.CharField(max_length=70, blank=True, default="", db_index=True)
+    # Свёртка PointsLedgerEntry (rollup_points), напрямую не менять
     points = models.IntegerField(default=0)
+    # Версия ответа /me: растёт при любой записи, которая меняет /me (ETag, кэш)
+    me_version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -34,6 +53,26 @@ class UserProfile(models.Model):
             models.Index(fields=["wallet"]),
         ]
 
+    def save(self, *args, update_fields=None, **kwargs):
+        self.wallet_raw = canonical_raw(self.wallet)
+        update_fields = _with_wallet_raw(update_fields)
+        bump = not self._state.adding
+        if bump:
+            # Инкремент в том же UPDATE: полный save() не затрёт чужой bump
+            self.me_version = models.F("me_version") + 1
+            if update_fields is not None:
+                update_fields = set(update_fields) | {"me_version"}
+        super().save(*args, update_fields=update_fields, **kwargs)
+        if bump:
+            self.refresh_from_db(fields=["me_version"])
+
+    @staticmethod
+    def bump_me_version(*user_ids: Optional[int]) -> None:
+        """Сбросить кэш /me пользователей (запись в их участия, рефералов, выплаты)."""
+        ids = {i for i in user_ids if i}
+        if ids:
+            UserProfile.objects.filter(id__in=ids).update(me_version=models.F("me_version") + 1)
+
     def __str__(self) -> str:
         return f"User({self.telegram_id})"
 
@@ -61,6 +100,12 @@ class ParticipationStatus(models.TextChoices):
     PENDING = "PENDING", "PENDING"
     CONFIRMED = "CONFIRMED", "CONFIRMED"
     REJECTED = "REJECTED", "REJECTED"
+    # NEW без оплаты дольше PARTICIPATION_NEW_TTL_MINUTES — слот реферера освобождён
+    EXPIRED = "EXPIRED", "EXPIRED"
+
+
+# Лимит рефералов в NEW|PENDING|CONFIRMED на одно CONFIRMED участие (3/3)
+REFERRAL_SLOT_LIMIT = 3
 
 
 class Participation(models.Model):
@@ -70,6 +115,15 @@ class Participation(models.Model):
     Инварианты:
     - На пользователя одновременно ≤1 записи в состояниях NEW|PENDING|CONFIRMED
     - tx_hash уникален среди всех Participation
+
+    used_slots / confirmed_l1 — счётчики рефералов пользователя, хранятся на
+    его CONFIRMED участии и меняются в той же транзакции, что и статус
+    реферала (services.participations.record_referral_transition):
+    - used_slots — рефералы в NEW|PENDING|CONFIRMED (лимит 3/3); слот
+      занимается условным инкрементом (reserve_referral_slot), CHECK
+      used_slots <= REFERRAL_SLOT_LIMIT — страховка на уровне БД
+    - confirmed_l1 — CONFIRMED рефералы после этого участия
+    Расхождения чинит manage.py rebuild_referral_counters.
     """
     user = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="participations")
     referrer = models.ForeignKey(
@@ -89,6 +143,8 @@ class Participation(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     confirmed_at = models.DateTimeField(null=True, blank=True)
+    used_slots = models.PositiveSmallIntegerField(default=0)
+    confirmed_l1 = models.PositiveSmallIntegerField(default=0)
 
     class Meta:
         db_table = "participations"
@@ -98,6 +154,12 @@ class Participation(models.Model):
             models.Index(fields=["referrer", "created_at"]),
             models.Index(fields=["tx_hash"]),
         ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(used_slots__lte=REFERRAL_SLOT_LIMIT),
+                name="participation_used_slots_lte_limit",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"Participation({self.id}, {self.status})"
@@ -235,6 +297,10 @@ class PaymentOrder(models.Model):
     
     # Адрес кошелька отправителя (из TonConnect)
     wallet_address = models.CharField(max_length=128, blank=True, default="")
+    wallet_raw = models.CharField(max_length=70, blank=True, default="", db_index=True)
+
+    # Кошелёк-получатель на момент создания заказа ("" — PAYMENT_RECEIVER_TON)
+    receiver_address = models.CharField(max_length=128, blank=True, default="")
     
     # Сумма в нанотонах (1 TON = 1e9 nanoTON)
     amount_nano = models.BigIntegerField()
@@ -266,8 +332,14 @@ class PaymentOrder(models.Model):
             models.Index(fields=["status"]),
             models.Index(fields=["wallet_address"]),
             models.Index(fields=["created_at"]),
+            # Для sweeper: WHERE status='pending' AND expires_at < now
+            models.Index(fields=["status", "expires_at"]),
         ]
 
+    def save(self, *args, update_fields=None, **kwargs):
+        self.wallet_raw = canonical_raw(self.wallet_address)
+        super().save(*args, update_fields=_with_wallet_raw(update_fields), **kwargs)
+
     @staticmethod
     def new_public_id() -> str:
         import uuid
@@ -283,17 +355,279 @@ class PaymentOrder(models.Model):
             self.paid_tx_hash = tx_hash
         self.save(update_fields=["status", "paid_at", "paid_event_id", "paid_tx_hash"])
         
-        # Если есть связанное участие — обновить его статус
-        if self.participation:
-            self.participation.status = ParticipationStatus.PENDING
-            self.participation.tx_hash = tx_hash or event_id
-            self.participation.save(update_fields=["status", "tx_hash"])
+        # Если есть связанное участие — перевести NEW → PENDING условным UPDATE:
+        # EXPIRED/REJECTED/CONFIRMED участие не воскрешается, а счётчики
+        # реферера меняются, только если переход действительно произошёл
+        if self.participation_id:
+            from api.services.participations import record_referral_transition
+
+            participation = self.participation
+            with transaction.atomic():
+                moved = Participation.objects.filter(
+                    pk=participation.pk, status=ParticipationStatus.NEW,
+                ).update(status=ParticipationStatus.PENDING, tx_hash=tx_hash or event_id)
+                if not moved:
+                    return
+                record_referral_transition(participation.referrer_id, ParticipationStatus.NEW, ParticipationStatus.PENDING)
+                UserProfile.bump_me_version(participation.user_id, participation.referrer_id)
+            participation.status = ParticipationStatus.PENDING
+            participation.tx_hash = tx_hash or event_id
+
+    def deadline(self):
+        """Момент истечения заказа; по умолчанию заказ живёт 30 минут."""
+        if self.expires_at:
+            return self.expires_at
+        return self.created_at + timezone.timedelta(minutes=30)
 
     def is_expired(self) -> bool:
-        if self.expires_at:
-            return timezone.now() >= self.expires_at
-        # По умолчанию заказ живёт 30 минут
-        return timezone.now() >= self.created_at + timezone.timedelta(minutes=30)
+        return timezone.now() >= self.deadline()
 
     def __str__(self) -> str:
         return f"PaymentOrder({self.public_id}, {self.status})"
+
+
+class TonApiCursor(models.Model):
+    """
+    Курсор инкрементального чтения событий аккаунта через TonAPI.
+
+    last_lt — high-water mark: lt последнего обработанного события.
+    Ингестер обрабатывает только события с lt > last_lt.
+
+    resume_before_lt/resume_high_lt — прерванный скан (упёрся в max_pages):
+    следующий проход продолжает листать с resume_before_lt вниз до last_lt,
+    а дочитав, переносит last_lt на resume_high_lt.
+    """
+    account = models.CharField(max_length=128, unique=True, db_index=True)
+    last_lt = models.BigIntegerField(default=0)
+    last_event_id = models.CharField(max_length=128, blank=True, default="")
+    resume_before_lt = models.BigIntegerField(default=0)
+    resume_high_lt = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "tonapi_cursors"
+
+    def __str__(self) -> str:
+        return f"TonApiCursor({self.account}, lt={self.last_lt})"
+
+
+class WebhookEvent(models.Model):
+    """
+    Принятые webhook уведомления (дедупликация по event_id).
+    Повторная доставка того же события — no-op.
+    """
+    event_id = models.CharField(max_length=128, unique=True, db_index=True)
+    source = models.CharField(max_length=32, default="tonapi")
+    account_id = models.CharField(max_length=128, blank=True, default="")
+    lt = models.BigIntegerField(default=0)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "webhook_events"
+
+    def __str__(self) -> str:
+        return f"WebhookEvent({self.source}, {self.event_id})"
+
+
+class JettonWalletCache(models.Model):
+    """
+    Кэш адреса jetton-wallet владельца для jetton master.
+
+    Адрес jetton-wallet детерминирован (owner, master) и никогда не меняется,
+    поэтому запись не протухает. Ключи — канонический raw (см. ton_address).
+    """
+    owner_raw = models.CharField(max_length=128)
+    master_raw = models.CharField(max_length=128)
+    jetton_wallet = models.CharField(max_length=128)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "jetton_wallet_cache"
+        constraints = [
+            models.UniqueConstraint(fields=["owner_raw", "master_raw"], name="uniq_jetton_wallet_owner_master"),
+        ]
+
+    def __str__(self) -> str:
+        return f"JettonWalletCache({self.owner_raw}, {self.master_raw})"
+
+
+class ReferralNode(models.Model):
+    """
+    Узел дерева рефералов (см. services/referral_tree).
+
+    Пользователь встаёт в дерево первым intent под реферером этого intent
+    и дальше не перемещается. Агрегаты догоняют журнал ReferralTreeDelta
+    (rollup_referral_tree):
+    - team_size — потомки на любой глубине
+    - team_volume — CONFIRMED участия потомков
+    """
+    user = models.OneToOneField(UserProfile, on_delete=models.CASCADE, primary_key=True, related_name="referral_node")
+    parent = models.ForeignKey(
+        UserProfile, on_delete=models.SET_NULL, null=True, blank=True, related_name="referral_children"
+    )
+    depth = models.PositiveIntegerField(default=0)
+    team_size = models.PositiveIntegerField(default=0)
+    team_volume = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "referral_nodes"
+
+    def __str__(self) -> str:
+        return f"ReferralNode({self.user_id}, depth={self.depth}, team={self.team_size})"
+
+
+class ReferralClosure(models.Model):
+    """
+    Closure table дерева рефералов: строка на каждую пару (предок, потомок),
+    включая (узел, узел, 0). Поддерево до глубины N — один range scan по
+    индексу (ancestor, depth).
+    """
+    ancestor = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="+")
+    descendant = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="+")
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        db_table = "referral_closure"
+        constraints = [
+            models.UniqueConstraint(fields=["ancestor", "descendant"], name="uniq_referral_closure_pair"),
+        ]
+        indexes = [
+            models.Index(fields=["ancestor", "depth", "descendant"], name="referral_closure_anc_depth"),
+            models.Index(fields=["descendant"], name="referral_closure_desc"),
+        ]
+
+
+class ReferralTreeDelta(models.Model):
+    """
+    Журнал изменений агрегатов дерева: всем предкам user прибавить
+    team_size / team_volume. Пишется в транзакции intent / confirm вместо
+    UPDATE по цепочке предков; rollup_referral_tree сворачивает строки в
+    ReferralNode и удаляет их.
+    """
+    user = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="+")
+    team_size = models.IntegerField(default=0)
+    team_volume = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "referral_tree_deltas"
+
+    def __str__(self) -> str:
+        return f"ReferralTreeDelta({self.user_id}, size={self.team_size:+d}, volume={self.team_volume:+d})"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Очки пользователя в лидербордах (см. services/leaderboard), меняются
+    инкрементально вместе с событием:
+    - confirmed_l1 — CONFIRMED рефералы за всё время (не только текущего цикла)
+    - points — копия UserProfile.points
+    """
+    user = models.OneToOneField(UserProfile, on_delete=models.CASCADE, primary_key=True, related_name="leaderboard")
+    confirmed_l1 = models.IntegerField(default=0)
+    points = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "leaderboard_entries"
+        indexes = [
+            models.Index(models.F("confirmed_l1").desc(), "user", name="leaderboard_l1_rank"),
+            models.Index(models.F("points").desc(), "user", name="leaderboard_points_rank"),
+        ]
+
+    def __str__(self) -> str:
+        return f"LeaderboardEntry({self.user_id}, l1={self.confirmed_l1}, points={self.points})"
+
+
+class LeaderboardBucket(models.Model):
+    """
+    Гистограмма лидерборда: сколько пользователей с данным score > 0.
+    Ранг = 1 + сумма users по корзинам с большим score.
+    """
+    board = models.CharField(max_length=16)
+    score = models.IntegerField()
+    users = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "leaderboard_buckets"
+        constraints = [
+            models.UniqueConstraint(fields=["board", "score"], name="uniq_leaderboard_bucket"),
+        ]
+
+    def __str__(self) -> str:
+        return f"LeaderboardBucket({self.board}, {self.score}: {self.users})"
+
+
+class LeaderboardBucketDelta(models.Model):
+    """
+    Журнал переносов между корзинами: users корзины (board, score)
+    изменить на delta. record() пишет его в транзакции события вместо
+    UPDATE общих строк LeaderboardBucket; rollup_leaderboard сворачивает
+    журнал и удаляет применённые строки.
+    """
+    board = models.CharField(max_length=16)
+    score = models.IntegerField()
+    delta = models.IntegerField()
+
+    class Meta:
+        db_table = "leaderboard_bucket_deltas"
+
+    def __str__(self) -> str:
+        return f"LeaderboardBucketDelta({self.board}, {self.score}: {self.delta:+d})"
+
+
+class PointsReason(models.TextChoices):
+    OPENING_BALANCE = "OPENING_BALANCE", "OPENING_BALANCE"
+    AUTHOR_CODE_USER = "AUTHOR_CODE_USER", "AUTHOR_CODE_USER"
+    AUTHOR_CODE_OWNER = "AUTHOR_CODE_OWNER", "AUTHOR_CODE_OWNER"
+    ADJUSTMENT = "ADJUSTMENT", "ADJUSTMENT"
+
+
+class PointsLedgerEntry(models.Model):
+    """
+    Журнал начислений очков (append-only, см. services/points).
+
+    UserProfile.points = сумма записей с rolled_up_at; записи без него
+    применяет rollup_points и проставляет rolled_up_at в той же транзакции.
+    Начисление за участие уникально по (participation, user, reason).
+    """
+    user = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="points_entries")
+    amount = models.IntegerField()
+    reason = models.CharField(max_length=32, choices=PointsReason.choices)
+    participation = models.ForeignKey(
+        Participation, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    rolled_up_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "points_ledger"
+        indexes = [
+            models.Index(fields=["user", "id"]),
+            # Очередь rollup_points: только ещё не свёрнутые записи
+            models.Index(fields=["id"], condition=models.Q(rolled_up_at__isnull=True), name="points_ledger_pending"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["participation", "user", "reason"],
+                condition=models.Q(participation__isnull=False),
+                name="uniq_points_award_per_participation",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"PointsLedgerEntry({self.user_id}, {self.amount:+d}, {self.reason})"
+
+
+class SystemFlag(models.Model):
+    """
+    Монотонные глобальные флаги (см. services/system_flags): запись
+    появляется один раз за жизнь инсталляции и больше не удаляется.
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    set_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "system_flags"
+
+    def __str__(self) -> str:
+        return f"SystemFlag({self.key})"
@@ -11,6 +11,18 @@ from django.http import JsonResponse
 
 from api.auth_tokens import parse_bearer_token, verify_token
 from api.models import UserProfile
+from api.services.ton_address import canonical_raw
+
+
+def find_user_by_wallet(wallet: str) -> Optional[UserProfile]:
+    """
+    Пользователь по адресу кошелька в любой форме (raw / EQ… / UQ…).
+    Распознанный адрес ищется по индексу wallet_raw, иначе — по строке как есть.
+    """
+    raw = canonical_raw(wallet)
+    if raw:
+        return UserProfile.objects.filter(wallet_raw=raw).first()
+    return UserProfile.objects.filter(wallet=wallet).first()
 
 
 def get_user_from_request(request) -> Optional[UserProfile]:
@@ -23,7 +35,7 @@ def get_user_from_request(request) -> Optional[UserProfile]:
     if not claims:
         return None
     # Ищем по wallet (claims.wallet_address = wallet из токена)
-    return UserProfile.objects.filter(wallet=claims.wallet_address).first()
+    return find_user_by_wallet(claims.wallet_address)
 
 
 def require_user_or_401(request) -> Union[UserProfile, JsonResponse]:
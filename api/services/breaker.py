@@ -0,0 +1,120 @@
+"""
+Soulpull MVP — Circuit Breaker
+
+Защита sync воркеров от деградации внешних API (TonAPI, Toncenter).
+
+Состояния:
+- closed: запросы идут как обычно, считаем подряд идущие ошибки
+- open: после N ошибок запросы сразу отклоняются (fail fast) на cooldown
+- half_open: после cooldown пропускаем один пробный запрос;
+  успех → closed, ошибка → снова open с удвоенным cooldown (с джиттером)
+"""
+
+import random
+import threading
+import time
+from typing import Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_registry: dict[str, "CircuitBreaker"] = {}
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = 5,
+        base_cooldown: float = 5.0,
+        max_cooldown: float = 60.0,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._trips = 0
+        self._opened_until = 0.0
+        self._probe_in_flight = False
+        self._last_error = ""
+
+        _registry[name] = self
+
+    def allow(self) -> bool:
+        """Можно ли сейчас делать запрос. В half_open пропускает только один пробный."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() < self._opened_until:
+                    return False
+                self._state = HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trips = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, error: str = "") -> None:
+        with self._lock:
+            self._failures += 1
+            self._last_error = error[:200]
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._trip()
+
+    def _trip(self) -> None:
+        # Экспоненциальный backoff с джиттером, чтобы воркеры не пробовали хором
+        cooldown = min(self.max_cooldown, self.base_cooldown * (2 ** self._trips))
+        cooldown *= random.uniform(0.5, 1.0)
+        self._trips += 1
+        self._state = OPEN
+        self._opened_until = time.monotonic() + cooldown
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() >= self._opened_until:
+                return HALF_OPEN
+            return self._state
+
+    def snapshot(self) -> dict:
+        state = self.state
+        with self._lock:
+            retry_in = max(0.0, self._opened_until - time.monotonic()) if state == OPEN else 0.0
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "retry_in": round(retry_in, 2),
+                "last_error": self._last_error,
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trips = 0
+            self._opened_until = 0.0
+            self._probe_in_flight = False
+            self._last_error = ""
+
+
+def get_breaker(name: str) -> Optional[CircuitBreaker]:
+    return _registry.get(name)
+
+
+def breakers_snapshot() -> dict:
+    return {name: b.snapshot() for name, b in sorted(_registry.items())}
@@ -0,0 +1,147 @@
+"""
+Soulpull MVP — Expiry Sweeper
+
+Плановое истечение вместо ленивого (раньше заказ истекал, только когда
+кто-то поллил его статус):
+
+- PaymentOrder: pending → expired одним UPDATE ... WHERE status='pending'
+  AND expires_at < now - grace (индекс (status, expires_at)), пачками по
+  chunk_size. LATE_PAYMENT_GRACE_SECONDS даёт ингестеру/webhook дозасчитать
+  перевод, отправленный до expires_at, но дошедший позже
+- Participation: NEW без живого pending заказа дольше
+  PARTICIPATION_NEW_TTL_MINUTES → EXPIRED, слот реферера (3/3) освобождается
+  (used_slots реферера уменьшается в транзакции пачки)
+
+UPDATE с LIMIT в Django нет, поэтому пачка = SELECT id ... LIMIT n →
+UPDATE ... WHERE id IN (...) AND status=<старый статус>. Повторная проверка
+статуса в UPDATE защищает от гонки с воркером оплаты.
+"""
+
+import logging
+import os
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from api.models import Participation, ParticipationStatus, PaymentOrder, PaymentOrderStatus, UserProfile
+from api.services.participations import record_referral_transitions
+from api.services.payment_ingest import LATE_PAYMENT_GRACE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Заказ без expires_at живёт столько же, сколько в PaymentOrder.is_expired()
+PAYMENT_ORDER_DEFAULT_TTL_MINUTES = 30
+PARTICIPATION_NEW_TTL_MINUTES = int(os.getenv("PARTICIPATION_NEW_TTL_MINUTES", "60"))
+EXPIRY_CHUNK_SIZE = 500
+
+
+@dataclass
+class ExpiryResult:
+    orders: int = 0
+    participations: int = 0
+
+
+def _update_in_chunks(
+    qs: QuerySet,
+    *,
+    from_status: str,
+    to_status: str,
+    chunk_size: int,
+    before_update: Optional[Callable[[QuerySet], None]] = None,
+) -> int:
+    """
+    before_update(chunk) вызывается в транзакции пачки с уже заблокированными
+    строками, которые сейчас сменят статус.
+    """
+    total = 0
+    model = qs.model
+    while True:
+        ids = list(qs.order_by().values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            return total
+        with transaction.atomic():
+            chunk = model.objects.filter(pk__in=ids, status=from_status)
+            if before_update is not None:
+                before_update(chunk.select_for_update())
+            updated = chunk.update(status=to_status)
+        total += updated
+        if len(ids) < chunk_size:
+            return total
+
+
+def expire_payment_orders(*, now=None, chunk_size: int = EXPIRY_CHUNK_SIZE) -> int:
+    """pending заказы с истёкшим сроком → expired. Возвращает число обновлённых строк."""
+    now = (now or timezone.now()) - timezone.timedelta(seconds=LATE_PAYMENT_GRACE_SECONDS)
+    pending = PaymentOrder.objects.filter(status=PaymentOrderStatus.PENDING)
+    total = _update_in_chunks(
+        pending.filter(expires_at__lt=now),
+        from_status=PaymentOrderStatus.PENDING,
+        to_status=PaymentOrderStatus.EXPIRED,
+        chunk_size=chunk_size,
+    )
+    # Старые заказы без expires_at
+    total += _update_in_chunks(
+        pending.filter(
+            expires_at__isnull=True,
+            created_at__lt=now - timezone.timedelta(minutes=PAYMENT_ORDER_DEFAULT_TTL_MINUTES),
+        ),
+        from_status=PaymentOrderStatus.PENDING,
+        to_status=PaymentOrderStatus.EXPIRED,
+        chunk_size=chunk_size,
+    )
+    return total
+
+
+def release_stale_participations(
+    *,
+    now=None,
+    ttl_minutes: Optional[int] = None,
+    chunk_size: int = EXPIRY_CHUNK_SIZE,
+) -> int:
+    """
+    NEW участия старше TTL → EXPIRED. Участие с ещё не истёкшим pending
+    заказом (с учётом LATE_PAYMENT_GRACE_SECONDS) не трогаем — оплата может
+    прийти в любой момент.
+    """
+    now = now or timezone.now()
+    ttl = PARTICIPATION_NEW_TTL_MINUTES if ttl_minutes is None else ttl_minutes
+    live_orders = PaymentOrder.objects.filter(
+        status=PaymentOrderStatus.PENDING,
+        expires_at__gte=now - timezone.timedelta(seconds=LATE_PAYMENT_GRACE_SECONDS),
+        participation__isnull=False,  # NULL в NOT IN (...) отсёк бы всё
+    ).values("participation_id")
+    stale = Participation.objects.filter(
+        status=ParticipationStatus.NEW,
+        created_at__lt=now - timezone.timedelta(minutes=ttl),
+    ).exclude(pk__in=live_orders)
+    return _update_in_chunks(
+        stale,
+        from_status=ParticipationStatus.NEW,
+        to_status=ParticipationStatus.EXPIRED,
+        chunk_size=chunk_size,
+        before_update=_release_referrer_slots,
+    )
+
+
+def _release_referrer_slots(chunk: QuerySet) -> None:
+    rows = list(chunk.values_list("user_id", "referrer_id"))
+    record_referral_transitions(
+        (referrer_id, ParticipationStatus.NEW, ParticipationStatus.EXPIRED)
+        for _, referrer_id in rows
+    )
+    UserProfile.bump_me_version(*(i for row in rows for i in row))
+
+
+def sweep_expired(*, chunk_size: int = EXPIRY_CHUNK_SIZE) -> ExpiryResult:
+    """Один проход sweeper: сначала заказы, затем освободившиеся участия."""
+    now = timezone.now()
+    result = ExpiryResult(
+        orders=expire_payment_orders(now=now, chunk_size=chunk_size),
+        participations=release_stale_participations(now=now, chunk_size=chunk_size),
+    )
+    if result.orders or result.participations:
+        logger.info(f"[Expiry] orders={result.orders} participations={result.participations}")
+    return result
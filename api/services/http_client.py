@@ -0,0 +1,126 @@
+"""
+Soulpull MVP — Shared HTTP Client
+
+Один requests.Session на процесс для внешних API (TonAPI, Toncenter):
+- пул соединений с keep-alive — без нового TCP+TLS handshake на каждый запрос
+- ограниченный размер пула на хост
+- таймауты (connect, read) по хосту
+- gzip/deflate ответы
+
+Session создаётся лениво и пересоздаётся после fork (gunicorn preload),
+чтобы воркеры не делили сокеты родителя.
+
+Для async views (ASGI) — httpx.AsyncClient с теми же лимитами и таймаутами,
+по одному на event loop.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))
+
+# (connect, read) секунды
+DEFAULT_TIMEOUT = (3.05, 15)
+HOST_TIMEOUTS = {
+    "tonapi.io": (3.05, 20),
+    "toncenter.com": (3.05, 15),
+}
+
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _build_session() -> requests.Session:
+    s = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=0,
+    )
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update({
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+        "User-Agent": "soulpull-backend",
+    })
+    return s
+
+
+def session() -> requests.Session:
+    """Общий Session текущего процесса."""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+
+def timeout_for(url: str) -> tuple[float, float]:
+    host = (urlsplit(url).hostname or "").lower()
+    for suffix, timeout in HOST_TIMEOUTS.items():
+        if host == suffix or host.endswith("." + suffix):
+            return timeout
+    return DEFAULT_TIMEOUT
+
+
+def get(url: str, *, headers: Optional[dict] = None, params: Optional[dict] = None, timeout=None) -> requests.Response:
+    """
+    GET через общий пул.
+
+    Raises:
+        requests.RequestException: сетевые ошибки (вызывающий сервис
+            оборачивает их в свой тип ошибки)
+    """
+    return session().get(url, headers=headers, params=params, timeout=timeout or timeout_for(url))
+
+
+def _build_async_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=HTTP_POOL_CONNECTIONS * HTTP_POOL_MAXSIZE,
+            max_keepalive_connections=HTTP_POOL_MAXSIZE,
+        ),
+        headers={
+            "Accept-Encoding": "gzip, deflate",
+            "User-Agent": "soulpull-backend",
+        },
+    )
+
+
+def async_client() -> httpx.AsyncClient:
+    """Общий AsyncClient текущего event loop (соединения привязаны к loop)."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = _async_clients[loop] = _build_async_client()
+    return client
+
+
+async def aget(url: str, *, headers: Optional[dict] = None, params: Optional[dict] = None, timeout=None) -> httpx.Response:
+    """
+    Async GET через общий пул текущего event loop.
+
+    Raises:
+        httpx.HTTPError: сетевые ошибки (вызывающий сервис оборачивает их
+            в свой тип ошибки)
+    """
+    connect, read = timeout or timeout_for(url)
+    return await async_client().get(
+        url, headers=headers, params=params, timeout=httpx.Timeout(read, connect=connect),
+    )
@@ -0,0 +1,146 @@
+"""
+Soulpull MVP — JettonTransfer payload
+
+TL-B (TEP-74):
+    transfer#0f8a7ea5 query_id:uint64 amount:(VarUInteger 16)
+        destination:MsgAddress response_destination:MsgAddress
+        custom_payload:(Maybe ^Cell) forward_ton_amount:(VarUInteger 16)
+        forward_payload:(Either Cell ^Cell)
+
+Комментарий кладётся в forward_payload отдельной ячейкой (text_comment:
+op=0 + UTF-8), так что корневая ячейка всегда одной длины, а сообщение
+не упирается в 1023 бита. forward_ton_amount > 0, иначе получатель не
+получит transfer_notification с комментарием.
+
+JettonTransferTemplate заранее собирает неизменные части (op, сумма,
+получатель, хвост) для пары (receiver, amount); на запрос остаётся
+вклеить query_id, адрес для сдачи и комментарий и собрать BOC из байтов.
+"""
+
+from functools import lru_cache
+from typing import Optional
+
+from api.services.ton_address import TonAddress, parse_address
+from api.services.ton_cells import Cell, TonCellError, begin_cell, serialize_cells, to_boc
+
+OP_JETTON_TRANSFER = 0x0F8A7EA5
+OP_TEXT_COMMENT = 0
+# 1 nanoTON — минимальный forward, чтобы получатель увидел комментарий
+DEFAULT_FORWARD_TON_AMOUNT = 1
+# Одна ячейка: 1023 бита - 32 бита op
+MAX_COMMENT_BYTES = 123
+
+ADDRESS_BITS = 267
+
+
+def _comment_bytes(comment: str) -> bytes:
+    data = comment.encode("utf-8")
+    if len(data) > MAX_COMMENT_BYTES:
+        raise TonCellError(f"comment longer than {MAX_COMMENT_BYTES} bytes")
+    return data
+
+
+def comment_cell(comment: str) -> Cell:
+    return begin_cell().store_uint(OP_TEXT_COMMENT, 32).store_bytes(_comment_bytes(comment)).end_cell()
+
+
+def build_jetton_transfer(
+    *,
+    query_id: int,
+    jetton_amount: int,
+    destination: TonAddress,
+    response_destination: Optional[TonAddress],
+    comment: str = "",
+    forward_ton_amount: int = DEFAULT_FORWARD_TON_AMOUNT,
+) -> Cell:
+    """Тело JettonTransfer через Builder (эталон для шаблона)."""
+    return (
+        begin_cell()
+        .store_uint(OP_JETTON_TRANSFER, 32)
+        .store_uint(query_id, 64)
+        .store_coins(jetton_amount)
+        .store_address(destination)
+        .store_address(response_destination)
+        .store_maybe_ref(None)  # custom_payload
+        .store_coins(forward_ton_amount)
+        .store_bit(1)  # forward_payload в ссылке
+        .store_ref(comment_cell(comment))
+        .end_cell()
+    )
+
+
+def jetton_transfer_boc(**kwargs) -> bytes:
+    return to_boc(build_jetton_transfer(**kwargs))
+
+
+def _address_int(address: TonAddress) -> int:
+    return (0b100 << 264) | ((address.workchain & 0xFF) << 256) | int.from_bytes(address.hash, "big")
+
+
+def _coins(amount: int) -> tuple[int, int]:
+    """(значение, длина в битах) поля VarUInteger 16."""
+    length = (amount.bit_length() + 7) // 8
+    if length > 15:
+        raise TonCellError("coins overflow")
+    return (length << (length * 8)) | amount, 4 + length * 8
+
+
+@lru_cache(maxsize=4096)
+def _response_address_int(address: str) -> int:
+    return _address_int(parse_address(address))
+
+
+class JettonTransferTemplate:
+    """
+    Предсобранный JettonTransfer для фиксированных (destination, amount,
+    forward_ton_amount). render() меняет только query_id, адрес для сдачи
+    и комментарий.
+    """
+
+    def __init__(
+        self,
+        *,
+        destination: TonAddress,
+        jetton_amount: int,
+        forward_ton_amount: int = DEFAULT_FORWARD_TON_AMOUNT,
+    ):
+        amount, amount_bits = _coins(int(jetton_amount))
+        forward, forward_bits = _coins(int(forward_ton_amount))
+
+        # [op | query_id] [amount | destination] [response] [no custom_payload | forward | 1]
+        self._middle = (amount << ADDRESS_BITS) | _address_int(destination)
+        self._middle_bits = amount_bits + ADDRESS_BITS
+        self._tail = (((0 << forward_bits) | forward) << 1) | 1
+        self._tail_bits = 1 + forward_bits + 1
+
+        bits = 32 + 64 + self._middle_bits + ADDRESS_BITS + self._tail_bits
+        self._nbytes = (bits + 7) // 8
+        self._pad = self._nbytes * 8 - bits
+        # Маркер конца данных (бит 1) для неполного последнего байта
+        self._marker = (1 << (self._pad - 1)) if self._pad else 0
+        self._root_d1d2 = bytes([1, (bits // 8) + self._nbytes])
+
+    def render(self, *, query_id: int, response_destination: str, comment: str) -> bytes:
+        """BOC тела JettonTransfer."""
+        if not 0 <= query_id < (1 << 64):
+            raise TonCellError("query_id must fit uint64")
+        acc = (OP_JETTON_TRANSFER << 64) | query_id
+        acc = (acc << self._middle_bits) | self._middle
+        acc = (acc << ADDRESS_BITS) | _response_address_int(response_destination)
+        acc = (acc << self._tail_bits) | self._tail
+        root = self._root_d1d2 + ((acc << self._pad) | self._marker).to_bytes(self._nbytes, "big")
+
+        text = _comment_bytes(comment)
+        comment_len = 4 + len(text)
+        comment_body = bytes([0, comment_len * 2]) + b"\x00\x00\x00\x00" + text
+        return serialize_cells([(root, (1,)), (comment_body, ())])
+
+
+@lru_cache(maxsize=32)
+def get_template(destination: str, jetton_amount: int, forward_ton_amount: int = DEFAULT_FORWARD_TON_AMOUNT) -> JettonTransferTemplate:
+    """Шаблон на (получатель, сумма) — собирается один раз на процесс."""
+    return JettonTransferTemplate(
+        destination=parse_address(destination),
+        jetton_amount=jetton_amount,
+        forward_ton_amount=forward_ton_amount,
+    )
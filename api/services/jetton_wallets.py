@@ -0,0 +1,201 @@
+"""
+Soulpull MVP — Jetton Wallet Cache
+
+Адрес jetton-wallet пары (owner, master) не меняется, поэтому Toncenter
+спрашиваем не больше одного раза на пару:
+
+    in-process LRU → локальная деривация из StateInit (если для мастера
+    настроен код, см. toncenter.configured_wallet_code) → таблица
+    JettonWalletCache → Toncenter (и запись в оба кэша)
+
+При привязке кошелька (wallet / tonproof_verify) пара, которой ещё нет
+в кэше, сверяется с Toncenter; уже известная пара сеть не трогает. При
+расхождении деривация отключается флагом SystemFlag
+(system_flags.JETTON_DERIVATION_DISABLED) и дальше работает только путь
+через Toncenter. LRU помнит, откуда взят адрес: вычисленный локально
+отдаётся из LRU только при выключенном флаге, так что другие процессы
+перестают его использовать, не дожидаясь очистки своего LRU.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from django.db import IntegrityError, transaction
+
+from api.models import JettonWalletCache
+from api.services import system_flags
+from api.services.ton_address import canonical_raw
+from api.services.toncenter import (
+    ToncenterError,
+    configured_wallet_code,
+    derive_jetton_wallet_address,
+    get_jetton_wallet_address,
+)
+
+logger = logging.getLogger(__name__)
+
+JETTON_WALLET_LRU_SIZE = int(os.getenv("JETTON_WALLET_LRU_SIZE", "4096"))
+
+
+class _WalletLRU:
+    """(owner_raw, master_raw) → (адрес, derived); derived — адрес вычислен локально."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, str], tuple[str, bool]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple[str, str]) -> Optional[tuple[str, bool]]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: tuple[str, str], address: str, *, derived: bool = False) -> None:
+        with self._lock:
+            self._entries[key] = (address, derived)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+wallet_lru = _WalletLRU(JETTON_WALLET_LRU_SIZE)
+
+
+def _key(owner_address: str, jetton_master_address: str) -> tuple[str, str]:
+    owner = (owner_address or "").strip()
+    master = (jetton_master_address or "").strip()
+    return canonical_raw(owner) or owner, canonical_raw(master) or master
+
+
+def _lru_get(key: tuple[str, str]) -> str:
+    """Адрес из LRU; локально вычисленный — только пока деривация не отключена."""
+    entry = wallet_lru.get(key)
+    if not entry:
+        return ""
+    address, derived = entry
+    if derived and system_flags.is_set(system_flags.JETTON_DERIVATION_DISABLED):
+        return ""
+    return address
+
+
+def _derive(owner_address: str, jetton_master_address: str) -> str:
+    """Локально вычисленный адрес или "" (деривация не настроена/отключена)."""
+    config = configured_wallet_code(jetton_master_address)
+    if not config or system_flags.is_set(system_flags.JETTON_DERIVATION_DISABLED):
+        return ""
+    code, layout = config
+    try:
+        return derive_jetton_wallet_address(
+            owner_address=owner_address,
+            jetton_master_address=jetton_master_address,
+            wallet_code_boc=code,
+            layout=layout,
+        )
+    except ToncenterError as e:
+        logger.warning(f"[JettonWallet] offline derivation failed: {e}")
+        return ""
+
+
+def _store_row(key: tuple[str, str], jetton_wallet: str) -> None:
+    try:
+        with transaction.atomic():
+            JettonWalletCache.objects.create(
+                owner_raw=key[0], master_raw=key[1], jetton_wallet=jetton_wallet,
+            )
+    except IntegrityError:
+        # Параллельный запрос уже записал ту же пару
+        pass
+
+
+def resolve_jetton_wallet(*, owner_address: str, jetton_master_address: str) -> str:
+    """
+    Адрес jetton-wallet владельца (кэш, локальная деривация или Toncenter).
+
+    Raises:
+        ToncenterError: адрес не вычисляется локально, его нет ни в кэше, ни в Toncenter
+    """
+    key = _key(owner_address, jetton_master_address)
+    if not key[0]:
+        raise ToncenterError("missing owner_address")
+    if not key[1]:
+        raise ToncenterError("missing jetton_master_address")
+
+    cached = _lru_get(key)
+    if cached:
+        return cached
+
+    derived = _derive(owner_address, jetton_master_address)
+    if derived:
+        wallet_lru.put(key, derived, derived=True)
+        return derived
+
+    row = JettonWalletCache.objects.filter(owner_raw=key[0], master_raw=key[1]).only("jetton_wallet").first()
+    if row:
+        wallet_lru.put(key, row.jetton_wallet)
+        return row.jetton_wallet
+
+    jetton_wallet = get_jetton_wallet_address(owner_address=owner_address, jetton_master_address=jetton_master_address)
+    _store_row(key, jetton_wallet)
+    wallet_lru.put(key, jetton_wallet)
+    return jetton_wallet
+
+
+def verify_derivation(*, owner_address: str, jetton_master_address: str) -> Optional[bool]:
+    """
+    Сверить локальную деривацию с Toncenter для одной пары.
+
+    Returns:
+        None — деривация не настроена; True/False — совпала ли с Toncenter.
+
+    Raises:
+        ToncenterError: Toncenter недоступен
+    """
+    derived = _derive(owner_address, jetton_master_address)
+    if not derived:
+        return None
+    remote = get_jetton_wallet_address(owner_address=owner_address, jetton_master_address=jetton_master_address)
+    _store_row(_key(owner_address, jetton_master_address), remote)
+    if canonical_raw(remote) == canonical_raw(derived):
+        return True
+
+    logger.error(
+        f"[JettonWallet] derivation mismatch for {owner_address}: local={derived} toncenter={remote}; "
+        f"offline derivation disabled, check USDT_JETTON_WALLET_CODE / USDT_JETTON_WALLET_LAYOUT"
+    )
+    system_flags.set_flag(system_flags.JETTON_DERIVATION_DISABLED)
+    wallet_lru.clear()
+    return False
+
+
+def _is_cached(key: tuple[str, str]) -> bool:
+    if _lru_get(key):
+        return True
+    return JettonWalletCache.objects.filter(owner_raw=key[0], master_raw=key[1]).exists()
+
+
+def warm_jetton_wallet(owner_address: str) -> None:
+    """
+    Прогреть кэш (или сверить деривацию) для USDT_JETTON_MASTER при
+    привязке кошелька. Пара, которая уже есть в LRU или JettonWalletCache,
+    не стоит запроса в Toncenter. Ошибки только логируются — привязка
+    кошелька от Toncenter не зависит.
+    """
+    master = (os.getenv("USDT_JETTON_MASTER") or "").strip()
+    if not master or not owner_address:
+        return
+    if _is_cached(_key(owner_address, master)):
+        return
+    try:
+        if verify_derivation(owner_address=owner_address, jetton_master_address=master) is None:
+            resolve_jetton_wallet(owner_address=owner_address, jetton_master_address=master)
+    except ToncenterError as e:
+        logger.warning(f"[JettonWallet] warm-up failed for {owner_address}: {e}")
@@ -0,0 +1,222 @@
+"""
+Soulpull MVP — Leaderboard
+
+Лидерборды рефереров без агрегатов по participations / user_profiles на
+запрос:
+
+- LeaderboardEntry — score пользователя по каждому борду, индекс
+  (score DESC, user) отдаёт страницу топа range scan'ом
+- LeaderboardBucket — гистограмма (board, score) → число пользователей;
+  ранг = 1 + сумма корзин с большим score (competition ranking: равные
+  score делят ранг). Различных score мало, сумма дешёвая
+
+record() меняет score в строке пользователя (в транзакции события:
+confirm реферала, начисление очков), а перенос между корзинами только
+дописывает в журнал LeaderboardBucketDelta: корзины общие для всех, и
+UPDATE их строк в каждом confirm выстраивал бы переходы в очередь.
+rollup_leaderboard сворачивает журнал (один UPDATE на корзину за пачку),
+ранги отстают от score на интервал свёртки. Пользователи с score 0 в
+корзинах не хранятся и в топ не попадают; их ранг = 1 + число
+пользователей с score > 0.
+
+points-борд обновляет rollup_points (services/points) при свёртке
+журнала очков. Расхождения (запись мимо record) чинит
+manage.py rebuild_leaderboard.
+"""
+
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from api.models import (
+    LeaderboardBucket,
+    LeaderboardBucketDelta,
+    LeaderboardEntry,
+    Participation,
+    ParticipationStatus,
+    UserProfile,
+)
+
+L1 = "l1"
+POINTS = "points"
+# board → поле LeaderboardEntry
+BOARDS = {
+    L1: "confirmed_l1",
+    POINTS: "points",
+}
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+ROLLUP_CHUNK_SIZE = 1000
+
+
+def _bump_bucket(board: str, score: int, delta: int) -> None:
+    if score <= 0 or not delta:
+        return
+    if delta > 0:
+        LeaderboardBucket.objects.bulk_create([LeaderboardBucket(board=board, score=score)], ignore_conflicts=True)
+    LeaderboardBucket.objects.filter(board=board, score=score).update(users=F("users") + delta)
+
+
+def record(user_id: Optional[int], board: str, delta: int) -> None:
+    """Изменить score user_id в board на delta. Вызывать в транзакции события."""
+    if not user_id or not delta:
+        return
+    field = BOARDS[board]
+    with transaction.atomic():
+        LeaderboardEntry.objects.bulk_create([LeaderboardEntry(user_id=user_id)], ignore_conflicts=True)
+        old = LeaderboardEntry.objects.select_for_update().values_list(field, flat=True).get(user_id=user_id)
+        LeaderboardEntry.objects.filter(user_id=user_id).update(**{field: F(field) + delta})
+        LeaderboardBucketDelta.objects.bulk_create([
+            LeaderboardBucketDelta(board=board, score=score, delta=d)
+            for score, d in ((old, -1), (old + delta, 1))
+            if score > 0
+        ])
+
+
+def rollup_leaderboard(*, chunk_size: int = ROLLUP_CHUNK_SIZE) -> int:
+    """
+    Свернуть журнал LeaderboardBucketDelta в корзины, пачками по chunk_size;
+    применённые строки удаляются в той же транзакции. Возвращает число строк.
+    """
+    applied = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                LeaderboardBucketDelta.objects.select_for_update(skip_locked=True)
+                .order_by("id")
+                .values_list("id", "board", "score", "delta")[:chunk_size]
+            )
+            if not rows:
+                return applied
+            net: Counter = Counter()
+            for _, board, score, delta in rows:
+                net[board, score] += delta
+            for (board, score), delta in net.items():
+                _bump_bucket(board, score, delta)
+            LeaderboardBucketDelta.objects.filter(id__in=[row[0] for row in rows]).delete()
+        applied += len(rows)
+        if len(rows) < chunk_size:
+            return applied
+
+
+def rank_subquery(board: str, score):
+    """Ранг для score (выражение / OuterRef) — для annotate() одним запросом."""
+    above = (
+        LeaderboardBucket.objects.filter(board=board, score__gt=score)
+        .order_by()
+        .values("board")
+        .annotate(n=Sum("users"))
+        .values("n")
+    )
+    return Coalesce(Subquery(above), 0) + 1
+
+
+def score_subquery(board: str, user_ref: str = "pk"):
+    entry = LeaderboardEntry.objects.filter(user_id=OuterRef(user_ref)).values(BOARDS[board])
+    return Coalesce(Subquery(entry), 0)
+
+
+@dataclass
+class LeaderboardPage:
+    board: str
+    page: int
+    page_size: int
+    total: int
+    items: list[dict]
+    has_next: bool
+
+
+def get_page(board: str, page: int = 1, page_size: int = PAGE_SIZE) -> LeaderboardPage:
+    """
+    Страница топа: entries по индексу (score DESC, user), затем корзины
+    только в диапазоне score страницы (range scan по uniq (board, score))
+    плюс одна агрегатная сумма — число пользователей выше страницы и total.
+    Три запроса; объём чтения не зависит от глубины страницы.
+    """
+    field = BOARDS[board]
+    offset = (page - 1) * page_size
+    rows = list(
+        LeaderboardEntry.objects.filter(**{f"{field}__gt": 0})
+        .select_related("user")
+        .order_by(f"-{field}", "user_id")[offset:offset + page_size + 1]
+    )
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+
+    buckets = LeaderboardBucket.objects.filter(board=board, users__gt=0)
+    high = getattr(rows[0], field) if rows else 0
+    low = getattr(rows[-1], field) if rows else 0
+    sums = buckets.aggregate(total=Sum("users"), above=Sum("users", filter=Q(score__gt=high)))
+    total = sums["total"] or 0
+
+    # users с score строго выше, по убыванию score — только в пределах страницы.
+    # Ранг считается для score строк, а не корзин: score, корзина которого ещё
+    # в журнале, получает ранг по той же формуле, и ранги не идут вспять
+    above: dict[int, int] = {}
+    running = sums["above"] or 0
+    if rows:
+        page_buckets = list(buckets.filter(score__range=(low, high)).order_by("-score").values_list("score", "users"))
+        scores = sorted({getattr(e, field) for e in rows}, reverse=True)
+        i = 0
+        for score in scores:
+            while i < len(page_buckets) and page_buckets[i][0] > score:
+                running += page_buckets[i][1]
+                i += 1
+            above[score] = running
+
+    items = [
+        {
+            "rank": above[getattr(e, field)] + 1,
+            "telegram_id": e.user.telegram_id,
+            "username": e.user.username,
+            "score": getattr(e, field),
+        }
+        for e in rows
+    ]
+    return LeaderboardPage(board, page, page_size, total, items, has_next)
+
+
+def rebuild_leaderboard() -> int:
+    """
+    Пересчитать entries и корзины из participations и user_profiles. Возвращает число entries.
+
+    Одна транзакция, первой идёт запись: write-lock базы не даёт record()
+    закоммитить score между чтением и заменой, так что журнал целиком
+    учтён в пересчёте и удаляется.
+    """
+    confirmed = (
+        Participation.objects.filter(referrer_id=OuterRef("pk"), status=ParticipationStatus.CONFIRMED)
+        .order_by()
+        .values("referrer_id")
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    scored = (
+        UserProfile.objects.annotate(lb_l1=Coalesce(Subquery(confirmed), 0))
+        .filter(Q(lb_l1__gt=0) | ~Q(points=0))
+        .values_list("id", "lb_l1", "points")
+    )
+    with transaction.atomic():
+        LeaderboardBucketDelta.objects.all().delete()
+        LeaderboardEntry.objects.all().delete()
+        LeaderboardBucket.objects.all().delete()
+
+        entries = [LeaderboardEntry(user_id=uid, confirmed_l1=l1, points=points) for uid, l1, points in scored.iterator()]
+        buckets: Counter = Counter()
+        for e in entries:
+            for board, field in BOARDS.items():
+                score = getattr(e, field)
+                if score > 0:
+                    buckets[board, score] += 1
+
+        LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+        LeaderboardBucket.objects.bulk_create(
+            [LeaderboardBucket(board=b, score=s, users=n) for (b, s), n in buckets.items()],
+            batch_size=1000,
+        )
+    return len(entries)
@@ -0,0 +1,44 @@
+"""
+Soulpull MVP — /me Response Cache
+
+Готовое тело ответа /me (JSON bytes) кэшируется по ETag. Версия
+растёт в той же транзакции, что и запись, меняющая ответ (UserProfile.save,
+UserProfile.bump_me_version), поэтому инвалидация не нужна: новая версия —
+новый ключ, старые записи вытесняет TTL.
+
+ETag = "me-<user_id>-<version>[-<parts>]": клиент с актуальным
+If-None-Match получает 304 без тела. parts — поля, которые меняются без
+записи пользователя (ранг в лидерборде): они входят и в ETag, и в ключ,
+так что закэшированное тело уже содержит ранг и попадание не сериализует
+ничего.
+
+Кэш должен быть общим для воркеров (settings.CACHES: Redis или файловый):
+LocMemCache у каждого процесса свой, и попадания почти не случались бы.
+
+Смена username реферала (/register) поднимает и версию его реферера:
+строка в списке L1 входит в тело, и без новой версии клиент с прежним
+If-None-Match получал бы 304 со старым username сколько угодно долго.
+"""
+
+import os
+from typing import Optional
+
+from django.core.cache import cache
+
+ME_CACHE_TTL = int(os.getenv("ME_CACHE_TTL", "600"))
+
+
+def etag(user_id: int, version: int, *parts) -> str:
+    return '"' + "-".join(map(str, ("me", user_id, version, *parts))) + '"'
+
+
+def _key(tag: str) -> str:
+    return "me:" + tag.strip('"')
+
+
+def get(tag: str) -> Optional[bytes]:
+    return cache.get(_key(tag))
+
+
+def put(tag: str, body: bytes) -> None:
+    cache.set(_key(tag), body, ME_CACHE_TTL)
@@ -0,0 +1,237 @@
+"""
+Soulpull MVP — Participation transitions
+
+Общие переходы статуса Participation для admin /confirm и автоподтверждения
+USDT-платежей (manage.py confirm_usdt_payments):
+
+- confirm_participation: NEW|PENDING → CONFIRMED с проверкой дубля tx_hash
+  (RiskEvent DUP_TX)
+- reject_participation: NEW|PENDING → REJECTED
+- reserve_referral_slot: занять слот реферера (3/3) для нового intent
+
+Каждый переход реферала меняет счётчики used_slots / confirmed_l1 на
+CONFIRMED участии реферера в той же транзакции
+(record_referral_transition); rebuild_referral_counters сверяет их с
+participations и чинит расхождения.
+"""
+
+from collections import Counter
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Least
+from django.utils import timezone
+
+from api.models import (
+    REFERRAL_SLOT_LIMIT,
+    Participation,
+    ParticipationStatus,
+    RiskEvent,
+    RiskEventKind,
+    UserProfile,
+)
+from api.services import leaderboard, referral_tree, system_flags
+
+OPEN_STATUSES = (ParticipationStatus.NEW, ParticipationStatus.PENDING)
+# Занимают слот реферера (лимит 3/3)
+SLOT_STATUSES = (ParticipationStatus.NEW, ParticipationStatus.PENDING, ParticipationStatus.CONFIRMED)
+
+
+class ParticipationError(ValueError):
+    """code — машинный код ошибки для API (invalid_status, dup_tx)."""
+
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+def _counter_delta(old_status: Optional[str], new_status: Optional[str]) -> tuple[int, int]:
+    """(Δused_slots, Δconfirmed_l1) для перехода реферала old → new (None — нет записи)."""
+    used = (new_status in SLOT_STATUSES) - (old_status in SLOT_STATUSES)
+    confirmed = (new_status == ParticipationStatus.CONFIRMED) - (old_status == ParticipationStatus.CONFIRMED)
+    return used, confirmed
+
+
+def record_referral_transition(
+    referrer_id: Optional[int],
+    old_status: Optional[str],
+    new_status: Optional[str],
+    count: int = 1,
+) -> None:
+    """
+    Учесть переход count рефералов referrer_id в счётчиках его CONFIRMED участия.
+
+    Вызывать внутри транзакции, в которой меняется статус реферала.
+    """
+    if not referrer_id:
+        return
+    used, confirmed = _counter_delta(old_status, new_status)
+    if not used and not confirmed:
+        return
+    Participation.objects.filter(user_id=referrer_id, status=ParticipationStatus.CONFIRMED).update(
+        used_slots=F("used_slots") + used * count,
+        confirmed_l1=F("confirmed_l1") + confirmed * count,
+    )
+
+
+def record_referral_transitions(transitions: Iterable[tuple[Optional[int], Optional[str], Optional[str]]]) -> None:
+    """Пакетный record_referral_transition: один UPDATE на (реферер, переход)."""
+    for (referrer_id, old_status, new_status), count in Counter(transitions).items():
+        record_referral_transition(referrer_id, old_status, new_status, count)
+
+
+def reserve_referral_slot(referrer_participation_id: int) -> bool:
+    """
+    Занять слот на CONFIRMED участии реферера (переход реферала None → NEW).
+
+    Один условный UPDATE ... SET used_slots = used_slots + 1 WHERE
+    used_slots < REFERRAL_SLOT_LIMIT: проверка и инкремент атомарны, блокировка
+    реферера и COUNT не нужны. False — слотов нет (или участие уже не
+    CONFIRMED). Вызывать в транзакции, которая создаёт участие реферала.
+    """
+    return bool(
+        Participation.objects.filter(
+            id=referrer_participation_id,
+            status=ParticipationStatus.CONFIRMED,
+            used_slots__lt=REFERRAL_SLOT_LIMIT,
+        ).update(used_slots=F("used_slots") + 1)
+    )
+
+
+def _check_open(participation: Participation) -> None:
+    if participation.status not in OPEN_STATUSES:
+        raise ParticipationError("invalid_status", f"Participation already {participation.status}")
+
+
+def _dup_tx(participation: Participation, tx_hash: str, meta: Optional[dict]) -> None:
+    RiskEvent.objects.create(
+        user_id=participation.user_id,
+        kind=RiskEventKind.DUP_TX,
+        meta={"tx_hash": tx_hash, "participation_id": participation.id, **(meta or {})},
+    )
+    raise ParticipationError("dup_tx", "Transaction hash already used")
+
+
+def confirm_participation(participation: Participation, *, tx_hash: Optional[str] = None, meta: Optional[dict] = None) -> None:
+    """
+    Подтвердить участие.
+
+    Переход делается условным UPDATE ... WHERE status IN (NEW, PENDING), так что
+    admin и воркер не подтвердят одну запись дважды.
+
+    Raises:
+        ParticipationError: участие уже закрыто (invalid_status) или tx_hash
+            уже использован другим участием (dup_tx, пишется RiskEvent)
+    """
+    _check_open(participation)
+    tx_hash = (tx_hash or "").strip() or None
+
+    if tx_hash and Participation.objects.filter(tx_hash=tx_hash).exclude(id=participation.id).exists():
+        _dup_tx(participation, tx_hash, meta)
+
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            updated = Participation.objects.filter(id=participation.id, status__in=OPEN_STATUSES).update(
+                status=ParticipationStatus.CONFIRMED,
+                tx_hash=tx_hash,
+                confirmed_at=now,
+            )
+            if updated:
+                record_referral_transition(participation.referrer_id, participation.status, ParticipationStatus.CONFIRMED)
+                UserProfile.bump_me_version(participation.user_id, participation.referrer_id)
+                system_flags.set_flag(system_flags.SEEDED)
+                referral_tree.record_volume(participation.user_id, 1)
+                leaderboard.record(participation.referrer_id, leaderboard.L1, 1)
+    except IntegrityError:
+        # Тот же tx_hash записали параллельно (unique)
+        _dup_tx(participation, tx_hash, meta)
+    if not updated:
+        participation.refresh_from_db(fields=["status"])
+        raise ParticipationError("invalid_status", f"Participation already {participation.status}")
+
+    participation.status = ParticipationStatus.CONFIRMED
+    participation.tx_hash = tx_hash
+    participation.confirmed_at = now
+
+
+def reject_participation(participation: Participation, *, tx_hash: Optional[str] = None) -> None:
+    """
+    Raises:
+        ParticipationError: участие уже закрыто (invalid_status)
+    """
+    _check_open(participation)
+    old_status = participation.status
+    participation.status = ParticipationStatus.REJECTED
+    if tx_hash:
+        participation.tx_hash = tx_hash
+    participation.confirmed_at = timezone.now()
+    with transaction.atomic():
+        participation.save(update_fields=["status", "tx_hash", "confirmed_at"])
+        record_referral_transition(participation.referrer_id, old_status, ParticipationStatus.REJECTED)
+        UserProfile.bump_me_version(participation.user_id, participation.referrer_id)
+
+
+# ----------------------------------------------------------------------------
+# Сверка счётчиков
+# ----------------------------------------------------------------------------
+
+@dataclass
+class CounterDrift:
+    participation_id: int
+    user_id: int
+    used_slots: tuple[int, int]  # (было, должно быть)
+    confirmed_l1: tuple[int, int]
+
+
+def _expected_counters():
+    """Participation с фактическими значениями счётчиков (expected_used, expected_confirmed)."""
+    referrals = Participation.objects.filter(referrer_id=OuterRef("user_id")).order_by().values("referrer_id")
+    used = referrals.filter(status__in=SLOT_STATUSES).annotate(n=Count("id")).values("n")
+    confirmed = referrals.filter(
+        status=ParticipationStatus.CONFIRMED,
+        created_at__gt=OuterRef("created_at"),
+    ).annotate(n=Count("user_id", distinct=True)).values("n")
+    holder = Q(status=ParticipationStatus.CONFIRMED)
+    return Participation.objects.annotate(
+        # Переполненные до CHECK рефереры остаются на лимите
+        expected_used=Least(Coalesce(Subquery(used, output_field=IntegerField()), 0), REFERRAL_SLOT_LIMIT),
+        expected_confirmed=Coalesce(Subquery(confirmed, output_field=IntegerField()), 0),
+    ).filter(
+        # Счётчики живут только на CONFIRMED участиях; у остальных — нули
+        (holder & (~Q(used_slots=F("expected_used")) | ~Q(confirmed_l1=F("expected_confirmed"))))
+        | (~holder & (Q(used_slots__gt=0) | Q(confirmed_l1__gt=0)))
+    )
+
+
+def rebuild_referral_counters(*, fix: bool = True, chunk_size: int = 500) -> list[CounterDrift]:
+    """
+    Найти участия с неверными used_slots / confirmed_l1 и (при fix) исправить.
+
+    Один проход по расходящимся строкам (фактические значения считаются
+    подзапросами в той же выборке).
+    """
+    drift: list[CounterDrift] = []
+    batch: list[Participation] = []
+
+    def flush():
+        with transaction.atomic():
+            Participation.objects.bulk_update(batch, ["used_slots", "confirmed_l1"])
+            UserProfile.bump_me_version(*(p.user_id for p in batch))
+        batch.clear()
+
+    for p in _expected_counters().only("id", "user_id", "status", "created_at", "used_slots", "confirmed_l1").iterator(chunk_size=chunk_size):
+        holder = p.status == ParticipationStatus.CONFIRMED
+        used = p.expected_used if holder else 0
+        confirmed = p.expected_confirmed if holder else 0
+        drift.append(CounterDrift(p.id, p.user_id, (p.used_slots, used), (p.confirmed_l1, confirmed)))
+        if fix:
+            p.used_slots, p.confirmed_l1 = used, confirmed
+            batch.append(p)
+            if len(batch) >= chunk_size:
+                flush()
+    if fix and batch:
+        flush()
+    return drift
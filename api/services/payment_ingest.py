@@ -0,0 +1,323 @@
+"""
+Soulpull MVP — Payment Ingester
+
+Фоновая проверка PaymentOrder через TonAPI.
+
+Вместо того чтобы каждый GET /payments/<order_id>/status ходил в TonAPI,
+воркер (manage.py ingest_payments) инкрементально читает события
+кошелька-получателя, сопоставляет их с pending заказами и вызывает mark_paid.
+Status view после этого просто читает строку из БД.
+
+Курсор (TonApiCursor.last_lt) хранится в БД, поэтому каждое событие
+обрабатывается один раз, даже после рестарта воркера. За проход события
+листаются страницами (before_lt) назад до курсора или до created_at самого
+старого pending заказа — в пиковые периоды платежи не выпадают со страницы.
+Список pending берётся до скана (граница по времени) и дочитывается после
+него, так что курсор не перешагивает оплату заказа, созданного во время скана.
+Скан, упёршийся в max_pages, продолжается следующим проходом с места остановки.
+
+Истёкший заказ ещё LATE_PAYMENT_GRACE_SECONDS остаётся в pending-выборке:
+перевод засчитывается, если его timestamp не позже expires_at (+ запас на
+расхождение часов), даже когда событие дошло до ингестера позже.
+
+Пакетная сверка (manage.py verify_pending_orders) не использует курсор:
+одним запросом берёт все pending заказы, группирует по получателю, читает
+события каждого получателя один раз и отмечает paid/expired пачками в
+одной транзакции.
+"""
+
+import logging
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from api.models import PaymentOrder, PaymentOrderStatus, TonApiCursor
+from api.services.tonapi import TonApiError, TransferIndex, event_lt, scan_account_events
+
+logger = logging.getLogger(__name__)
+
+# Запас на расхождение часов при сравнении created_at/expires_at заказа и timestamp события
+CLOCK_SKEW_SECONDS = 60
+# Сколько истёкший заказ ещё остаётся pending: перевод, отправленный до
+# expires_at, может дойти до ингестера/webhook позже
+LATE_PAYMENT_GRACE_SECONDS = int(os.getenv("PAYMENT_LATE_GRACE_SECONDS", "600"))
+
+
+@dataclass
+class IngestResult:
+    fetched: int = 0
+    new_events: int = 0
+    cursor_lt: int = 0
+    complete: bool = True
+    paid: list[str] = field(default_factory=list)
+
+
+@dataclass
+class SweepResult:
+    pending: int = 0
+    receivers: int = 0
+    fetched: int = 0
+    paid: list[str] = field(default_factory=list)
+    expired: int = 0
+    errors: dict[str, str] = field(default_factory=dict)
+
+
+def receiver_address() -> str:
+    return (os.getenv("PAYMENT_RECEIVER_TON") or "").strip()
+
+
+def order_receiver(order: PaymentOrder) -> str:
+    """Получатель заказа; у старых заказов поле пустое — берём PAYMENT_RECEIVER_TON."""
+    return (order.receiver_address or receiver_address()).strip()
+
+
+def paid_until(order: PaymentOrder) -> int:
+    """Последний timestamp события, которое ещё засчитывается как оплата заказа."""
+    return int(order.deadline().timestamp()) + CLOCK_SKEW_SECONDS
+
+
+def _pending_orders(receiver: Optional[str] = None, public_ids: Optional[Iterable[str]] = None) -> list[PaymentOrder]:
+    orders = PaymentOrder.objects.filter(status=PaymentOrderStatus.PENDING).exclude(wallet_address="")
+    if public_ids is not None:
+        orders = orders.filter(public_id__in=list(public_ids))
+    # Недавно истёкшие заказы остаются в выборке: засчитается только перевод,
+    # сделанный до expires_at (см. paid_until)
+    grace = timezone.timedelta(seconds=LATE_PAYMENT_GRACE_SECONDS)
+    now = timezone.now()
+    orders = [o for o in orders.select_related("participation") if now < o.deadline() + grace]
+    if receiver is not None:
+        # Заказы без receiver_address созданы до появления поля — подходят любому получателю
+        orders = [o for o in orders if o.receiver_address in ("", receiver)]
+    return orders
+
+
+def _mark_paid_bulk(matches: list[tuple[PaymentOrder, dict]]) -> list[str]:
+    """
+    Отметить пачку заказов оплаченными в одной транзакции.
+
+    Каждый заказ сначала «захватывается» условным UPDATE ... WHERE status=pending —
+    если его уже подтвердил параллельный воркер/webhook, он пропускается.
+    Ошибка по одному заказу (например, tx_hash участия уже занят) откатывает
+    только его savepoint, остальные заказы пачки фиксируются.
+    """
+    paid = []
+    with transaction.atomic():
+        for order, hit in matches:
+            try:
+                with transaction.atomic():
+                    claimed = PaymentOrder.objects.filter(
+                        pk=order.pk, status=PaymentOrderStatus.PENDING,
+                    ).update(status=PaymentOrderStatus.PAID)
+                    if not claimed:
+                        continue
+                    order.mark_paid(event_id=hit.get("event_id", ""), tx_hash=hit.get("tx_hash", ""))
+            except IntegrityError as e:
+                logger.error(f"[Ingest] Order {order.public_id} not marked paid: {e}")
+                continue
+            logger.info(f"[Ingest] Order {order.public_id} paid! event_id={hit.get('event_id')}")
+            paid.append(order.public_id)
+    return paid
+
+
+def _expire_bulk(order_ids: list[int]) -> int:
+    if not order_ids:
+        return 0
+    with transaction.atomic():
+        return PaymentOrder.objects.filter(
+            pk__in=order_ids, status=PaymentOrderStatus.PENDING,
+        ).update(status=PaymentOrderStatus.EXPIRED)
+
+
+def match_pending_orders(events: list[dict], *, receiver: str, orders: Optional[list[PaymentOrder]] = None) -> list[str]:
+    """
+    Сопоставить события (TonAPI events) с pending заказами и отметить оплаченные.
+    Общий путь для ингестера и webhook. Перевод засчитывается, только если
+    он сделан до истечения заказа (с запасом CLOCK_SKEW_SECONDS).
+
+    Без orders из БД читаются только pending заказы, чьи ключи SP:<public_id>
+    встречаются в комментариях событий, а не весь pending-список.
+
+    Returns:
+        public_id оплаченных заказов
+    """
+    if not events:
+        return []
+    index = TransferIndex.from_events({"events": events}, receiver=receiver)
+    if orders is None:
+        public_ids = [key[len("SP:"):] for key in index.by_comment]
+        orders = _pending_orders(receiver, public_ids) if public_ids else []
+    if not orders:
+        return []
+
+    matches = []
+    for order in orders:
+        hit = index.match(
+            sender=order.wallet_raw or order.wallet_address,
+            amount_nano=order.amount_nano,
+            comment=f"SP:{order.public_id}",
+            max_timestamp=paid_until(order),
+        )
+        if hit:
+            matches.append((order, hit))
+    return _mark_paid_bulk(matches) if matches else []
+
+
+def scan_from_cursor(
+    cursor: TonApiCursor,
+    account: str,
+    *,
+    min_timestamp: int,
+    limit: int,
+    max_pages: int,
+) -> tuple[list[dict], bool]:
+    """
+    События account новее cursor.last_lt (от новых к старым).
+
+    Если прошлый скан упёрся в max_pages, листаем дальше с места остановки
+    (resume_before_lt), а не перечитываем те же верхние страницы.
+    """
+    return scan_account_events(
+        account,
+        stop_lt=cursor.last_lt,
+        min_timestamp=min_timestamp,
+        before_lt=cursor.resume_before_lt or None,
+        limit=limit,
+        max_pages=max_pages,
+    )
+
+
+def advance_cursor(cursor: TonApiCursor, events: list[dict], complete: bool) -> None:
+    """
+    Продвинуть курсор после обработки events из scan_from_cursor.
+
+    Неполный скан запоминает место остановки и свою вершину; last_lt
+    переносится на вершину прерванного скана, только когда хвост дочитан.
+    Через события, которые ещё in_progress, курсор не перешагивает.
+    """
+    settled = [ev for ev in events if not ev.get("in_progress")]
+    # Вершина этого скана; при продолжении — вершина прерванного скана
+    high_water, event_id = cursor.resume_high_lt, ""
+    if settled and not cursor.resume_before_lt:
+        newest = max(settled, key=event_lt)
+        high_water, event_id = event_lt(newest), str(newest.get("event_id") or "")
+    in_progress = [event_lt(ev) for ev in events if ev.get("in_progress")]
+    if in_progress and high_water > min(in_progress) - 1:
+        high_water, event_id = min(in_progress) - 1, ""
+
+    if not complete:
+        cursor.resume_before_lt = min(event_lt(ev) for ev in events)
+        cursor.resume_high_lt = high_water
+        cursor.save(update_fields=["resume_before_lt", "resume_high_lt", "updated_at"])
+    elif high_water > cursor.last_lt or cursor.resume_before_lt:
+        cursor.last_lt = max(high_water, cursor.last_lt)
+        cursor.last_event_id = event_id
+        cursor.resume_before_lt = cursor.resume_high_lt = 0
+        cursor.save(update_fields=["last_lt", "last_event_id", "resume_before_lt", "resume_high_lt", "updated_at"])
+
+
+def ingest_receiver_events(receiver: str, *, limit: int = 100, max_pages: int = 20) -> IngestResult:
+    """
+    Один шаг ингестера: забрать свежие события receiver, сопоставить
+    с pending заказами, продвинуть курсор.
+
+    Raises:
+        TonApiError: если TonAPI недоступен (курсор не двигается)
+    """
+    cursor, _ = TonApiCursor.objects.get_or_create(account=receiver)
+    result = IngestResult(cursor_lt=cursor.last_lt)
+
+    orders = _pending_orders(receiver)
+    if not orders:
+        # Сопоставлять не с чем; курсор догонит историю при первом новом заказе
+        return result
+
+    oldest = min(o.created_at for o in orders)
+    events, complete = scan_from_cursor(
+        cursor,
+        receiver,
+        min_timestamp=int(oldest.timestamp()) - CLOCK_SKEW_SECONDS,
+        limit=limit,
+        max_pages=max_pages,
+    )
+    result.fetched = len(events)
+    result.complete = complete
+
+    settled = [ev for ev in events if not ev.get("in_progress")]
+    result.new_events = len(settled)
+
+    if settled:
+        # Заказ, созданный во время скана, может быть уже оплачен событием из этой
+        # выборки, а курсор сейчас перешагнёт его. Дочитываем pending после скана:
+        # заказ, созданный позже, не может быть оплачен уже прочитанным событием.
+        known = {o.pk for o in orders}
+        orders += [o for o in _pending_orders(receiver) if o.pk not in known]
+        result.paid = match_pending_orders(settled, receiver=receiver, orders=orders)
+
+    advance_cursor(cursor, events, complete)
+    result.cursor_lt = cursor.last_lt
+    return result
+
+
+def sweep_pending_orders(*, limit: int = 100, max_pages: int = 20) -> SweepResult:
+    """
+    Пакетная сверка всех pending заказов.
+
+    Один SELECT на все pending заказы → группировка по получателю →
+    по одному скану событий на получателя (до created_at самого старого
+    заказа группы) → сопоставление всей группы за один проход →
+    paid/expired пачками.
+
+    Истёкшие заказы сопоставляются вместе с живыми: перевод, сделанный до
+    expires_at, засчитывается, даже если сверка дошла до заказа позже.
+    В expired уходят только истёкшие заказы без такой оплаты.
+
+    Ошибка TonAPI по одному получателю не мешает остальным: она попадает
+    в result.errors, его заказы (в том числе истёкшие) будут проверены
+    следующим проходом.
+    """
+    orders = list(
+        PaymentOrder.objects.filter(status=PaymentOrderStatus.PENDING).select_related("participation")
+    )
+    result = SweepResult(pending=len(orders))
+
+    expired_ids = []
+    groups: dict[str, list[PaymentOrder]] = defaultdict(list)
+    for order in orders:
+        receiver = order_receiver(order) if order.wallet_address else ""
+        if receiver:
+            groups[receiver].append(order)
+        elif order.is_expired():
+            # Без кошелька или получателя заказ не может быть сопоставлен
+            expired_ids.append(order.pk)
+
+    result.receivers = len(groups)
+    for receiver, group in groups.items():
+        oldest = min(o.created_at for o in group)
+        try:
+            events, complete = scan_account_events(
+                receiver,
+                min_timestamp=int(oldest.timestamp()) - CLOCK_SKEW_SECONDS,
+                limit=limit,
+                max_pages=max_pages,
+            )
+        except TonApiError as e:
+            logger.warning(f"[Sweep] TonAPI error for {receiver}: {e}")
+            result.errors[receiver] = str(e)
+            continue
+        result.fetched += len(events)
+        settled = [ev for ev in events if not ev.get("in_progress")]
+        paid = match_pending_orders(settled, receiver=receiver, orders=group)
+        result.paid += paid
+
+        # Неполный скан или перевод ещё in_progress: оплата истёкшего заказа
+        # могла не попасть в выборку — не истекаем, проверим следующим проходом
+        if not complete or len(settled) < len(events):
+            continue
+        expired_ids += [o.pk for o in group if o.public_id not in paid and o.is_expired()]
+
+    result.expired = _expire_bulk(expired_ids)
+    return result
@@ -0,0 +1,164 @@
+"""
+Soulpull MVP — Points Ledger
+
+Очки начисляются только записью в PointsLedgerEntry (append-only):
+- award / award_author_code — INSERT в транзакции события, строки
+  пользователей не трогаются, поэтому популярный автор-код не превращает
+  строку владельца в точку конкуренции
+- rollup_points — периодически сворачивает записи без rolled_up_at
+  в UserProfile.points: один UPDATE points = points + sum на пользователя
+  за пачку, там же points-лидерборд, me_version и rolled_up_at пачки
+- reconcile_points — сверка UserProfile.points с суммой свёрнутых записей
+
+Отметка стоит на каждой записи, а не курсор по id: запись, закоммиченная
+позже соседней с большим id, просто попадёт в следующую пачку.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from api.models import (
+    LeaderboardEntry,
+    Participation,
+    PointsLedgerEntry,
+    PointsReason,
+    UserProfile,
+)
+from api.services import leaderboard
+
+logger = logging.getLogger(__name__)
+
+AUTHOR_CODE_POINTS = 10
+ROLLUP_CHUNK_SIZE = 1000
+
+
+def award(user_id: int, amount: int, reason: str, participation_id: Optional[int] = None) -> PointsLedgerEntry:
+    return PointsLedgerEntry.objects.create(
+        user_id=user_id,
+        amount=amount,
+        reason=reason,
+        participation_id=participation_id,
+    )
+
+
+def award_author_code(participation: Participation, owner_id: int) -> None:
+    """По AUTHOR_CODE_POINTS участнику и владельцу кода — две строки журнала одним INSERT."""
+    PointsLedgerEntry.objects.bulk_create([
+        PointsLedgerEntry(
+            user_id=participation.user_id,
+            amount=AUTHOR_CODE_POINTS,
+            reason=PointsReason.AUTHOR_CODE_USER,
+            participation_id=participation.id,
+        ),
+        PointsLedgerEntry(
+            user_id=owner_id,
+            amount=AUTHOR_CODE_POINTS,
+            reason=PointsReason.AUTHOR_CODE_OWNER,
+            participation_id=participation.id,
+        ),
+    ])
+
+
+def _apply(user_id: int, delta: int) -> None:
+    UserProfile.objects.filter(id=user_id).update(points=F("points") + delta, me_version=F("me_version") + 1)
+    leaderboard.record(user_id, leaderboard.POINTS, delta)
+
+
+def _set(user_id: int, points: int) -> None:
+    # points мог разойтись и с лидербордом — его тоже к значению журнала
+    UserProfile.objects.filter(id=user_id).update(points=points, me_version=F("me_version") + 1)
+    board = LeaderboardEntry.objects.filter(user_id=user_id).values_list("points", flat=True).first() or 0
+    leaderboard.record(user_id, leaderboard.POINTS, points - board)
+
+
+@dataclass
+class RollupResult:
+    entries: int = 0
+    users: int = 0
+
+
+def rollup_points(*, chunk_size: int = ROLLUP_CHUNK_SIZE) -> RollupResult:
+    """Свернуть записи журнала без rolled_up_at в UserProfile.points, пачками по chunk_size."""
+    result = RollupResult()
+    while True:
+        with transaction.atomic():
+            ids = list(
+                PointsLedgerEntry.objects.select_for_update(skip_locked=True)
+                .filter(rolled_up_at__isnull=True)
+                .order_by("id")
+                .values_list("id", flat=True)[:chunk_size]
+            )
+            if not ids:
+                return result
+            totals = (
+                PointsLedgerEntry.objects.filter(id__in=ids)
+                .order_by()
+                .values("user_id")
+                .annotate(total=Sum("amount"))
+                .values_list("user_id", "total")
+            )
+            for user_id, total in totals:
+                if total:
+                    _apply(user_id, total)
+                result.users += 1
+            PointsLedgerEntry.objects.filter(id__in=ids).update(rolled_up_at=timezone.now())
+        result.entries += len(ids)
+        if len(ids) < chunk_size:
+            return result
+
+
+@dataclass
+class PointsDrift:
+    user_id: int
+    points: int
+    expected: int
+
+
+def _rolled_up_total(user_ref):
+    return Coalesce(
+        Subquery(
+            PointsLedgerEntry.objects.filter(user_id=user_ref, rolled_up_at__isnull=False)
+            .order_by()
+            .values("user_id")
+            .annotate(total=Sum("amount"))
+            .values("total"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def reconcile_points(*, fix: bool = True) -> list[PointsDrift]:
+    """
+    Пользователи, у которых points ≠ сумме свёрнутых записей журнала. При fix
+    points приводится к журналу (вместе с points-лидербордом): строка
+    пользователя блокируется и сумма пересчитывается под блокировкой —
+    rollup_points меняет points и rolled_up_at в одной транзакции.
+    """
+    drift = [
+        PointsDrift(uid, points, expected)
+        for uid, points, expected in UserProfile.objects.annotate(expected_points=_rolled_up_total(OuterRef("pk")))
+        .exclude(points=F("expected_points"))
+        .values_list("id", "points", "expected_points")
+    ]
+    if fix:
+        for d in drift:
+            with transaction.atomic():
+                row = (
+                    UserProfile.objects.select_for_update()
+                    .filter(id=d.user_id)
+                    .annotate(expected_points=_rolled_up_total(OuterRef("pk")))
+                    .values_list("points", "expected_points")
+                    .first()
+                )
+                if row and row[0] != row[1]:
+                    _set(d.user_id, row[1])
+    if drift:
+        logger.warning(f"[Points] drift users={len(drift)} fixed={fix}")
+    return drift
@@ -0,0 +1,227 @@
+"""
+Soulpull MVP — Referral Tree
+
+Дерево рефералов поверх рёбер Participation.referrer:
+
+- ReferralClosure — closure table (ancestor, descendant, depth), включая
+  строку (узел, узел, 0); поддерево до глубины N читается одним range scan
+- ReferralNode — parent, depth и агрегаты поддерева (team_size,
+  team_volume), чтобы не считать их рекурсивно
+
+Пользователь встаёт в дерево первым intent (attach) и дальше не
+перемещается: повторный цикл под другим реферером дерево не меняет.
+team_volume меняется на переходах участия в CONFIRMED и из него
+(record_volume).
+
+Агрегаты предков в транзакции перехода не трогаются — иначе каждый
+intent/confirm обновлял бы строку корня, и все переходы дерева
+выстраивались бы в очередь за ней. attach / record_volume добавляют строку
+ReferralTreeDelta, rollup_referral_tree периодически сворачивает журнал:
+одна пачка — один UPDATE на набор предков с одинаковой дельтой. Агрегаты
+отстают от событий на интервал свёртки.
+
+rebuild_referral_tree строит всё заново за один потоковый проход по
+participations в порядке создания (миграция 0016 делает то же при
+migrate).
+"""
+
+from collections import Counter, defaultdict
+from typing import Iterable, Iterator, Optional
+
+from django.db import transaction
+from django.db.models import F
+
+from api.models import Participation, ParticipationStatus, ReferralClosure, ReferralNode, ReferralTreeDelta
+
+TREE_BATCH_SIZE = 1000
+# Лимиты /api/v1/tree
+TREE_MAX_DEPTH = 10
+TREE_MAX_NODES = 500
+
+
+def _ensure_root(user_id: int) -> None:
+    # Seed-пользователь; реферер без узла бывает только при рассинхроне
+    # (миграция 0016 строит дерево по существующим participations) —
+    # его чинит rebuild_referral_tree
+    if not ReferralNode.objects.filter(user_id=user_id).exists():
+        ReferralNode.objects.create(user_id=user_id)
+        ReferralClosure.objects.create(ancestor_id=user_id, descendant_id=user_id, depth=0)
+
+
+def attach(user_id: int, referrer_id: Optional[int]) -> bool:
+    """
+    Поставить пользователя в дерево под referrer_id (None — корень).
+
+    Вызывать в транзакции intent. Возвращает False, если пользователь уже
+    в дереве.
+    """
+    if ReferralNode.objects.filter(user_id=user_id).exists():
+        return False
+    if referrer_id is None:
+        _ensure_root(user_id)
+        return True
+
+    _ensure_root(referrer_id)
+    chain = list(ReferralClosure.objects.filter(descendant_id=referrer_id).values_list("ancestor_id", "depth"))
+    ReferralNode.objects.create(user_id=user_id, parent_id=referrer_id, depth=max(d for _, d in chain) + 1)
+    ReferralClosure.objects.bulk_create(
+        [ReferralClosure(ancestor_id=user_id, descendant_id=user_id, depth=0)]
+        + [ReferralClosure(ancestor_id=a, descendant_id=user_id, depth=d + 1) for a, d in chain]
+    )
+    ReferralTreeDelta.objects.create(user_id=user_id, team_size=1)
+    return True
+
+
+def volume_delta(old_status: Optional[str], new_status: Optional[str]) -> int:
+    return (new_status == ParticipationStatus.CONFIRMED) - (old_status == ParticipationStatus.CONFIRMED)
+
+
+def record_volume(user_id: int, delta: int) -> None:
+    """Изменить team_volume всех предков user_id на delta (через журнал)."""
+    if delta:
+        ReferralTreeDelta.objects.create(user_id=user_id, team_volume=delta)
+
+
+def subtree(user_id: int, depth: int, limit: int = TREE_MAX_NODES):
+    """
+    Потомки до глубины depth с агрегатами и parent, по уровням.
+
+    Range scan по индексу (ancestor, depth, descendant): стоимость
+    пропорциональна ответу, а не размеру поддерева.
+    """
+    return (
+        ReferralClosure.objects.filter(ancestor_id=user_id, depth__range=(1, depth))
+        .select_related("descendant__referral_node__parent")
+        .order_by("depth", "descendant_id")[:limit]
+    )
+
+
+# ----------------------------------------------------------------------------
+# Rollup
+# ----------------------------------------------------------------------------
+
+def rollup_referral_tree(*, chunk_size: int = TREE_BATCH_SIZE) -> int:
+    """
+    Свернуть журнал ReferralTreeDelta в агрегаты ReferralNode, пачками по
+    chunk_size строк. Применённые строки удаляются в той же транзакции.
+    Возвращает число свёрнутых строк.
+    """
+    applied = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                ReferralTreeDelta.objects.select_for_update(skip_locked=True)
+                .order_by("id")
+                .values_list("id", "user_id", "team_size", "team_volume")[:chunk_size]
+            )
+            if not rows:
+                return applied
+
+            per_user: dict[int, tuple[int, int]] = {}
+            for _, user_id, size, volume in rows:
+                old_size, old_volume = per_user.get(user_id, (0, 0))
+                per_user[user_id] = (old_size + size, old_volume + volume)
+
+            totals: dict[int, tuple[int, int]] = {}
+            ancestors = ReferralClosure.objects.filter(descendant_id__in=per_user, depth__gt=0)
+            for user_id, ancestor_id in ancestors.values_list("descendant_id", "ancestor_id"):
+                size, volume = per_user[user_id]
+                old_size, old_volume = totals.get(ancestor_id, (0, 0))
+                totals[ancestor_id] = (old_size + size, old_volume + volume)
+
+            by_delta: dict[tuple[int, int], list[int]] = defaultdict(list)
+            for ancestor_id, delta in totals.items():
+                if delta != (0, 0):
+                    by_delta[delta].append(ancestor_id)
+            for (size, volume), ids in by_delta.items():
+                for batch in _batched(iter(ids), chunk_size):
+                    ReferralNode.objects.filter(user_id__in=batch).update(
+                        team_size=F("team_size") + size,
+                        team_volume=F("team_volume") + volume,
+                    )
+            ReferralTreeDelta.objects.filter(id__in=[row[0] for row in rows]).delete()
+        applied += len(rows)
+        if len(rows) < chunk_size:
+            return applied
+
+
+# ----------------------------------------------------------------------------
+# Rebuild
+# ----------------------------------------------------------------------------
+
+def _plan(rows: Iterable[tuple[int, Optional[int], str]]):
+    """
+    rows — (user_id, referrer_id, status) в порядке создания участий.
+
+    Возвращает ({user_id: цепочка предков от корня}, team_size, team_volume).
+    Реферер создаёт свой intent раньше рефералов, поэтому его цепочка к
+    моменту первого реферала уже известна.
+    """
+    chains: dict[int, tuple[int, ...]] = {}
+    team_size: Counter = Counter()
+    team_volume: Counter = Counter()
+    for user_id, referrer_id, status in rows:
+        if user_id not in chains:
+            if referrer_id is None:
+                chain = ()
+            else:
+                chain = chains.setdefault(referrer_id, ()) + (referrer_id,)
+            chains[user_id] = chain
+            team_size.update(chain)
+        if status == ParticipationStatus.CONFIRMED:
+            team_volume.update(chains[user_id])
+    return chains, team_size, team_volume
+
+
+def _batched(items: Iterator, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def rebuild_referral_tree(*, chunk_size: int = TREE_BATCH_SIZE) -> int:
+    """
+    Пересобрать дерево из participations. Возвращает число узлов.
+
+    Всё в одной транзакции, и первой идёт запись: она берёт write-lock базы,
+    поэтому attach / record_volume не закоммитятся между чтением
+    participations и заменой дерева. Журнал к этому моменту целиком
+    учтён в пересчёте и удаляется.
+    """
+    with transaction.atomic():
+        ReferralClosure.objects.all().delete()
+        ReferralNode.objects.all().delete()
+        ReferralTreeDelta.objects.all().delete()
+
+        rows = (
+            Participation.objects.order_by("created_at", "id")
+            .values_list("user_id", "referrer_id", "status")
+            .iterator(chunk_size=chunk_size)
+        )
+        chains, team_size, team_volume = _plan(rows)
+
+        nodes = (
+            ReferralNode(
+                user_id=user_id,
+                parent_id=chain[-1] if chain else None,
+                depth=len(chain),
+                team_size=team_size[user_id],
+                team_volume=team_volume[user_id],
+            )
+            for user_id, chain in chains.items()
+        )
+        closure = (
+            ReferralClosure(ancestor_id=ancestor_id, descendant_id=user_id, depth=len(chain) - i)
+            for user_id, chain in chains.items()
+            for i, ancestor_id in enumerate(chain + (user_id,))
+        )
+        for batch in _batched(nodes, chunk_size):
+            ReferralNode.objects.bulk_create(batch)
+        for batch in _batched(closure, chunk_size):
+            ReferralClosure.objects.bulk_create(batch)
+    return len(chains)
@@ -0,0 +1,62 @@
+"""
+Soulpull MVP — Monotonic System Flags
+
+Глобальные проверки, которые за жизнь инсталляции меняются ровно один раз
+(false → true), например «есть хотя бы одно CONFIRMED участие» (seed mode
+в /intent). Вместо exists() по таблице на каждый запрос:
+
+- флаг хранится строкой SystemFlag и ставится в той же транзакции, что и
+  событие, которое его включает (set_flag)
+- процесс запоминает true после коммита и дальше в БД не ходит; false не
+  запоминается — флаг могли поставить в другом процессе
+- если строки нет, один раз проверяется исходное условие (PROBES): запись
+  мимо set_flag (shell, raw SQL) не оставит флаг выключенным навсегда
+"""
+
+from typing import Callable
+
+from django.db import transaction
+
+from api.models import Participation, ParticipationStatus, SystemFlag
+
+# Есть хотя бы одно CONFIRMED участие — реферер в /intent обязателен
+SEEDED = "seeded"
+# Локальная деривация jetton-wallet разошлась с Toncenter — она выключена во
+# всех процессах; включить снова: удалить строку SystemFlag и перезапустить
+JETTON_DERIVATION_DISABLED = "jetton_derivation_disabled"
+
+
+def _any_confirmed() -> bool:
+    return Participation.objects.filter(status=ParticipationStatus.CONFIRMED).exists()
+
+
+PROBES: dict[str, Callable[[], bool]] = {
+    SEEDED: _any_confirmed,
+}
+
+_known: set[str] = set()
+
+
+def _remember(key: str) -> None:
+    # До коммита флаг может откатиться вместе с транзакцией
+    transaction.on_commit(lambda: _known.add(key))
+
+
+def set_flag(key: str) -> None:
+    """Включить флаг. Вызывать в транзакции события; повторный вызов — no-op."""
+    if key in _known:
+        return
+    SystemFlag.objects.bulk_create([SystemFlag(key=key)], ignore_conflicts=True)
+    _remember(key)
+
+
+def is_set(key: str) -> bool:
+    if key in _known:
+        return True
+    if not SystemFlag.objects.filter(key=key).exists():
+        probe = PROBES.get(key)
+        if probe is None or not probe():
+            return False
+        SystemFlag.objects.bulk_create([SystemFlag(key=key)], ignore_conflicts=True)
+    _remember(key)
+    return True
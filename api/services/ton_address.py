@@ -0,0 +1,151 @@
+"""
+Soulpull MVP — TON Address Codec
+
+Адрес TON = workchain (int8) + 32 байта hash аккаунта. Внешние формы:
+
+- raw: "<wc>:<64 hex>", например "0:83df…31a8" — так отдаёт TonAPI
+- user-friendly: 48 символов base64/base64url от 36 байт
+    tag(1) | workchain(1) | hash(32) | crc16-xmodem(2, big-endian)
+  tag: 0x11 bounceable (EQ…), 0x51 non-bounceable (UQ…), | 0x80 testnet
+
+Для сравнения и хранения используется канонический raw (lowercase hex,
+фиксированная ширина) — формы одного кошелька становятся равны по ==.
+Разбор закэширован (LRU): одни и те же адреса приходят в каждой странице
+событий TonAPI.
+"""
+
+import base64
+import binascii
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+TAG_BOUNCEABLE = 0x11
+TAG_NON_BOUNCEABLE = 0x51
+TAG_TESTNET = 0x80
+
+RAW_ADDRESS_RE = re.compile(r"^(-?\d+):([0-9a-fA-F]{64})$")
+FRIENDLY_ADDRESS_LEN = 48
+
+ADDRESS_CACHE_SIZE = 8192
+
+
+class TonAddressError(ValueError):
+    pass
+
+
+def crc16_xmodem(data: bytes) -> int:
+    """CRC-16/XMODEM (poly 0x1021, init 0), как в user-friendly адресах TON."""
+    crc = 0
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+    return crc
+
+
+@dataclass(frozen=True)
+class TonAddress:
+    workchain: int
+    hash: bytes
+    bounceable: bool = True
+    testnet: bool = False
+
+    @property
+    def raw(self) -> str:
+        """Канонический raw: "<wc>:<hex lowercase>"."""
+        return f"{self.workchain}:{self.hash.hex()}"
+
+    def to_friendly(
+        self,
+        *,
+        bounceable: Optional[bool] = None,
+        testnet: Optional[bool] = None,
+        url_safe: bool = True,
+    ) -> str:
+        bounceable = self.bounceable if bounceable is None else bounceable
+        testnet = self.testnet if testnet is None else testnet
+        tag = TAG_BOUNCEABLE if bounceable else TAG_NON_BOUNCEABLE
+        if testnet:
+            tag |= TAG_TESTNET
+        body = bytes([tag, self.workchain & 0xFF]) + self.hash
+        data = body + crc16_xmodem(body).to_bytes(2, "big")
+        encode = base64.urlsafe_b64encode if url_safe else base64.b64encode
+        return encode(data).decode("ascii")
+
+
+def _parse_raw(addr: str) -> TonAddress:
+    m = RAW_ADDRESS_RE.match(addr)
+    if not m:
+        raise TonAddressError("raw address must be '<wc>:<64 hex>'")
+    wc = int(m.group(1))
+    if not -128 <= wc <= 127:
+        raise TonAddressError("workchain out of range")
+    return TonAddress(workchain=wc, hash=bytes.fromhex(m.group(2)))
+
+
+def _parse_friendly(addr: str) -> TonAddress:
+    if len(addr) != FRIENDLY_ADDRESS_LEN:
+        raise TonAddressError("user-friendly address must be 48 characters")
+    try:
+        # base64url и обычный base64 встречаются оба
+        data = base64.urlsafe_b64decode(addr.replace("+", "-").replace("/", "_"))
+    except (binascii.Error, ValueError):
+        raise TonAddressError("invalid base64 in address")
+    if len(data) != 36:
+        raise TonAddressError("user-friendly address must decode to 36 bytes")
+
+    body, crc = data[:34], int.from_bytes(data[34:], "big")
+    if crc16_xmodem(body) != crc:
+        raise TonAddressError("address checksum mismatch")
+
+    tag = body[0]
+    testnet = bool(tag & TAG_TESTNET)
+    tag &= ~TAG_TESTNET
+    if tag not in (TAG_BOUNCEABLE, TAG_NON_BOUNCEABLE):
+        raise TonAddressError("unknown address tag")
+    wc = body[1] - 256 if body[1] > 127 else body[1]
+    return TonAddress(
+        workchain=wc,
+        hash=bytes(body[2:34]),
+        bounceable=tag == TAG_BOUNCEABLE,
+        testnet=testnet,
+    )
+
+
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def parse_address(addr: str) -> TonAddress:
+    """
+    Разобрать адрес в любой форме.
+
+    Raises:
+        TonAddressError: адрес не распознан или не сходится CRC
+    """
+    s = (addr or "").strip()
+    if not s:
+        raise TonAddressError("empty address")
+    if ":" in s:
+        return _parse_raw(s)
+    return _parse_friendly(s)
+
+
+def to_raw(addr: str) -> str:
+    """
+    Канонический raw адреса в любой форме.
+
+    Raises:
+        TonAddressError: адрес не распознан
+    """
+    return parse_address(addr).raw
+
+
+def canonical_raw(addr: Optional[str]) -> str:
+    """Как to_raw, но для нераспознанного адреса возвращает ""."""
+    if not addr:
+        return ""
+    try:
+        return to_raw(addr)
+    except TonAddressError:
+        return ""
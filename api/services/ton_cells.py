@@ -0,0 +1,316 @@
+"""
+Soulpull MVP — TON Cells
+
+Минимальная реализация ячеек TON, достаточная для локальных вычислений
+без сети:
+
+- Builder: запись uint/int/бит/Coins/MsgAddress/ссылок в ячейку
+- Cell.hash: representation hash (SHA-256 от d1 d2 data depth(refs) hash(refs))
+- parse_boc / to_boc: разбор и сериализация bag-of-cells (hex или base64),
+  в т.ч. exotic library cell
+
+Поддерживаются только ячейки уровня 0 (pruned branch / merkle proof не нужны
+для StateInit и сообщений).
+"""
+
+import base64
+import binascii
+import hashlib
+from typing import Optional, Sequence, Union
+
+from api.services.ton_address import TonAddress
+
+BOC_MAGIC = b"\xb5\xee\x9c\x72"
+MAX_CELL_BITS = 1023
+MAX_CELL_REFS = 4
+
+
+class TonCellError(ValueError):
+    pass
+
+
+class Cell:
+    """Неизменяемая ячейка: до 1023 бит данных и до 4 ссылок."""
+
+    __slots__ = ("data", "bit_length", "refs", "exotic", "_hash", "_depth")
+
+    def __init__(self, data: bytes, bit_length: int, refs: Sequence["Cell"] = (), exotic: bool = False):
+        if bit_length > MAX_CELL_BITS:
+            raise TonCellError("cell data overflow")
+        if len(refs) > MAX_CELL_REFS:
+            raise TonCellError("cell refs overflow")
+        self.data = data
+        self.bit_length = bit_length
+        self.refs = tuple(refs)
+        self.exotic = exotic
+        self._hash: Optional[bytes] = None
+        self._depth: Optional[int] = None
+
+    @property
+    def depth(self) -> int:
+        if self._depth is None:
+            self._depth = 1 + max(r.depth for r in self.refs) if self.refs else 0
+        return self._depth
+
+    def descriptors(self) -> bytes:
+        d1 = len(self.refs) + (8 if self.exotic else 0)
+        d2 = (self.bit_length // 8) + ((self.bit_length + 7) // 8)
+        return bytes([d1, d2])
+
+    def augmented_data(self) -> bytes:
+        """Данные, дополненные до целого байта битом 1 и нулями."""
+        rem = self.bit_length % 8
+        if not rem:
+            return self.data
+        return self.data[:-1] + bytes([self.data[-1] | (1 << (7 - rem))])
+
+    def hash(self) -> bytes:
+        if self._hash is None:
+            repr_ = bytearray(self.descriptors())
+            repr_ += self.augmented_data()
+            for r in self.refs:
+                repr_ += r.depth.to_bytes(2, "big")
+            for r in self.refs:
+                repr_ += r.hash()
+            self._hash = hashlib.sha256(bytes(repr_)).digest()
+        return self._hash
+
+    def __repr__(self) -> str:
+        return f"Cell(bits={self.bit_length}, refs={len(self.refs)}, hash={self.hash().hex()[:16]}…)"
+
+
+class Builder:
+    def __init__(self):
+        self._acc = 0
+        self._bits = 0
+        self._refs: list[Cell] = []
+
+    @property
+    def bits(self) -> int:
+        return self._bits
+
+    def store_uint(self, value: int, bits: int) -> "Builder":
+        if bits < 0 or value < 0 or value >> bits:
+            raise TonCellError(f"value {value} does not fit uint{bits}")
+        if self._bits + bits > MAX_CELL_BITS:
+            raise TonCellError("cell data overflow")
+        self._acc = (self._acc << bits) | value
+        self._bits += bits
+        return self
+
+    def store_int(self, value: int, bits: int) -> "Builder":
+        if not -(1 << (bits - 1)) <= value < (1 << (bits - 1)):
+            raise TonCellError(f"value {value} does not fit int{bits}")
+        return self.store_uint(value & ((1 << bits) - 1), bits)
+
+    def store_bit(self, bit: Union[bool, int]) -> "Builder":
+        return self.store_uint(1 if bit else 0, 1)
+
+    def store_bytes(self, data: bytes) -> "Builder":
+        return self.store_uint(int.from_bytes(data, "big"), len(data) * 8) if data else self
+
+    def store_coins(self, amount: int) -> "Builder":
+        """VarUInteger 16: 4 бита длины в байтах + значение."""
+        amount = int(amount)
+        if amount < 0:
+            raise TonCellError("coins must be non-negative")
+        length = (amount.bit_length() + 7) // 8
+        if length > 15:
+            raise TonCellError("coins overflow")
+        self.store_uint(length, 4)
+        return self.store_uint(amount, length * 8) if length else self
+
+    def store_address(self, address: Optional[TonAddress]) -> "Builder":
+        """addr_std$10 anycast:nothing workchain:int8 hash:bits256; None → addr_none$00."""
+        if address is None:
+            return self.store_uint(0, 2)
+        self.store_uint(0b100, 3)
+        self.store_int(address.workchain, 8)
+        return self.store_bytes(address.hash)
+
+    def store_ref(self, cell: Cell) -> "Builder":
+        if len(self._refs) >= MAX_CELL_REFS:
+            raise TonCellError("cell refs overflow")
+        self._refs.append(cell)
+        return self
+
+    def store_maybe_ref(self, cell: Optional[Cell]) -> "Builder":
+        if cell is None:
+            return self.store_bit(0)
+        self.store_bit(1)
+        return self.store_ref(cell)
+
+    def end_cell(self) -> Cell:
+        nbytes = (self._bits + 7) // 8
+        pad = nbytes * 8 - self._bits
+        data = (self._acc << pad).to_bytes(nbytes, "big") if nbytes else b""
+        return Cell(data, self._bits, self._refs)
+
+
+def begin_cell() -> Builder:
+    return Builder()
+
+
+# ----------------------------------------------------------------------------
+# BOC
+# ----------------------------------------------------------------------------
+
+def _crc32c_table() -> list[int]:
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC32C_TABLE = _crc32c_table()
+
+
+def _crc32c(data: bytes) -> int:
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc = _CRC32C_TABLE[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
+
+def _byte_len(n: int) -> int:
+    return max(1, (n.bit_length() + 7) // 8)
+
+
+def serialize_cells(cells: Sequence[tuple[bytes, Sequence[int]]], *, crc: bool = False) -> bytes:
+    """
+    BOC из уже сериализованных ячеек: (d1 d2 data, индексы ссылок).
+    Ячейка 0 — корень; ссылки указывают только на ячейки с большим индексом.
+    Быстрый путь для шаблонов, которым не нужен Cell.
+    """
+    size = _byte_len(len(cells))
+    bodies = [
+        body + b"".join(r.to_bytes(size, "big") for r in refs)
+        for body, refs in cells
+    ]
+    total = sum(len(b) for b in bodies)
+    off_bytes = _byte_len(total)
+    header = BOC_MAGIC + bytes([(0x40 if crc else 0) | size, off_bytes])
+    header += len(cells).to_bytes(size, "big") + (1).to_bytes(size, "big") + (0).to_bytes(size, "big")
+    header += total.to_bytes(off_bytes, "big") + (0).to_bytes(size, "big")
+    boc = header + b"".join(bodies)
+    if crc:
+        boc += _crc32c(boc).to_bytes(4, "little")
+    return boc
+
+
+def to_boc(root: Cell, *, crc: bool = False) -> bytes:
+    """Сериализовать дерево ячеек (одинаковые поддеревья хранятся один раз)."""
+    order = _topological(root)
+    index = {c.hash(): i for i, c in enumerate(order)}
+    return serialize_cells(
+        [(c.descriptors() + c.augmented_data(), [index[r.hash()] for r in c.refs]) for c in order],
+        crc=crc,
+    )
+
+
+def _topological(root: Cell) -> list[Cell]:
+    """Корень первым, каждая ячейка раньше всех, на кого ссылается."""
+    result: list[Cell] = []
+    done: set[bytes] = set()
+
+    def visit(cell: Cell) -> None:
+        key = cell.hash()
+        if key in done:
+            return
+        done.add(key)
+        for r in cell.refs:
+            visit(r)
+        result.append(cell)
+
+    visit(root)
+    result.reverse()
+    return result
+
+
+def _decode_boc_string(boc: str) -> bytes:
+    s = boc.strip()
+    try:
+        return bytes.fromhex(s)
+    except ValueError:
+        pass
+    try:
+        return base64.b64decode(s + "=" * (-len(s) % 4), altchars=b"-_" if ("-" in s or "_" in s) else None)
+    except (binascii.Error, ValueError):
+        raise TonCellError("BOC must be hex or base64")
+
+
+def parse_boc(boc: Union[bytes, str]) -> Cell:
+    """
+    Корневая ячейка из bag-of-cells.
+
+    Raises:
+        TonCellError: некорректный или неподдерживаемый BOC
+    """
+    data = _decode_boc_string(boc) if isinstance(boc, str) else bytes(boc)
+    if data[:4] != BOC_MAGIC:
+        raise TonCellError("unsupported BOC magic")
+    try:
+        return _parse_boc(data)
+    except IndexError:
+        raise TonCellError("truncated BOC")
+
+
+def _parse_boc(data: bytes) -> Cell:
+    flags = data[4]
+    has_idx, has_crc = bool(flags & 0x80), bool(flags & 0x40)
+    size = flags & 0x07
+    off_bytes = data[5]
+    pos = 6
+
+    def read(n: int) -> int:
+        nonlocal pos
+        value = int.from_bytes(data[pos:pos + n], "big")
+        pos += n
+        return value
+
+    cells_num, roots_num, _absent = read(size), read(size), read(size)
+    read(off_bytes)  # tot_cells_size
+    roots = [read(size) for _ in range(roots_num)]
+    if not roots:
+        raise TonCellError("BOC has no roots")
+    if has_idx:
+        pos += cells_num * off_bytes
+
+    raw_cells = []
+    for _ in range(cells_num):
+        d1, d2 = data[pos], data[pos + 1]
+        pos += 2
+        if d1 >> 5:
+            raise TonCellError("cells with level > 0 are not supported")
+        if d1 & 16:
+            pos += 32 + 2  # сохранённые hash/depth — пересчитаем сами
+        nbytes = (d2 + 1) // 2
+        payload = bytearray(data[pos:pos + nbytes])
+        if len(payload) != nbytes:
+            raise TonCellError("truncated BOC")
+        pos += nbytes
+        bit_length = nbytes * 8
+        if d2 % 2:
+            last = payload[-1]
+            if not last:
+                raise TonCellError("bad cell padding")
+            trailing = (last & -last).bit_length() - 1
+            bit_length -= trailing + 1
+            payload[-1] = last & ~(1 << trailing)
+        refs = [read(size) for _ in range(d1 & 7)]
+        raw_cells.append((bytes(payload), bit_length, refs, bool(d1 & 8)))
+
+    if has_crc and _crc32c(data[:pos]) != int.from_bytes(data[pos:pos + 4], "little"):
+        raise TonCellError("BOC crc32c mismatch")
+
+    # Ссылки всегда указывают на ячейки с большим индексом — строим с конца
+    cells: list[Optional[Cell]] = [None] * cells_num
+    for i in range(cells_num - 1, -1, -1):
+        payload, bit_length, refs, exotic = raw_cells[i]
+        if any(r <= i or r >= cells_num for r in refs):
+            raise TonCellError("bad BOC ref order")
+        cells[i] = Cell(payload, bit_length, [cells[r] for r in refs], exotic=exotic)
+    return cells[roots[0]]
@@ -6,13 +6,32 @@ Soulpull MVP — TonAPI Service
 
 TonAPI Events API:
 - GET /v2/accounts/{account_id}/events — история событий аккаунта
+- GET /v2/events/{event_id} — одно событие (для webhook уведомлений)
 - Ищем TonTransfer с нужным sender, receiver, amount
 """
 
+import asyncio
+import hashlib
+import json
 import os
 import logging
+import re
+import tempfile
+import threading
+import time
 import requests
-from typing import Optional
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: только in-process single-flight
+    fcntl = None
+
+from api.services import http_client
+from api.services.breaker import CircuitBreaker
+from api.services.ton_address import canonical_raw
 
 logger = logging.getLogger(__name__)
 
@@ -21,11 +40,24 @@ TONAPI_BASE_URL = os.getenv("TONAPI_BASE_URL", "https://tonapi.io").rstrip("/")
 TONAPI_KEY = os.getenv("TONAPI_KEY", "")
 
 
+# Ключ заказа в комментарии платежа: SP:<public_id>
+ORDER_COMMENT_RE = re.compile(r"SP:[A-Za-z0-9]+")
+
+
 class TonApiError(RuntimeError):
     """Ошибка при работе с TonAPI"""
     pass
 
 
+# Fail fast пока TonAPI лежит: status view отдаёт pending, а не держит воркер 20s
+tonapi_breaker = CircuitBreaker(
+    "tonapi",
+    failure_threshold=int(os.getenv("TONAPI_BREAKER_FAILURES", "5")),
+    base_cooldown=float(os.getenv("TONAPI_BREAKER_COOLDOWN", "5")),
+    max_cooldown=float(os.getenv("TONAPI_BREAKER_MAX_COOLDOWN", "60")),
+)
+
+
 def _headers() -> dict:
     """Заголовки для запросов к TonAPI"""
     h = {"Accept": "application/json"}
@@ -34,49 +66,527 @@ def _headers() -> dict:
     return h
 
 
-def get_account_events(account_id: str, limit: int = 25) -> dict:
+# ----------------------------------------------------------------------------
+# Single-flight: параллельные запросы одной и той же страницы событий
+# (сотни поллеров одного receiver) делят один HTTP запрос и его результат.
+# Внутри процесса — через threading.Event, между gunicorn воркерами —
+# через файловую лизу (flock) + файл с результатом.
+# ----------------------------------------------------------------------------
+
+# Верхняя граница одного запроса к TonAPI (read timeout в http_client — 15-20s)
+TONAPI_TIMEOUT = 20
+# Сколько ждать межпроцессную лизу, прежде чем спросить TonAPI самим
+TONAPI_LEASE_WAIT = TONAPI_TIMEOUT
+# Ведомый в процессе ждёт лидера, который может сначала ждать лизу, а потом делать запрос
+TONAPI_FLIGHT_WAIT = TONAPI_LEASE_WAIT + TONAPI_TIMEOUT + 5
+# "" — только внутри процесса
+TONAPI_SINGLEFLIGHT_DIR = os.getenv("TONAPI_SINGLEFLIGHT_DIR", tempfile.gettempdir())
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[dict] = None
+        self.error: Optional[BaseException] = None
+
+
+_flights: dict[str, _Flight] = {}
+_flights_lock = threading.Lock()
+
+
+def _single_flight(key: str, fn: Callable[[], dict], *, lease: str) -> dict:
+    """
+    Выполнить fn один раз на key для всех одновременных вызывающих.
+
+    lease — имя межпроцессной лизы (аккаунт): файлов по одному на аккаунт,
+    а не на каждый key с его before_lt.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        if not flight.done.wait(TONAPI_FLIGHT_WAIT):
+            raise TonApiError("TonAPI request timed out (single-flight)")
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = _file_lease(lease, key, fn)
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+
+def _flock(lock_file, timeout: float) -> bool:
+    """flock с ограниченным ожиданием: держатель лизы мог зависнуть на запросе."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.02)
+
+
+def _file_lease(lease: str, key: str, fn: Callable[[], dict]) -> dict:
+    """
+    Межпроцессная часть single-flight.
+
+    Кто первым взял flock — делает запрос и пишет результат в файл.
+    Остальные ждут лизу и, если результат для того же key появился уже
+    после начала их ожидания, используют его вместо собственного запроса.
+
+    Лиза и файл результата — одни на lease (аккаунт), поэтому их число
+    ограничено числом аккаунтов: результат другого key (другой страницы)
+    просто не подходит, и ведомый делает запрос сам.
+    """
+    if fcntl is None or not TONAPI_SINGLEFLIGHT_DIR:
+        return fn()
+
+    base = os.path.join(TONAPI_SINGLEFLIGHT_DIR, "soulpull-tonapi-" + hashlib.sha1(lease.encode("utf-8")).hexdigest()[:20])
+    result_path = base + ".json"
+    started = time.time()
+
+    with open(base + ".lock", "a+") as lock_file:
+        if not _flock(lock_file, TONAPI_LEASE_WAIT):
+            logger.warning(f"[TonAPI] single-flight lease {lease} busy for {TONAPI_LEASE_WAIT}s, fetching directly")
+            return fn()
+        try:
+            shared = _read_shared_result(result_path, key=key, not_before=started)
+            if shared is not None:
+                if "error" in shared:
+                    raise TonApiError(shared["error"])
+                return shared["data"]
+
+            try:
+                data = fn()
+            except TonApiError as e:
+                _write_shared_result(result_path, {"key": key, "error": str(e)})
+                raise
+            _write_shared_result(result_path, {"key": key, "data": data})
+            return data
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_shared_result(path: str, *, key: str, not_before: float) -> Optional[dict]:
+    try:
+        if os.stat(path).st_mtime < not_before:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            shared = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return shared if shared.get("key") == key else None
+
+
+def _write_shared_result(path: str, payload: dict) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f"[TonAPI] single-flight result not shared: {e}")
+
+
+def _is_provider_failure(status_code: int) -> bool:
+    """Ошибки, которые говорят о деградации TonAPI (а не о плохом запросе)."""
+    return status_code >= 500 or status_code == 429
+
+
+def _request_json(url: str, params: Optional[dict] = None) -> dict:
+    """GET к TonAPI через общий пул и circuit breaker."""
+    if not tonapi_breaker.allow():
+        raise TonApiError("TonAPI circuit open")
+
+    try:
+        logger.info(f"[TonAPI] GET {url} {params or ''}")
+        r = http_client.get(url, headers=_headers(), params=params)
+    except requests.RequestException as e:
+        logger.error(f"[TonAPI] Request failed: {e}")
+        tonapi_breaker.record_failure(e.__class__.__name__)
+        raise TonApiError(f"TonAPI request failed: {e}")
+    return _response_json(r)
+
+
+def _response_json(r) -> dict:
+    """
+    Разобрать ответ TonAPI (requests.Response или httpx.Response) и
+    отметить результат в circuit breaker.
+    """
+    if r.status_code != 200:
+        logger.error(f"[TonAPI] Error {r.status_code}: {r.text[:500]}")
+        if _is_provider_failure(r.status_code):
+            tonapi_breaker.record_failure(f"HTTP {r.status_code}")
+        else:
+            tonapi_breaker.record_success()
+        raise TonApiError(f"TonAPI error {r.status_code}: {r.text[:300]}")
+
+    try:
+        data = r.json()
+    except ValueError:
+        tonapi_breaker.record_failure("non-json")
+        raise TonApiError("TonAPI returned non-json")
+
+    tonapi_breaker.record_success()
+    return data
+
+
+def _events_request(account_id: str, limit: int, before_lt: Optional[int]) -> tuple[str, dict]:
+    params = {"limit": limit}
+    if before_lt:
+        params["before_lt"] = before_lt
+    return f"{TONAPI_BASE_URL}/v2/accounts/{account_id}/events", params
+
+
+def _events_key(account_id: str, limit: int, before_lt: Optional[int]) -> str:
+    """Ключ страницы событий для SWR кэша и single-flight."""
+    return f"events|{account_id}|{limit}|{before_lt or ''}"
+
+
+def _fetch_account_events(account_id: str, limit: int, before_lt: Optional[int] = None) -> dict:
+    data = _request_json(*_events_request(account_id, limit, before_lt))
+    logger.info(f"[TonAPI] Got {len(data.get('events', []))} events")
+    return data
+
+
+def get_event(event_id: str) -> dict:
+    """
+    Одно событие по event_id (= hash транзакции-корня trace).
+    GET /v2/events/{event_id}
     """
-    Получить последние события аккаунта.
-    
+    return _request_json(f"{TONAPI_BASE_URL}/v2/events/{event_id}")
+
+
+# ----------------------------------------------------------------------------
+# Stale-while-revalidate кэш страниц событий.
+# В пределах TTL — ответ из памяти (hit). После TTL, но в пределах окна
+# STALE — тоже из памяти (stale), а обновление идёт одним фоновым запросом.
+# Дальше — синхронный запрос (miss).
+# ----------------------------------------------------------------------------
+
+TONAPI_EVENTS_CACHE_TTL = float(os.getenv("TONAPI_EVENTS_CACHE_TTL", "1.5"))
+TONAPI_EVENTS_CACHE_STALE = float(os.getenv("TONAPI_EVENTS_CACHE_STALE", "10"))
+TONAPI_EVENTS_CACHE_SIZE = 256
+
+
+class _EventsCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._refreshing: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self._counters = {"hit": 0, "miss": 0, "stale": 0, "refresh_errors": 0}
+
+    def _lookup(self, key: str) -> tuple[Optional[dict], bool]:
+        """(data, start_refresh); data=None — промах."""
+        ttl, stale = TONAPI_EVENTS_CACHE_TTL, TONAPI_EVENTS_CACHE_STALE
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry[0]
+                if age < ttl:
+                    self._counters["hit"] += 1
+                    return entry[1], False
+                if age < ttl + stale:
+                    self._counters["stale"] += 1
+                    start_refresh = key not in self._refreshing
+                    self._refreshing.add(key)
+                    return entry[1], start_refresh
+            self._counters["miss"] += 1
+        return None, False
+
+    def get(self, key: str, loader: Callable[[], dict]) -> dict:
+        if TONAPI_EVENTS_CACHE_TTL <= 0:
+            return loader()
+
+        data, start_refresh = self._lookup(key)
+        if start_refresh:
+            threading.Thread(target=self._refresh, args=(key, loader), daemon=True).start()
+        if data is not None:
+            return data
+
+        data = loader()
+        self._store(key, data)
+        return data
+
+    async def aget(self, key: str, loader: Callable[[], Awaitable[dict]]) -> dict:
+        """get() для async loader: фоновое обновление — задача в текущем event loop."""
+        if TONAPI_EVENTS_CACHE_TTL <= 0:
+            return await loader()
+
+        data, start_refresh = self._lookup(key)
+        if start_refresh:
+            task = asyncio.get_running_loop().create_task(self._arefresh(key, loader))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if data is not None:
+            return data
+
+        data = await loader()
+        self._store(key, data)
+        return data
+
+    def _refresh(self, key: str, loader: Callable[[], dict]) -> None:
+        try:
+            self._store(key, loader())
+        except Exception as e:
+            self._refresh_failed(e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def _arefresh(self, key: str, loader: Callable[[], Awaitable[dict]]) -> None:
+        try:
+            self._store(key, await loader())
+        except Exception as e:
+            self._refresh_failed(e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _refresh_failed(self, e: Exception) -> None:
+        logger.warning(f"[TonAPI] background refresh failed: {e}")
+        with self._lock:
+            self._counters["refresh_errors"] += 1
+
+    def _store(self, key: str, data: dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "ttl": TONAPI_EVENTS_CACHE_TTL,
+                "stale_window": TONAPI_EVENTS_CACHE_STALE,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            for k in self._counters:
+                self._counters[k] = 0
+
+
+events_cache = _EventsCache(TONAPI_EVENTS_CACHE_SIZE)
+
+
+def get_account_events(account_id: str, limit: int = 25, before_lt: Optional[int] = None) -> dict:
+    """
+    Получить события аккаунта (новые первыми).
+
+    Ответ может прийти из SWR кэша (TONAPI_EVENTS_CACHE_TTL секунд), а
+    одновременные запросы с теми же аргументами делят один запрос к TonAPI.
+    Возвращаемый dict общий для всех вызывающих — не модифицировать.
+
     Args:
         account_id: TON адрес (user-friendly или raw)
         limit: количество событий
-        
+        before_lt: курсор — события строго старше этого lt
+
     Returns:
         dict с ключом "events" — список событий
     """
-    url = f"{TONAPI_BASE_URL}/v2/accounts/{account_id}/events"
-    
+    key = _events_key(account_id, limit, before_lt)
+    return events_cache.get(
+        key,
+        lambda: _single_flight(
+            key, lambda: _fetch_account_events(account_id, limit, before_lt), lease=f"events|{canonical_raw(account_id) or account_id}",
+        ),
+    )
+
+
+def event_lt(ev: dict) -> int:
     try:
-        logger.info(f"[TonAPI] GET {url} limit={limit}")
-        r = requests.get(url, headers=_headers(), params={"limit": limit}, timeout=20)
-        
-        if r.status_code != 200:
-            logger.error(f"[TonAPI] Error {r.status_code}: {r.text[:500]}")
-            raise TonApiError(f"TonAPI error {r.status_code}: {r.text[:300]}")
-        
-        data = r.json()
-        logger.info(f"[TonAPI] Got {len(data.get('events', []))} events")
-        return data
-        
-    except requests.RequestException as e:
-        logger.error(f"[TonAPI] Request failed: {e}")
-        raise TonApiError(f"TonAPI request failed: {e}")
+        return int(ev.get("lt") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def scan_account_events(
+    account_id: str,
+    *,
+    stop_lt: int = 0,
+    min_timestamp: Optional[int] = None,
+    before_lt: Optional[int] = None,
+    limit: int = 100,
+    max_pages: int = 20,
+) -> tuple[list[dict], bool]:
+    """
+    Листать события аккаунта от новых к старым (курсор before_lt), пока не
+    дойдём до stop_lt (уже обработанный high-water mark) или до событий
+    старше min_timestamp.
+
+    before_lt — продолжить прерванный скан с этого места, а не с вершины.
+
+    Returns:
+        (events, complete) — complete=False, если упёрлись в max_pages
+        и более старые события не просмотрены
+    """
+    collected: list[dict] = []
+
+    for _ in range(max_pages):
+        page = get_account_events(account_id, limit=limit, before_lt=before_lt)
+        before_lt = _scan_page(page, collected, stop_lt=stop_lt, min_timestamp=min_timestamp, limit=limit)
+        if before_lt is None:
+            return collected, True
+
+    logger.warning(f"[TonAPI] scan of {account_id} stopped after {max_pages} pages")
+    return collected, False
+
+
+def _scan_page(page: dict, collected: list[dict], *, stop_lt: int, min_timestamp: Optional[int], limit: int) -> Optional[int]:
+    """
+    Добавить в collected события страницы до границы скана.
+
+    Returns:
+        before_lt следующей страницы или None — история просмотрена
+    """
+    events = page.get("events") or []
+    for ev in events:
+        if stop_lt and event_lt(ev) <= stop_lt:
+            return None
+        if min_timestamp and (ev.get("timestamp") or 0) < min_timestamp:
+            return None
+        collected.append(ev)
+
+    if not events:
+        return None
+    next_from = page.get("next_from")
+    if next_from is None:
+        # Ответ без next_from: неполная страница — это конец истории
+        if len(events) < limit:
+            return None
+        next_from = min(event_lt(ev) for ev in events)
+    if not next_from:
+        return None
+    return int(next_from)
 
 
 def normalize_address(addr: str) -> str:
     """
     Нормализация адреса для сравнения.
-    TonAPI может возвращать адреса в разных форматах.
+
+    TonAPI отдаёт raw (0:…), TonConnect и .env — user-friendly (EQ…/UQ…);
+    обе формы приводятся к каноническому raw (см. ton_address). Нераспознанная
+    строка возвращается как есть (без пробелов).
     """
     if not addr:
         return ""
-    # Убираем пробелы и приводим к lowercase для raw адресов
     addr = addr.strip()
-    # Если это raw адрес (0:...), нормализуем
-    if addr.startswith("0:") or addr.startswith("-1:"):
-        return addr.lower()
-    return addr
+    return canonical_raw(addr) or addr
+
+
+def _addresses_match(a: str, b: str) -> bool:
+    """Сравнение нормализованных адресов (пустые не совпадают ни с чем)."""
+    if not a or not b:
+        return False
+    return a == b
+
+
+def _amount_matches(amount: int, expected: int) -> bool:
+    """Сумма с погрешностью 1% (на комиссии)."""
+    return abs(amount - int(expected)) <= int(expected) * 0.01
+
+
+def _action_address(data: dict, *keys: str) -> str:
+    v = ""
+    for k in keys:
+        v = data.get(k) or ""
+        if v:
+            break
+    if isinstance(v, dict):
+        v = v.get("address") or v.get("account_address") or ""
+    return normalize_address(v)
+
+
+def _event_tx_hash(ev: dict, event_id: str) -> str:
+    """tx_hash из in_msg или lt."""
+    tx_hash = ""
+    if ev.get("in_msg"):
+        tx_hash = ev["in_msg"].get("hash") or ev["in_msg"].get("msg_hash") or ""
+    if not tx_hash:
+        tx_hash = str(ev.get("lt") or event_id)
+    return tx_hash
+
+
+@dataclass(frozen=True)
+class TonTransfer:
+    """Одно TonTransfer действие из events-ответа TonAPI (адреса нормализованы)."""
+    event_id: str
+    tx_hash: str
+    sender: str
+    recipient: str
+    amount: int
+    comment: str
+    timestamp: int
+
+    def as_hit(self) -> dict:
+        return {
+            "event_id": self.event_id,
+            "tx_hash": self.tx_hash,
+            "comment": self.comment,
+            "amount": self.amount,
+            "timestamp": self.timestamp,
+        }
+
+
+def iter_ton_transfers(events_json: dict, *, min_timestamp: Optional[int] = None) -> Iterator[TonTransfer]:
+    """Разобрать все TonTransfer действия страницы событий."""
+    for ev in events_json.get("events") or []:
+        event_id = ev.get("event_id") or ev.get("id") or ""
+        timestamp = ev.get("timestamp") or 0
+
+        if min_timestamp and timestamp < min_timestamp:
+            continue
+
+        for action in ev.get("actions") or []:
+            action_type = (action.get("type") or "").lower()
+            if "tontransfer" not in action_type:
+                continue
+
+            # Данные могут быть в разных полях
+            data = (
+                action.get("TonTransfer") or
+                action.get("ton_transfer") or
+                action.get("data") or
+                {}
+            )
+
+            amt = data.get("amount") or data.get("value") or 0
+            try:
+                amt_int = int(amt)
+            except (ValueError, TypeError):
+                continue
+
+            yield TonTransfer(
+                event_id=event_id,
+                tx_hash=_event_tx_hash(ev, event_id),
+                sender=_action_address(data, "sender", "from"),
+                recipient=_action_address(data, "recipient", "to"),
+                amount=amt_int,
+                comment=str(data.get("comment") or ""),
+                timestamp=timestamp,
+            )
 
 
 def find_ton_transfer_event(
@@ -90,7 +600,10 @@ def find_ton_transfer_event(
 ) -> Optional[dict]:
     """
     Найти событие TonTransfer с нужными параметрами.
-    
+
+    Для проверки сразу многих заказов по одной странице событий
+    используйте TransferIndex.
+
     Args:
         events_json: ответ от get_account_events
         receiver: адрес получателя (наш кошелёк)
@@ -98,106 +611,151 @@ def find_ton_transfer_event(
         amount_nano: сумма в нанотонах
         comment_contains: подстрока в комментарии (опционально)
         min_timestamp: минимальный timestamp транзакции (опционально)
-        
+
     Returns:
         dict с event_id, tx_hash, comment если найдено, иначе None
     """
-    events = events_json.get("events") or []
-    
     # Нормализуем адреса для сравнения
     receiver_norm = normalize_address(receiver)
     sender_norm = normalize_address(sender)
-    
+
     logger.info(f"[TonAPI] Searching for transfer: {sender_norm} -> {receiver_norm}, amount={amount_nano}")
-    
-    for ev in events:
+
+    for t in iter_ton_transfers(events_json, min_timestamp=min_timestamp):
+        logger.debug(f"[TonAPI] Checking: {t.sender} -> {t.recipient}, amount={t.amount}, comment={t.comment}")
+
+        if not _addresses_match(t.sender, sender_norm):
+            continue
+        if not _addresses_match(t.recipient, receiver_norm):
+            continue
+        if not _amount_matches(t.amount, amount_nano):
+            continue
+        # Проверяем комментарий если нужно
+        if comment_contains and comment_contains not in t.comment:
+            continue
+
+        logger.info(f"[TonAPI] ✅ Found matching transfer! event_id={t.event_id}, tx_hash={t.tx_hash}")
+        return t.as_hit()
+
+    logger.info("[TonAPI] No matching transfer found")
+    return None
+
+
+class TransferIndex:
+    """
+    Индекс входящих TonTransfer одной страницы событий.
+
+    Страница разбирается один раз; дальше каждый заказ ищется по ключу
+    комментария SP:<public_id> (или по нормализованному sender), так что
+    проверка K заказов стоит O(events + K), а не O(events × actions × K).
+    """
+
+    def __init__(self, transfers: Iterable[TonTransfer]):
+        self.by_comment: dict[str, list[TonTransfer]] = {}
+        self.by_sender: dict[str, list[TonTransfer]] = {}
+        for t in transfers:
+            for key in ORDER_COMMENT_RE.findall(t.comment):
+                self.by_comment.setdefault(key, []).append(t)
+            self.by_sender.setdefault(t.sender, []).append(t)
+
+    @classmethod
+    def from_events(cls, events_json: dict, *, receiver: str, min_timestamp: Optional[int] = None) -> "TransferIndex":
+        receiver_norm = normalize_address(receiver)
+        return cls(
+            t for t in iter_ton_transfers(events_json, min_timestamp=min_timestamp)
+            if _addresses_match(t.recipient, receiver_norm)
+        )
+
+    def match(
+        self,
+        *,
+        sender: str,
+        amount_nano: int,
+        comment: Optional[str] = None,
+        max_timestamp: Optional[int] = None,
+    ) -> Optional[dict]:
+        """
+        Найти перевод для одного заказа.
+
+        comment — ключ заказа (SP:<public_id>); без него поиск идёт по sender.
+        max_timestamp — переводы позже этого момента (оплата после истечения
+        заказа) не засчитываются.
+        """
+        sender_norm = normalize_address(sender)
+        if comment:
+            candidates = self.by_comment.get(comment, ())
+        else:
+            candidates = self.by_sender.get(sender_norm, ())
+        for t in candidates:
+            if max_timestamp is not None and t.timestamp > max_timestamp:
+                continue
+            if _addresses_match(t.sender, sender_norm) and _amount_matches(t.amount, amount_nano):
+                return t.as_hit()
+        return None
+
+
+@dataclass(frozen=True)
+class JettonTransfer:
+    """
+    Одно JettonTransfer действие (адреса нормализованы).
+
+    TonAPI сворачивает цепочку transfer → internal_transfer → transfer_notification
+    в одно действие: sender/recipient — владельцы (не jetton-wallet),
+    jetton_master — адрес мастера, comment — текст из forward_payload.
+    """
+    event_id: str
+    tx_hash: str
+    sender: str
+    recipient: str
+    jetton_master: str
+    amount: int
+    comment: str
+    timestamp: int
+    lt: int
+
+    def as_hit(self) -> dict:
+        return {
+            "event_id": self.event_id,
+            "tx_hash": self.tx_hash,
+            "sender": self.sender,
+            "comment": self.comment,
+            "amount": self.amount,
+            "timestamp": self.timestamp,
+        }
+
+
+def iter_jetton_transfers(events_json: dict, *, min_timestamp: Optional[int] = None) -> Iterator[JettonTransfer]:
+    """Разобрать успешные JettonTransfer действия страницы событий."""
+    for ev in events_json.get("events") or []:
         event_id = ev.get("event_id") or ev.get("id") or ""
         timestamp = ev.get("timestamp") or 0
-        
-        # Проверка timestamp
         if min_timestamp and timestamp < min_timestamp:
             continue
-        
-        actions = ev.get("actions") or []
-        
-        for action in actions:
-            action_type = (action.get("type") or "").lower()
-            
-            # Ищем TonTransfer
-            if "tontransfer" not in action_type:
+
+        for action in ev.get("actions") or []:
+            if (action.get("type") or "").lower() != "jettontransfer":
                 continue
-            
-            # Данные могут быть в разных полях
-            data = (
-                action.get("TonTransfer") or 
-                action.get("ton_transfer") or 
-                action.get("data") or 
-                {}
-            )
-            
-            # Извлекаем sender
-            s = data.get("sender") or data.get("from") or ""
-            if isinstance(s, dict):
-                s = s.get("address") or s.get("account_address") or ""
-            s = normalize_address(s)
-            
-            # Извлекаем recipient
-            r = data.get("recipient") or data.get("to") or ""
-            if isinstance(r, dict):
-                r = r.get("address") or r.get("account_address") or ""
-            r = normalize_address(r)
-            
-            # Извлекаем amount
-            amt = data.get("amount") or data.get("value") or 0
+            # Отбитый перевод (недостаточно баланса/газа) тоже попадает в events
+            if (action.get("status") or "ok").lower() != "ok":
+                continue
+            data = action.get("JettonTransfer") or action.get("jetton_transfer") or {}
             try:
-                amt_int = int(amt)
+                amount = int(data.get("amount") or 0)
             except (ValueError, TypeError):
                 continue
-            
-            # Извлекаем комментарий
-            comment = data.get("comment") or ""
-            
-            # Извлекаем tx_hash из in_msg или lt
-            tx_hash = ""
-            if ev.get("in_msg"):
-                tx_hash = ev["in_msg"].get("hash") or ev["in_msg"].get("msg_hash") or ""
-            if not tx_hash:
-                tx_hash = str(ev.get("lt") or event_id)
-            
-            logger.debug(f"[TonAPI] Checking: {s} -> {r}, amount={amt_int}, comment={comment}")
-            
-            # Проверяем совпадение
-            # Сравниваем адреса (могут быть в разных форматах)
-            sender_match = (s == sender_norm) or (sender in s) or (s in sender)
-            receiver_match = (r == receiver_norm) or (receiver in r) or (r in receiver)
-            
-            if not sender_match:
-                continue
-            if not receiver_match:
-                continue
-            
-            # Проверяем сумму с погрешностью 1% (на комиссии)
-            amount_diff = abs(amt_int - int(amount_nano))
-            amount_tolerance = int(amount_nano) * 0.01  # 1%
-            if amount_diff > amount_tolerance:
-                continue
-            
-            # Проверяем комментарий если нужно
-            if comment_contains and comment_contains not in str(comment):
-                continue
-            
-            logger.info(f"[TonAPI] ✅ Found matching transfer! event_id={event_id}, tx_hash={tx_hash}")
-            
-            return {
-                "event_id": event_id,
-                "tx_hash": tx_hash,
-                "comment": comment,
-                "amount": amt_int,
-                "timestamp": timestamp,
-            }
-    
-    logger.info("[TonAPI] No matching transfer found")
-    return None
+            jetton = data.get("jetton") or {}
+
+            yield JettonTransfer(
+                event_id=event_id,
+                tx_hash=_event_tx_hash(ev, event_id),
+                sender=_action_address(data, "sender"),
+                recipient=_action_address(data, "recipient"),
+                jetton_master=normalize_address(jetton.get("address") or "") if isinstance(jetton, dict) else "",
+                amount=amount,
+                comment=str(data.get("comment") or ""),
+                timestamp=timestamp,
+                lt=event_lt(ev),
+            )
 
 
 def verify_payment(
@@ -205,24 +763,31 @@ def verify_payment(
     sender_address: str,
     amount_nano: int,
     order_id: Optional[str] = None,
+    since: Optional[int] = None,
 ) -> Optional[dict]:
     """
     Высокоуровневая функция проверки платежа.
-    
+
     Args:
         receiver_address: адрес получателя (наш кошелёк)
         sender_address: адрес отправителя (кошелёк пользователя)
         amount_nano: ожидаемая сумма в нанотонах
         order_id: ID заказа для поиска в комментарии
-        
+        since: unix time создания заказа — события листаются назад до него
+            (без since смотрим только последнюю страницу)
+
     Returns:
         dict с данными о транзакции если найдена, иначе None
     """
     try:
-        events = get_account_events(receiver_address, limit=30)
-        
+        if since:
+            events, _ = scan_account_events(receiver_address, min_timestamp=since)
+            events = {"events": events}
+        else:
+            events = get_account_events(receiver_address, limit=30)
+
         comment_contains = f"SP:{order_id}" if order_id else None
-        
+
         return find_ton_transfer_event(
             events,
             receiver=receiver_address,
@@ -230,8 +795,7 @@ def verify_payment(
             amount_nano=amount_nano,
             comment_contains=comment_contains,
         )
-        
+
     except TonApiError as e:
         logger.error(f"[TonAPI] verify_payment failed: {e}")
         return None
-
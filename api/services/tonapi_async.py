@@ -0,0 +1,170 @@
+"""
+Soulpull MVP — TonAPI Service (asyncio)
+
+Async вариант api.services.tonapi с теми же именами функций для async
+views под ASGI: ожидание TonAPI не держит поток, один процесс обслуживает
+тысячи одновременных поллеров.
+
+Общее с sync версией: SWR кэш страниц событий (events_cache), circuit
+breaker, разбор ответов и поиск переводов. Single-flight — внутри event
+loop (asyncio.Future); межпроцессной файловой лизы здесь нет, её роль
+под ASGI играет общий кэш.
+"""
+
+import asyncio
+import logging
+import weakref
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from api.services import http_client
+from api.services.tonapi import (
+    TONAPI_BASE_URL,
+    TONAPI_TIMEOUT,
+    TonApiError,
+    _events_key,
+    _events_request,
+    _headers,
+    _response_json,
+    _scan_page,
+    events_cache,
+    find_ton_transfer_event,
+    tonapi_breaker,
+)
+
+logger = logging.getLogger(__name__)
+
+_flights: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Future]]" = weakref.WeakKeyDictionary()
+
+
+async def _single_flight(key: str, fn: Callable[[], Awaitable[dict]]) -> dict:
+    """Выполнить fn один раз на key для всех одновременных корутин loop."""
+    flights = _flights.setdefault(asyncio.get_running_loop(), {})
+    flight = flights.get(key)
+    if flight is not None:
+        try:
+            return await asyncio.wait_for(asyncio.shield(flight), TONAPI_TIMEOUT + 5)
+        except asyncio.TimeoutError:
+            raise TonApiError("TonAPI request timed out (single-flight)")
+        except asyncio.CancelledError:
+            if flight.cancelled():  # отменили лидера, а не нас
+                raise TonApiError("TonAPI request cancelled (single-flight)")
+            raise
+
+    flight = flights[key] = asyncio.get_running_loop().create_future()
+    try:
+        result = await fn()
+    except asyncio.CancelledError:
+        flight.cancel()
+        raise
+    except Exception as e:
+        flight.set_exception(e)
+        # Исключение лидера поднимается у него самого; ведомых может не быть
+        flight.exception()
+        raise
+    else:
+        flight.set_result(result)
+        return result
+    finally:
+        flights.pop(key, None)
+
+
+async def _request_json(url: str, params: Optional[dict] = None) -> dict:
+    """Async GET к TonAPI через общий пул и circuit breaker."""
+    if not tonapi_breaker.allow():
+        raise TonApiError("TonAPI circuit open")
+
+    try:
+        logger.info(f"[TonAPI] GET {url} {params or ''}")
+        r = await http_client.aget(url, headers=_headers(), params=params)
+    except httpx.HTTPError as e:
+        logger.error(f"[TonAPI] Request failed: {e}")
+        tonapi_breaker.record_failure(e.__class__.__name__)
+        raise TonApiError(f"TonAPI request failed: {e}")
+    return _response_json(r)
+
+
+async def _fetch_account_events(account_id: str, limit: int, before_lt: Optional[int] = None) -> dict:
+    data = await _request_json(*_events_request(account_id, limit, before_lt))
+    logger.info(f"[TonAPI] Got {len(data.get('events', []))} events")
+    return data
+
+
+async def get_event(event_id: str) -> dict:
+    """Одно событие по event_id. GET /v2/events/{event_id}"""
+    return await _request_json(f"{TONAPI_BASE_URL}/v2/events/{event_id}")
+
+
+async def get_account_events(account_id: str, limit: int = 25, before_lt: Optional[int] = None) -> dict:
+    """
+    Получить события аккаунта (новые первыми); см. tonapi.get_account_events.
+
+    Кэш общий с sync версией. Возвращаемый dict не модифицировать.
+    """
+    key = _events_key(account_id, limit, before_lt)
+    return await events_cache.aget(
+        key,
+        lambda: _single_flight(key, lambda: _fetch_account_events(account_id, limit, before_lt)),
+    )
+
+
+async def scan_account_events(
+    account_id: str,
+    *,
+    stop_lt: int = 0,
+    min_timestamp: Optional[int] = None,
+    limit: int = 100,
+    max_pages: int = 20,
+) -> tuple[list[dict], bool]:
+    """
+    Листать события аккаунта назад до stop_lt / min_timestamp;
+    см. tonapi.scan_account_events.
+
+    Returns:
+        (events, complete)
+    """
+    collected: list[dict] = []
+    before_lt: Optional[int] = None
+
+    for _ in range(max_pages):
+        page = await get_account_events(account_id, limit=limit, before_lt=before_lt)
+        before_lt = _scan_page(page, collected, stop_lt=stop_lt, min_timestamp=min_timestamp, limit=limit)
+        if before_lt is None:
+            return collected, True
+
+    logger.warning(f"[TonAPI] scan of {account_id} stopped after {max_pages} pages")
+    return collected, False
+
+
+async def verify_payment(
+    receiver_address: str,
+    sender_address: str,
+    amount_nano: int,
+    order_id: Optional[str] = None,
+    since: Optional[int] = None,
+) -> Optional[dict]:
+    """
+    Проверка платежа; см. tonapi.verify_payment.
+
+    Returns:
+        dict с данными о транзакции если найдена, иначе None
+    """
+    try:
+        if since:
+            events, _ = await scan_account_events(receiver_address, min_timestamp=since)
+            events = {"events": events}
+        else:
+            events = await get_account_events(receiver_address, limit=30)
+
+        return find_ton_transfer_event(
+            events,
+            receiver=receiver_address,
+            sender=sender_address,
+            amount_nano=amount_nano,
+            comment_contains=f"SP:{order_id}" if order_id else None,
+        )
+
+    except TonApiError as e:
+        logger.error(f"[TonAPI] verify_payment failed: {e}")
+        return None
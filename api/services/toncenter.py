@@ -1,13 +1,34 @@
-import json
 import os
 import urllib.parse
-import urllib.request
+from functools import lru_cache
+from typing import Optional
+
+import requests
+
+from api.services import http_client
+from api.services.breaker import CircuitBreaker
+from api.services.ton_address import TonAddress, TonAddressError, parse_address
+from api.services.ton_cells import Cell, TonCellError, begin_cell, parse_boc
+
+# Раскладка data jetton-wallet:
+# - stablecoin (USDT, governed): status:uint4 balance:Coins owner master
+# - standard (TEP-74 reference): balance:Coins owner master wallet_code:^Cell
+JETTON_LAYOUT_STABLECOIN = "stablecoin"
+JETTON_LAYOUT_STANDARD = "standard"
 
 
 class ToncenterError(RuntimeError):
     pass
 
 
+toncenter_breaker = CircuitBreaker(
+    "toncenter",
+    failure_threshold=int(os.getenv("TONCENTER_BREAKER_FAILURES", "5")),
+    base_cooldown=float(os.getenv("TONCENTER_BREAKER_COOLDOWN", "5")),
+    max_cooldown=float(os.getenv("TONCENTER_BREAKER_MAX_COOLDOWN", "60")),
+)
+
+
 def _base_url() -> str:
     return (os.getenv("TONCENTER_BASE_URL") or "https://toncenter.com/api/v3").rstrip("/")
 
@@ -17,19 +38,27 @@ def _api_key() -> str:
 
 
 def _http_get_json(url: str) -> dict:
-    req = urllib.request.Request(url, method="GET")
+    headers = {"Accept": "application/json"}
     key = _api_key()
     if key:
         # Toncenter supports X-API-Key on some deployments; keep query api_key as fallback.
-        req.add_header("X-API-Key", key)
+        headers["X-API-Key"] = key
+    if not toncenter_breaker.allow():
+        raise ToncenterError("toncenter circuit open")
     try:
-        with urllib.request.urlopen(req, timeout=15) as resp:
-            raw = resp.read().decode("utf-8", errors="replace")
-    except Exception as e:
+        resp = http_client.get(url, headers=headers)
+    except requests.RequestException as e:
+        toncenter_breaker.record_failure(e.__class__.__name__)
         raise ToncenterError(f"toncenter request failed: {e.__class__.__name__}") from e
+    if resp.status_code >= 500 or resp.status_code == 429:
+        toncenter_breaker.record_failure(f"HTTP {resp.status_code}")
+        raise ToncenterError(f"toncenter request failed: HTTP {resp.status_code}")
+    toncenter_breaker.record_success()
+    if resp.status_code >= 400:
+        raise ToncenterError(f"toncenter request failed: HTTP {resp.status_code}")
     try:
-        data = json.loads(raw)
-    except Exception as e:
+        data = resp.json()
+    except ValueError as e:
         raise ToncenterError("toncenter returned non-json") from e
     return data if isinstance(data, dict) else {"data": data}
 
@@ -84,3 +113,74 @@ def get_jetton_wallet_address(*, owner_address: str, jetton_master_address: str)
     return str(addr)
 
 
+# ----------------------------------------------------------------------------
+# Offline derivation (StateInit hash)
+# ----------------------------------------------------------------------------
+
+@lru_cache(maxsize=8)
+def _wallet_code_cell(code_boc: str) -> Cell:
+    return parse_boc(code_boc)
+
+
+def _jetton_wallet_data(owner: TonAddress, master: TonAddress, code: Cell, layout: str) -> Cell:
+    b = begin_cell()
+    if layout == JETTON_LAYOUT_STABLECOIN:
+        b.store_uint(0, 4)  # status
+        b.store_coins(0).store_address(owner).store_address(master)
+    elif layout == JETTON_LAYOUT_STANDARD:
+        b.store_coins(0).store_address(owner).store_address(master).store_ref(code)
+    else:
+        raise ToncenterError(f"unknown jetton wallet layout: {layout}")
+    return b.end_cell()
+
+
+def derive_jetton_wallet_address(
+    *,
+    owner_address: str,
+    jetton_master_address: str,
+    wallet_code_boc: str,
+    layout: str = JETTON_LAYOUT_STABLECOIN,
+) -> str:
+    """
+    Адрес jetton-wallet без сети: hash(StateInit(code, data)) в workchain мастера.
+
+    StateInit: split_depth:nothing special:nothing code:^Cell data:^Cell library:empty.
+    Возвращает bounceable user-friendly адрес (как принято для jetton-wallet).
+
+    Raises:
+        ToncenterError: некорректный адрес, BOC или layout
+    """
+    try:
+        owner = parse_address(owner_address)
+        master = parse_address(jetton_master_address)
+        code = _wallet_code_cell(wallet_code_boc.strip())
+    except (TonAddressError, TonCellError) as e:
+        raise ToncenterError(f"cannot derive jetton wallet: {e}") from e
+
+    data = _jetton_wallet_data(owner, master, code, layout)
+    state_init = (
+        begin_cell()
+        .store_uint(0b00110, 5)  # no split_depth, no special, code, data, no library
+        .store_ref(code)
+        .store_ref(data)
+        .end_cell()
+    )
+    return TonAddress(workchain=master.workchain, hash=state_init.hash(), testnet=master.testnet).to_friendly(bounceable=True)
+
+
+def configured_wallet_code(jetton_master_address: str) -> Optional[tuple[str, str]]:
+    """
+    (code BOC, layout) для мастера, если для него настроена локальная деривация.
+    Сейчас — только USDT_JETTON_MASTER + USDT_JETTON_WALLET_CODE.
+    """
+    code = (os.getenv("USDT_JETTON_WALLET_CODE") or "").strip()
+    usdt_master = (os.getenv("USDT_JETTON_MASTER") or "").strip()
+    if not code or not usdt_master:
+        return None
+    try:
+        if parse_address(usdt_master).raw != parse_address(jetton_master_address).raw:
+            return None
+    except TonAddressError:
+        return None
+    layout = (os.getenv("USDT_JETTON_WALLET_LAYOUT") or JETTON_LAYOUT_STABLECOIN).strip().lower()
+    return code, layout
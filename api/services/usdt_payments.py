@@ -0,0 +1,151 @@
+"""
+Soulpull MVP — USDT Auto-Confirm
+
+Автоматическое подтверждение участий, оплаченных USDT (JettonTransfer),
+вместо ручного admin /confirm.
+
+Платёж участия = JettonTransfer на RECEIVER_WALLET (владелец, не jetton-wallet)
+с jetton master = USDT_JETTON_MASTER, суммой ≥ 15 USDT и комментарием
+Soulpull:<participation_id> (его кладёт payment/build-tx).
+
+Проход воркера (manage.py confirm_usdt_payments): все открытые участия одним
+запросом → скан событий получателя новее курсора TonApiCursor ("usdt:<receiver>")
+→ индекс переводов по participation_id → подтверждение пачкой в одной
+транзакции через services.participations (с проверкой дубля tx_hash) →
+курсор продвигается. Каждое событие разбирается один раз: открытое участие,
+которое так и не оплатили, не тянет скан назад к своему created_at на
+каждом проходе, а перевод-дубль не порождает RiskEvent повторно.
+"""
+
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from django.db import transaction
+
+from api.models import Participation, TonApiCursor
+from api.services.participations import OPEN_STATUSES, ParticipationError, confirm_participation
+from api.services.payment_ingest import CLOCK_SKEW_SECONDS, advance_cursor, scan_from_cursor
+from api.services.tonapi import JettonTransfer, iter_jetton_transfers, normalize_address
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_USDT_AMOUNT = 15_000_000  # 15 USDT (6 decimals)
+# Комментарий целиком, как его кладёт payment/build-tx
+PARTICIPATION_COMMENT_RE = re.compile(r"Soulpull:(\d+)")
+
+
+@dataclass
+class UsdtConfirmResult:
+    open: int = 0
+    fetched: int = 0
+    cursor_lt: int = 0
+    confirmed: list[int] = field(default_factory=list)
+    rejected: dict[int, str] = field(default_factory=dict)
+
+
+def usdt_receiver() -> str:
+    return (os.getenv("RECEIVER_WALLET") or "").strip()
+
+
+def usdt_master() -> str:
+    return (os.getenv("USDT_JETTON_MASTER") or "").strip()
+
+
+class JettonPaymentIndex:
+    """Успешные USDT переводы получателю, по participation_id из комментария."""
+
+    def __init__(self, transfers: Iterable[JettonTransfer], *, amount: int = PAYMENT_USDT_AMOUNT):
+        self.by_participation: dict[int, JettonTransfer] = {}
+        for t in transfers:
+            if t.amount < amount:
+                continue
+            # Один перевод оплачивает не больше одного участия
+            m = PARTICIPATION_COMMENT_RE.fullmatch(t.comment.strip())
+            if m:
+                # Первый (самый новый) перевод на участие; повторы не нужны
+                self.by_participation.setdefault(int(m.group(1)), t)
+
+    @classmethod
+    def from_events(cls, events: list[dict], *, receiver: str, master: str, amount: int = PAYMENT_USDT_AMOUNT) -> "JettonPaymentIndex":
+        receiver_norm = normalize_address(receiver)
+        master_norm = normalize_address(master)
+        return cls(
+            (
+                t for t in iter_jetton_transfers({"events": events})
+                if t.recipient == receiver_norm and t.jetton_master == master_norm
+            ),
+            amount=amount,
+        )
+
+    def match(self, participation_id: int) -> Optional[JettonTransfer]:
+        return self.by_participation.get(participation_id)
+
+
+def confirm_usdt_payments(
+    receiver: Optional[str] = None,
+    *,
+    master: Optional[str] = None,
+    limit: int = 100,
+    max_pages: int = 20,
+) -> UsdtConfirmResult:
+    """
+    Один проход автоподтверждения.
+
+    Raises:
+        TonApiError: TonAPI недоступен (ничего не подтверждается, курсор не двигается)
+    """
+    receiver = (receiver or usdt_receiver()).strip()
+    master = (master or usdt_master()).strip()
+
+    participations = list(Participation.objects.filter(status__in=OPEN_STATUSES))
+    result = UsdtConfirmResult(open=len(participations))
+    if not participations or not receiver or not master:
+        return result
+
+    cursor, _ = TonApiCursor.objects.get_or_create(account=f"usdt:{receiver}")
+    oldest = min(p.created_at for p in participations)
+    events, complete = scan_from_cursor(
+        cursor,
+        receiver,
+        min_timestamp=int(oldest.timestamp()) - CLOCK_SKEW_SECONDS,
+        limit=limit,
+        max_pages=max_pages,
+    )
+    result.fetched = len(events)
+    settled = [ev for ev in events if not ev.get("in_progress")]
+    index = JettonPaymentIndex.from_events(settled, receiver=receiver, master=master)
+
+    if index.by_participation:
+        # Участие, открытое во время скана, тоже может быть оплачено событием выборки
+        participations = list(
+            Participation.objects.filter(status__in=OPEN_STATUSES, pk__in=list(index.by_participation))
+        )
+        _confirm_matches(participations, index, result)
+
+    advance_cursor(cursor, events, complete)
+    result.cursor_lt = cursor.last_lt
+    return result
+
+
+def _confirm_matches(participations: list[Participation], index: JettonPaymentIndex, result: UsdtConfirmResult) -> None:
+    matches = [(p, t) for p in participations if (t := index.match(p.id))]
+    if not matches:
+        return
+
+    with transaction.atomic():
+        for participation, transfer in matches:
+            try:
+                confirm_participation(
+                    participation,
+                    tx_hash=transfer.event_id,
+                    meta={"source": "usdt_auto", "sender": transfer.sender, "amount": transfer.amount},
+                )
+            except ParticipationError as e:
+                logger.warning(f"[USDT] Participation #{participation.id} not confirmed: {e.code}")
+                result.rejected[participation.id] = e.code
+                continue
+            logger.info(f"[USDT] Participation #{participation.id} confirmed, event_id={transfer.event_id}")
+            result.confirmed.append(participation.id)
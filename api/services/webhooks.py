@@ -0,0 +1,157 @@
+"""
+Soulpull MVP — TonAPI Webhooks
+
+Push-приём уведомлений о транзакциях кошелька-получателя.
+
+TonAPI (account-tx подписка) присылает:
+    {"account_id": "0:...", "lt": 123, "tx_hash": "..."}
+Само событие (actions) мы забираем через GET /v2/events/{tx_hash}. Поле
+"event" в самом уведомлении (локальный stand-in) принимается только при
+DEBUG — в проде событие всегда читается из TonAPI, подписи секретом мало.
+
+Событие in_progress не записывается: его подберёт ингестер, когда оно
+завершится. WebhookEvent сохраняется только после сопоставления с
+настроенным получателем, иначе повторная доставка была бы отброшена
+как дубликат.
+
+Подпись: HMAC-SHA256(TONAPI_WEBHOOK_SECRET, raw body) в hex, заголовок
+X-Tonapi-Signature (допускается префикс "sha256=").
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from api.models import PaymentOrder, WebhookEvent
+from api.services.payment_ingest import match_pending_orders, receiver_address
+from api.services.tonapi import get_event
+
+SIGNATURE_HEADER = "X-Tonapi-Signature"
+
+
+class WebhookError(ValueError):
+    pass
+
+
+@dataclass
+class WebhookResult:
+    event_id: str
+    duplicate: bool = False
+    in_progress: bool = False
+    paid: list[str] = field(default_factory=list)
+
+
+def webhook_secret() -> str:
+    return (os.getenv("TONAPI_WEBHOOK_SECRET") or "").strip()
+
+
+def sign_body(secret: str, body: bytes) -> str:
+    return hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    got = (signature or "").strip()
+    if got.lower().startswith("sha256="):
+        got = got[7:]
+    if not secret or not got:
+        return False
+    return hmac.compare_digest(sign_body(secret, body), got.lower())
+
+
+def inline_events_allowed() -> bool:
+    """Доверять ли событию, вложенному в уведомление (stand-in), — только при DEBUG."""
+    return bool(settings.DEBUG)
+
+
+def handle_account_tx(payload: dict) -> WebhookResult:
+    """
+    Обработать одно уведомление: дедупликация, загрузка события,
+    сопоставление с pending PaymentOrder (тот же TransferIndex, что у ингестера).
+
+    Raises:
+        WebhookError: некорректное уведомление или не настроен получатель
+        TonApiError: событие не удалось загрузить (отправитель повторит доставку)
+    """
+    receiver = receiver_address()
+    if not receiver:
+        raise WebhookError("PAYMENT_RECEIVER_TON is not configured")
+
+    event = payload.get("event") if isinstance(payload.get("event"), dict) else None
+    if not inline_events_allowed():
+        event = None
+    event_id = str((event or {}).get("event_id") or payload.get("tx_hash") or payload.get("event_id") or "").strip()
+    if not event_id:
+        raise WebhookError("tx_hash is required")
+
+    if WebhookEvent.objects.filter(event_id=event_id).exists():
+        return WebhookResult(event_id=event_id, duplicate=True)
+
+    if event is None:
+        event = get_event(event_id)
+    if event.get("in_progress"):
+        return WebhookResult(event_id=event_id, in_progress=True)
+
+    try:
+        lt = int(payload.get("lt") or event.get("lt") or 0)
+    except (TypeError, ValueError):
+        lt = 0
+
+    try:
+        with transaction.atomic():
+            WebhookEvent.objects.create(
+                event_id=event_id,
+                account_id=str(payload.get("account_id") or "")[:128],
+                lt=lt,
+            )
+            paid = match_pending_orders([event], receiver=receiver)
+    except IntegrityError:
+        # Параллельная доставка того же события
+        return WebhookResult(event_id=event_id, duplicate=True)
+
+    return WebhookResult(event_id=event_id, paid=paid)
+
+
+def build_standin_notification(order: PaymentOrder, *, receiver: str, lt: Optional[int] = None) -> dict:
+    """
+    Локальный stand-in TonAPI: уведомление с готовым событием, которое
+    оплачивает order. Для тестов и ручной проверки webhook; вложенное
+    событие принимается только при DEBUG.
+    """
+    lt = lt or int(time.time() * 1000)
+    event_id = hashlib.sha256(f"{order.public_id}:{lt}".encode("utf-8")).hexdigest()
+    return {
+        "account_id": receiver,
+        "lt": lt,
+        "tx_hash": event_id,
+        "event": {
+            "event_id": event_id,
+            "lt": lt,
+            "timestamp": int(time.time()),
+            "in_progress": False,
+            "actions": [
+                {
+                    "type": "TonTransfer",
+                    "status": "ok",
+                    "TonTransfer": {
+                        "sender": {"address": order.wallet_address},
+                        "recipient": {"address": receiver},
+                        "amount": order.amount_nano,
+                        "comment": f"SP:{order.public_id}",
+                    },
+                }
+            ],
+        },
+    }
+
+
+def encode_signed(payload: dict, secret: str) -> tuple[bytes, dict]:
+    """Тело и заголовки для отправки уведомления с подписью."""
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return body, {"Content-Type": "application/json", SIGNATURE_HEADER: sign_body(secret, body)}
@@ -1,17 +1,31 @@
 import base64
 import hashlib
 import hmac
+import io
 import json
 import os
 import struct
+import threading
 import time
+from unittest import mock
 from urllib.parse import urlencode
 
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
 from django.utils import timezone
 
 from nacl.signing import SigningKey
 
+from api.models import (
+    Participation,
+    ParticipationStatus,
+    PaymentOrder,
+    PaymentOrderStatus,
+    TonApiCursor,
+    UserProfile,
+    WebhookEvent,
+)
+
 
 def _sha256(data: bytes) -> bytes:
     return hashlib.sha256(data).digest()
@@ -135,3 +149,1899 @@ class TonProofFlowTests(TestCase):
         self.assertIn("amount", j)
 
 
+RECEIVER = "UQDxxCX7_5aISQzEaoPPGW69MblWkFW8mSuHgQzuSXhvZvOc"
+SENDER = "UQBvW8Z5huBkMJYdnfAEM5JqTNkuWX3diqYENkWsIL0XggGG"
+
+
+def _ton_transfer_event(*, lt: int, comment: str, sender: str = SENDER, amount: int = 100000000, **extra) -> dict:
+    ev = {
+        "event_id": f"ev{lt}",
+        "lt": lt,
+        "timestamp": int(time.time()),
+        "actions": [
+            {
+                "type": "TonTransfer",
+                "TonTransfer": {
+                    "sender": {"address": sender},
+                    "recipient": {"address": RECEIVER},
+                    "amount": amount,
+                    "comment": comment,
+                },
+            }
+        ],
+    }
+    ev.update(extra)
+    return ev
+
+
+def _create_order(**kwargs) -> PaymentOrder:
+    public_id = PaymentOrder.new_public_id()
+    defaults = {
+        "public_id": public_id,
+        "wallet_address": SENDER,
+        "amount_nano": 100000000,
+        "comment": f"SP:{public_id}",
+        "expires_at": timezone.now() + timezone.timedelta(minutes=30),
+    }
+    defaults.update(kwargs)
+    return PaymentOrder.objects.create(**defaults)
+
+
+class PaymentIngestTests(TestCase):
+    def test_ingest_marks_order_paid_and_advances_cursor(self):
+        from api.services.payment_ingest import ingest_receiver_events
+
+        order = _create_order()
+        other = _create_order()
+        page = {"events": [_ton_transfer_event(lt=200, comment=order.comment), _ton_transfer_event(lt=100, comment="hi")]}
+
+        with mock.patch("api.services.tonapi.get_account_events", return_value=page):
+            result = ingest_receiver_events(RECEIVER)
+
+        self.assertEqual(result.paid, [order.public_id])
+        order.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(order.status, PaymentOrderStatus.PAID)
+        self.assertEqual(order.paid_event_id, "ev200")
+        self.assertEqual(other.status, PaymentOrderStatus.PENDING)
+        self.assertEqual(TonApiCursor.objects.get(account=RECEIVER).last_lt, 200)
+
+        # Тот же page повторно — событий новее курсора нет
+        with mock.patch("api.services.tonapi.get_account_events", return_value=page):
+            again = ingest_receiver_events(RECEIVER)
+        self.assertEqual(again.new_events, 0)
+
+    def test_cursor_does_not_skip_in_progress_events(self):
+        from api.services.payment_ingest import ingest_receiver_events
+
+        order = _create_order()
+        page = {"events": [
+            _ton_transfer_event(lt=300, comment="x"),
+            _ton_transfer_event(lt=250, comment=order.comment, in_progress=True),
+        ]}
+        with mock.patch("api.services.tonapi.get_account_events", return_value=page):
+            result = ingest_receiver_events(RECEIVER)
+        self.assertEqual(result.paid, [])
+        self.assertEqual(result.cursor_lt, 249)
+
+        page["events"][1]["in_progress"] = False
+        with mock.patch("api.services.tonapi.get_account_events", return_value=page):
+            result = ingest_receiver_events(RECEIVER)
+        self.assertEqual(result.paid, [order.public_id])
+        self.assertEqual(result.cursor_lt, 300)
+
+    def test_deep_pagination_and_high_water_mark(self):
+        from api.services.payment_ingest import ingest_receiver_events
+
+        order = _create_order(created_at=timezone.now() - timezone.timedelta(minutes=20))
+        now = int(time.time())
+        # 3 страницы по 2 события; оплата заказа — на самой старой
+        pages = {
+            None: {"events": [_ton_transfer_event(lt=600, comment="a"), _ton_transfer_event(lt=500, comment="b")], "next_from": 500},
+            500: {"events": [_ton_transfer_event(lt=400, comment="c"), _ton_transfer_event(lt=300, comment="d")], "next_from": 300},
+            300: {"events": [_ton_transfer_event(lt=200, comment=order.comment), _ton_transfer_event(lt=100, comment="e", timestamp=now - 3600)], "next_from": 100},
+        }
+        calls = []
+
+        def fake_events(account_id, limit=25, before_lt=None):
+            calls.append(before_lt)
+            return pages[before_lt]
+
+        with mock.patch("api.services.tonapi.get_account_events", side_effect=fake_events):
+            result = ingest_receiver_events(RECEIVER, limit=2)
+        self.assertEqual(result.paid, [order.public_id])
+        self.assertEqual(calls, [None, 500, 300])
+        self.assertEqual(result.cursor_lt, 600)
+
+        # Следующий проход останавливается на high-water mark
+        _create_order()
+        pages[None] = {"events": [_ton_transfer_event(lt=700, comment="f"), _ton_transfer_event(lt=600, comment="a")], "next_from": 600}
+        calls.clear()
+        with mock.patch("api.services.tonapi.get_account_events", side_effect=fake_events):
+            result = ingest_receiver_events(RECEIVER, limit=2)
+        self.assertEqual(calls, [None])
+        self.assertEqual(result.cursor_lt, 700)
+
+    def test_order_created_during_scan_is_matched(self):
+        from api.services.payment_ingest import ingest_receiver_events
+
+        _create_order()
+        late = []
+
+        def fake_events(account_id, limit=25, before_lt=None):
+            # Заказ создан и оплачен, пока ингестер читает события
+            late.append(_create_order())
+            return {"events": [_ton_transfer_event(lt=500, comment=late[0].comment)]}
+
+        with mock.patch("api.services.tonapi.get_account_events", side_effect=fake_events):
+            result = ingest_receiver_events(RECEIVER)
+        self.assertEqual(result.paid, [late[0].public_id])
+        self.assertEqual(result.cursor_lt, 500)
+
+    def test_truncated_scan_keeps_cursor(self):
+        from api.services.payment_ingest import ingest_receiver_events
+
+        _create_order()
+        page = {"events": [_ton_transfer_event(lt=900, comment="a"), _ton_transfer_event(lt=800, comment="b")], "next_from": 800}
+        with mock.patch("api.services.tonapi.get_account_events", return_value=page):
+            result = ingest_receiver_events(RECEIVER, limit=2, max_pages=1)
+        self.assertFalse(result.complete)
+        self.assertEqual(TonApiCursor.objects.get(account=RECEIVER).last_lt, 0)
+
+    def test_truncated_scan_resumes_below_where_it_stopped(self):
+        from api.services.payment_ingest import ingest_receiver_events
+
+        order = _create_order()
+        _create_order()  # остаётся pending — третьему проходу есть что сопоставлять
+        pages = {
+            None: {"events": [_ton_transfer_event(lt=900, comment="a"), _ton_transfer_event(lt=800, comment="b")], "next_from": 800},
+            800: {"events": [_ton_transfer_event(lt=700, comment=order.comment), _ton_transfer_event(lt=600, comment="c")], "next_from": 600},
+            600: {"events": [], "next_from": None},
+        }
+        calls = []
+
+        def fake_events(account_id, limit=25, before_lt=None):
+            calls.append(before_lt)
+            return pages[before_lt]
+
+        with mock.patch("api.services.tonapi.get_account_events", side_effect=fake_events):
+            first = ingest_receiver_events(RECEIVER, limit=2, max_pages=1)
+            second = ingest_receiver_events(RECEIVER, limit=2, max_pages=1)
+            third = ingest_receiver_events(RECEIVER, limit=2, max_pages=1)
+
+        self.assertEqual(calls, [None, 800, 600])
+        self.assertEqual(second.paid, [order.public_id])
+        self.assertEqual((first.cursor_lt, second.cursor_lt, third.cursor_lt), (0, 0, 900))
+        cursor = TonApiCursor.objects.get(account=RECEIVER)
+        self.assertEqual((cursor.resume_before_lt, cursor.resume_high_lt), (0, 0))
+
+    def test_recently_expired_order_paid_in_time_is_matched(self):
+        from api.services.payment_ingest import ingest_receiver_events
+
+        deadline = timezone.now() - timezone.timedelta(minutes=2)
+        order = _create_order(created_at=deadline - timezone.timedelta(minutes=30), expires_at=deadline)
+        late = _create_order(created_at=deadline - timezone.timedelta(minutes=30), expires_at=deadline)
+        page = {"events": [
+            _ton_transfer_event(lt=200, comment=late.comment),
+            _ton_transfer_event(lt=100, comment=order.comment, timestamp=int(deadline.timestamp()) - 5),
+        ]}
+        with mock.patch("api.services.tonapi.get_account_events", return_value=page):
+            result = ingest_receiver_events(RECEIVER)
+
+        self.assertEqual(result.paid, [order.public_id])
+        late.refresh_from_db()
+        self.assertEqual(late.status, PaymentOrderStatus.PENDING)
+
+    def test_no_pending_orders_no_network(self):
+        from api.services.payment_ingest import ingest_receiver_events
+
+        with mock.patch("api.services.tonapi.get_account_events", side_effect=AssertionError("network call")):
+            result = ingest_receiver_events(RECEIVER)
+        self.assertEqual(result.fetched, 0)
+
+    def test_status_view_reads_db_without_network(self):
+        order = _create_order()
+        with mock.patch("api.views.averify_payment", side_effect=AssertionError("network call")):
+            r = self.client.get(f"/api/v1/payments/{order.public_id}/status")
+            self.assertEqual(r.json()["status"], "pending")
+
+            order.mark_paid(event_id="ev1")
+            r = self.client.get(f"/api/v1/payments/{order.public_id}/status")
+            self.assertEqual(r.json()["status"], "paid")
+
+
+class VerifyPendingOrdersTests(TestCase):
+    def test_sweep_scans_each_receiver_once_and_bulk_updates(self):
+        from api.services.payment_ingest import sweep_pending_orders
+
+        other_receiver = "0:" + "c" * 64
+        a = _create_order(receiver_address=RECEIVER)
+        b = _create_order(receiver_address=RECEIVER)
+        c = _create_order(receiver_address=other_receiver)
+        # Перевод по stale пришёл уже после истечения заказа — не засчитывается
+        stale = _create_order(receiver_address=RECEIVER, expires_at=timezone.now() - timezone.timedelta(minutes=10))
+        pages = {
+            RECEIVER: {"events": [
+                _ton_transfer_event(lt=300, comment=a.comment),
+                _ton_transfer_event(lt=200, comment=b.comment),
+                _ton_transfer_event(lt=100, comment=stale.comment),
+            ]},
+            other_receiver: {"events": [_ton_transfer_event(lt=50, comment="unrelated")]},
+        }
+        calls = []
+
+        def fake_events(account_id, limit=25, before_lt=None):
+            calls.append(account_id)
+            return pages[account_id]
+
+        with mock.patch("api.services.tonapi.get_account_events", side_effect=fake_events):
+            result = sweep_pending_orders()
+
+        self.assertEqual(sorted(calls), sorted([RECEIVER, other_receiver]))
+        self.assertEqual(result.pending, 4)
+        self.assertEqual(result.receivers, 2)
+        self.assertEqual(sorted(result.paid), sorted([a.public_id, b.public_id]))
+        self.assertEqual(result.expired, 1)
+        statuses = dict(PaymentOrder.objects.values_list("public_id", "status"))
+        self.assertEqual(statuses[a.public_id], PaymentOrderStatus.PAID)
+        self.assertEqual(statuses[b.public_id], PaymentOrderStatus.PAID)
+        self.assertEqual(statuses[c.public_id], PaymentOrderStatus.PENDING)
+        self.assertEqual(statuses[stale.public_id], PaymentOrderStatus.EXPIRED)
+
+    def test_expired_order_paid_before_deadline_is_paid(self):
+        from api.services.payment_ingest import sweep_pending_orders
+
+        deadline = timezone.now() - timezone.timedelta(minutes=10)
+        order = _create_order(
+            receiver_address=RECEIVER,
+            created_at=deadline - timezone.timedelta(minutes=30),
+            expires_at=deadline,
+        )
+        page = {"events": [
+            _ton_transfer_event(lt=100, comment=order.comment, timestamp=int(deadline.timestamp()) - 5),
+        ]}
+        with mock.patch("api.services.tonapi.get_account_events", return_value=page):
+            result = sweep_pending_orders()
+
+        self.assertEqual(result.paid, [order.public_id])
+        self.assertEqual(result.expired, 0)
+        order.refresh_from_db()
+        self.assertEqual(order.status, PaymentOrderStatus.PAID)
+
+    def test_expired_order_is_kept_when_scan_fails(self):
+        from api.services.payment_ingest import sweep_pending_orders
+        from api.services.tonapi import TonApiError
+
+        order = _create_order(receiver_address=RECEIVER, expires_at=timezone.now() - timezone.timedelta(minutes=10))
+        with mock.patch("api.services.tonapi.get_account_events", side_effect=TonApiError("TonAPI HTTP 502")):
+            result = sweep_pending_orders()
+
+        self.assertEqual(result.expired, 0)
+        order.refresh_from_db()
+        self.assertEqual(order.status, PaymentOrderStatus.PENDING)
+
+    def test_tonapi_error_for_one_receiver_keeps_others(self):
+        from api.services.payment_ingest import sweep_pending_orders
+        from api.services.tonapi import TonApiError
+
+        other_receiver = "0:" + "c" * 64
+        a = _create_order(receiver_address=RECEIVER)
+        c = _create_order(receiver_address=other_receiver)
+
+        def fake_events(account_id, limit=25, before_lt=None):
+            if account_id == other_receiver:
+                raise TonApiError("TonAPI HTTP 502")
+            return {"events": [_ton_transfer_event(lt=10, comment=a.comment)]}
+
+        with mock.patch("api.services.tonapi.get_account_events", side_effect=fake_events):
+            result = sweep_pending_orders()
+
+        self.assertEqual(result.paid, [a.public_id])
+        self.assertIn(other_receiver, result.errors)
+        c.refresh_from_db()
+        self.assertEqual(c.status, PaymentOrderStatus.PENDING)
+
+    def test_already_paid_order_is_not_paid_twice(self):
+        from api.services.payment_ingest import match_pending_orders
+
+        order = _create_order(receiver_address=RECEIVER)
+        PaymentOrder.objects.filter(pk=order.pk).update(status=PaymentOrderStatus.PAID)
+        paid = match_pending_orders(
+            [_ton_transfer_event(lt=10, comment=order.comment)], receiver=RECEIVER, orders=[order],
+        )
+        self.assertEqual(paid, [])
+
+
+class ExpirySweeperTests(TestCase):
+    def test_expires_overdue_orders_in_chunks(self):
+        from api.services.expiry import expire_payment_orders
+
+        past = timezone.now() - timezone.timedelta(minutes=30)
+        overdue = [_create_order(expires_at=past) for _ in range(5)]
+        in_grace = _create_order(expires_at=timezone.now() - timezone.timedelta(minutes=1))
+        legacy = _create_order(expires_at=None, created_at=timezone.now() - timezone.timedelta(hours=1))
+        live = _create_order()
+        paid = _create_order(expires_at=past, status=PaymentOrderStatus.PAID)
+
+        self.assertEqual(expire_payment_orders(chunk_size=2), 6)
+        statuses = dict(PaymentOrder.objects.values_list("public_id", "status"))
+        for order in overdue + [legacy]:
+            self.assertEqual(statuses[order.public_id], PaymentOrderStatus.EXPIRED)
+        self.assertEqual(statuses[live.public_id], PaymentOrderStatus.PENDING)
+        self.assertEqual(statuses[in_grace.public_id], PaymentOrderStatus.PENDING)
+        self.assertEqual(statuses[paid.public_id], PaymentOrderStatus.PAID)
+        self.assertEqual(expire_payment_orders(), 0)
+
+    def test_releases_stale_new_participations(self):
+        from api.services.expiry import release_stale_participations
+
+        referrer = UserProfile.objects.create(telegram_id=1)
+        old = timezone.now() - timezone.timedelta(hours=2)
+
+        def participation(tid: int) -> Participation:
+            user = UserProfile.objects.create(telegram_id=tid)
+            p = Participation.objects.create(user=user, referrer=referrer)
+            Participation.objects.filter(pk=p.pk).update(created_at=old)
+            return p
+
+        stale = participation(2)
+        paying = participation(3)
+        _create_order(participation=paying)
+        fresh = Participation.objects.create(user=UserProfile.objects.create(telegram_id=4), referrer=referrer)
+
+        self.assertEqual(release_stale_participations(ttl_minutes=60), 1)
+        statuses = dict(Participation.objects.values_list("pk", "status"))
+        self.assertEqual(statuses[stale.pk], ParticipationStatus.EXPIRED)
+        self.assertEqual(statuses[paying.pk], ParticipationStatus.NEW)
+        self.assertEqual(statuses[fresh.pk], ParticipationStatus.NEW)
+
+
+class TonAddressTests(TestCase):
+    FRIENDLY = "EQCD39VS5jcptHL8vMjEXrzGaRcCVYto7HUn4bpAOg8xqB2N"
+    NON_BOUNCEABLE = "UQCD39VS5jcptHL8vMjEXrzGaRcCVYto7HUn4bpAOg8xqEBI"
+    RAW = "0:83dfd552e63729b472fcbcc8c45ebcc6691702558b68ec7527e1ba403a0f31a8"
+
+    def test_friendly_and_raw_round_trip(self):
+        from api.services.ton_address import parse_address, to_raw
+
+        addr = parse_address(self.FRIENDLY)
+        self.assertEqual(addr.workchain, 0)
+        self.assertTrue(addr.bounceable)
+        self.assertFalse(addr.testnet)
+        self.assertEqual(addr.raw, self.RAW)
+        self.assertEqual(addr.to_friendly(), self.FRIENDLY)
+        self.assertEqual(addr.to_friendly(bounceable=False), self.NON_BOUNCEABLE)
+        self.assertEqual(to_raw(self.NON_BOUNCEABLE), self.RAW)
+        self.assertEqual(to_raw(self.RAW.upper()), self.RAW)
+
+        testnet = parse_address(addr.to_friendly(testnet=True, url_safe=False))
+        self.assertTrue(testnet.testnet)
+        self.assertEqual(testnet.raw, self.RAW)
+
+        master = parse_address("-1:" + "ab" * 32)
+        self.assertEqual(parse_address(master.to_friendly()).raw, "-1:" + "ab" * 32)
+
+    def test_rejects_bad_checksum_and_garbage(self):
+        from api.services.ton_address import TonAddressError, canonical_raw, parse_address
+
+        broken = self.FRIENDLY[:-1] + ("O" if self.FRIENDLY[-1] != "O" else "P")
+        for bad in (broken, "0:1234", "hello", ""):
+            with self.assertRaises(TonAddressError):
+                parse_address(bad)
+        self.assertEqual(canonical_raw(broken), "")
+
+    def test_raw_event_matches_friendly_order(self):
+        from api.services.tonapi import TransferIndex, normalize_address
+
+        self.assertEqual(normalize_address(self.FRIENDLY), normalize_address(self.NON_BOUNCEABLE))
+        ev = _ton_transfer_event(lt=1, comment="SP:x", sender=self.RAW)
+        ev["actions"][0]["TonTransfer"]["recipient"]["address"] = normalize_address(RECEIVER)
+        index = TransferIndex.from_events({"events": [ev]}, receiver=RECEIVER)
+        self.assertIsNotNone(index.match(sender=self.NON_BOUNCEABLE, amount_nano=100000000, comment="SP:x"))
+
+    def test_wallet_raw_columns_and_lookup(self):
+        from api.services.auth import find_user_by_wallet
+
+        user = UserProfile.objects.create(telegram_id=7, wallet=self.FRIENDLY)
+        self.assertEqual(user.wallet_raw, self.RAW)
+        self.assertEqual(find_user_by_wallet(self.NON_BOUNCEABLE), user)
+        self.assertEqual(find_user_by_wallet(self.RAW), user)
+
+        user.wallet = "not-a-ton-address"
+        user.save(update_fields=["wallet"])
+        user.refresh_from_db()
+        self.assertEqual(user.wallet_raw, "")
+
+        order = _create_order(wallet_address=self.NON_BOUNCEABLE)
+        self.assertEqual(order.wallet_raw, self.RAW)
+
+
+class JettonWalletCacheTests(TestCase):
+    MASTER = "EQCxE6mUtQJKFnGfaROTKOt1lZbDiiX1kCixRv7Nw2Id_sDs"
+    OWNER = "UQCD39VS5jcptHL8vMjEXrzGaRcCVYto7HUn4bpAOg8xqEBI"
+
+    def setUp(self):
+        from api.services.jetton_wallets import wallet_lru
+
+        wallet_lru.clear()
+
+    def test_toncenter_called_once_per_owner_and_master(self):
+        from api.models import JettonWalletCache
+        from api.services.jetton_wallets import resolve_jetton_wallet, wallet_lru
+        from api.services.ton_address import to_raw
+
+        with mock.patch("api.services.jetton_wallets.get_jetton_wallet_address", return_value="EQjw") as fetch:
+            self.assertEqual(resolve_jetton_wallet(owner_address=self.OWNER, jetton_master_address=self.MASTER), "EQjw")
+            # Другая форма того же адреса — тот же ключ
+            self.assertEqual(resolve_jetton_wallet(owner_address=to_raw(self.OWNER), jetton_master_address=self.MASTER), "EQjw")
+            wallet_lru.clear()
+            self.assertEqual(resolve_jetton_wallet(owner_address=self.OWNER, jetton_master_address=self.MASTER), "EQjw")
+        self.assertEqual(fetch.call_count, 1)
+        self.assertTrue(JettonWalletCache.objects.filter(owner_raw=to_raw(self.OWNER), master_raw=to_raw(self.MASTER)).exists())
+
+    def test_endpoint_served_from_cache_and_warmed_on_wallet_link(self):
+        UserProfile.objects.create(telegram_id=42)
+        with mock.patch.dict(os.environ, {"USDT_JETTON_MASTER": self.MASTER, "USDT_JETTON_WALLET_CODE": ""}), \
+                mock.patch("api.services.jetton_wallets.get_jetton_wallet_address", return_value="EQjw") as fetch:
+            r = self.client.post("/api/v1/wallet", data=json.dumps({"telegram_id": 42, "wallet": self.OWNER}), content_type="application/json")
+            self.assertEqual(r.status_code, 200)
+            r = self.client.get("/api/v1/jetton/wallet", {"owner": self.OWNER})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()["wallet_address"], "EQjw")
+        self.assertEqual(fetch.call_count, 1)
+
+
+# Код USDT jetton-wallet (library cell) и код стандартного TEP-74 jetton-wallet.
+# Адреса корпуса сверены с независимой реализацией (pytoniq-core).
+USDT_MASTER = "EQCxE6mUtQJKFnGfaROTKOt1lZbDiiX1kCixRv7Nw2Id_sDs"
+USDT_WALLET_CODE = "b5ee9c7201010101002300084202ba2918c8947e9b25af9ac1b883357754173e5812f807a3d6e642a14709595395"
+STANDARD_WALLET_CODE = (
+    "b5ee9c7201021101000323000114ff00f4a413f4bcf2c80b0102016202100202cc03060201d4040500c30831c02497c1"
+    "38007434c0c05c6c2544d7c0fc03383e903e900c7e800c5c75c87e800c7e800c1cea6d0000b4c7e08403e29fa954882e"
+    "a54c4d167c0278208405e3514654882ea58c511100fc02b80d60841657c1ef2ea4d67c02f817c12103fcbc2000113e91"
+    "0c1c2ebcb85360020120070f020120080a01f1503d33ffa00fa4021f001ed44d0fa00fa40fa40d4305136a1522ac705f"
+    "2e2c128c2fff2e2c254344270542013541403c85004fa0258cf1601cf16ccc922c8cb0112f400f400cb00c920f900707"
+    "4c8cb02ca07cbffc9d004fa40f40431fa0020d749c200f2e2c4778018c8cb055008cf1670fa0217cb6b13cc809009e82"
+    "10178d4519c8cb1f19cb3f5007fa0222cf165006cf1625fa025003cf16c95005cc2391729171e25008a813a08209c9c3"
+    "80a014bcf2e2c504c98040fb001023c85004fa0258cf1601cf16ccc9ed540201200b0e02f73b51343e803e903e90350c"
+    "0234cffe80145468017e903e9014d6f1c1551cdb5c150804d50500f214013e809633c58073c5b33248b232c044bd003d"
+    "0032c0327e401c1d3232c0b281f2fff274140371c1472c7cb8b0c2be80146a2860822625a019ad822860822625a02806"
+    "2849e5c412440e0dd7c138c34975c2c0600c0d00705279a018a182107362d09cc8cb1f5230cb3f58fa025007cf165007"
+    "cf16c9718010c8cb0524cf165006fa0215cb6a14ccc971fb0010241023007cc30023c200b08e218210d53276db708010"
+    "c8cb055008cf165004fa0216cb6a12cb1f12cb3fc972fb0093356c21e203c85004fa0258cf1601cf16ccc9ed5400d73b"
+    "51343e803e903e90350c01f4cffe803e900c145468549271c17cb8b049f0bffcb8b08160824c4b402805af3cb8b0e084"
+    "1ef765f7b232c7c572cfd400fe8088b3c58073c5b25c60063232c14933c59c3e80b2dab33260103ec01004f214013e80"
+    "9633c58073c5b3327b55200083d40106b90f6a2687d007d207d206a1802698fc1080bc6a28ca9105d41083deecbef09d"
+    "d0958f97162e99f98fd001809d02811e428027d012c678b00e78b6664f6aa4001ba0f605da89a1f401f481f481a861"
+)
+STANDARD_MASTER = "EQAWsCiXovNR3vNVPsgXHBN4cbAFIdBOawDzOtYx9jwax3RC"
+
+
+class JettonWalletDerivationTests(TestCase):
+    USDT_CORPUS = [
+        ("UQCD39VS5jcptHL8vMjEXrzGaRcCVYto7HUn4bpAOg8xqEBI", "EQAP6OtinnZh7kKp10m6CJhuCqeJIYzfZ0VfAxnGWA0WOP7x"),
+        ("UQBFs7U-HaOI9f03lp-N4iKQM3H7wZJLKF7eZsCjId_Fl_sF", "EQBBEnnMjXskb1FG6N7sqEM7WQa4nBBXWsjUsRdM4Zgge_3U"),
+        ("UQBPOLrUSrKnc7UJ6YoiokKf0XLTSHi8MzyWA83WWrdOswpj", "EQBlzLYoyavFJeSBeNOGNQXE7nhX4NwXNxyE44igP7gqqjcS"),
+        ("UQAQoMV3ahxSZ-SP59I4-8G_PvkHptHrMJmVhsreZSJ6C_-n", "EQA8ejc3Hn_iCXAlPYFBJ9Q9gjHzrzCVO53Jk80dSBJrj-7X"),
+        ("Ef8RluHTlXITLouzabU7nRlpn-mzHG6D4N7Kiw2TO-ZPxIh3", "EQAF3YYadgidsCqEaKDAP62ToVyIlLyfZqaPX5-Aufwhvodi"),
+    ]
+    STANDARD_CORPUS = [
+        ("UQCD39VS5jcptHL8vMjEXrzGaRcCVYto7HUn4bpAOg8xqEBI", "EQAfSzmtYg7po4CUx-UG17qvO1EaTLAKcxYq753Cvh9W1Try"),
+        ("UQBFs7U-HaOI9f03lp-N4iKQM3H7wZJLKF7eZsCjId_Fl_sF", "EQAs_ro16B_quH3XttnPGww81vrZ-uD-rpvnj7zQdDmrB4K3"),
+        ("UQBPOLrUSrKnc7UJ6YoiokKf0XLTSHi8MzyWA83WWrdOswpj", "EQD9rhBDByUI01GO2XueMcQr-0FMeTCgXRALFX4GWBqHFKrA"),
+        ("UQAQoMV3ahxSZ-SP59I4-8G_PvkHptHrMJmVhsreZSJ6C_-n", "EQDJOTiMI-9XOLiTnnWiiEX-4wxq_mhkjaB9CLbFYAieuO-v"),
+        ("Ef8RluHTlXITLouzabU7nRlpn-mzHG6D4N7Kiw2TO-ZPxIh3", "EQBa7kLdShPvqiLErjMMrXiWlpqlZJDG0e8armQuqKvYo733"),
+    ]
+
+    def setUp(self):
+        from api.services import system_flags
+        from api.services.jetton_wallets import wallet_lru
+
+        wallet_lru.clear()
+        system_flags._known.discard(system_flags.JETTON_DERIVATION_DISABLED)
+
+    def test_empty_cell_hash(self):
+        from api.services.ton_cells import begin_cell
+
+        self.assertEqual(
+            begin_cell().end_cell().hash().hex(),
+            "96a296d224f285c67bee93c30f8a309157f0daa35dc5b87e410b78630a09cfc7",
+        )
+
+    def test_usdt_corpus(self):
+        from api.services.toncenter import derive_jetton_wallet_address
+
+        for owner, wallet in self.USDT_CORPUS:
+            derived = derive_jetton_wallet_address(
+                owner_address=owner, jetton_master_address=USDT_MASTER, wallet_code_boc=USDT_WALLET_CODE,
+            )
+            self.assertEqual(derived, wallet, owner)
+
+    def test_standard_layout_corpus(self):
+        from api.services.toncenter import JETTON_LAYOUT_STANDARD, derive_jetton_wallet_address
+
+        for owner, wallet in self.STANDARD_CORPUS:
+            derived = derive_jetton_wallet_address(
+                owner_address=owner,
+                jetton_master_address=STANDARD_MASTER,
+                wallet_code_boc=STANDARD_WALLET_CODE,
+                layout=JETTON_LAYOUT_STANDARD,
+            )
+            self.assertEqual(derived, wallet, owner)
+
+    def test_resolve_uses_derivation_without_network(self):
+        from api.services.jetton_wallets import resolve_jetton_wallet
+
+        owner, wallet = self.USDT_CORPUS[0]
+        env = {"USDT_JETTON_MASTER": USDT_MASTER, "USDT_JETTON_WALLET_CODE": USDT_WALLET_CODE}
+        with mock.patch.dict(os.environ, env), \
+                mock.patch("api.services.jetton_wallets.get_jetton_wallet_address") as fetch:
+            self.assertEqual(resolve_jetton_wallet(owner_address=owner, jetton_master_address=USDT_MASTER), wallet)
+        fetch.assert_not_called()
+
+    def test_mismatch_with_toncenter_disables_derivation(self):
+        from api.services import system_flags
+        from api.services.jetton_wallets import resolve_jetton_wallet, warm_jetton_wallet
+
+        disabled = system_flags.JETTON_DERIVATION_DISABLED
+        (owner, wallet), (second_owner, _), (_, wrong_wallet) = self.USDT_CORPUS[:3]
+        env = {"USDT_JETTON_MASTER": USDT_MASTER, "USDT_JETTON_WALLET_CODE": USDT_WALLET_CODE}
+        with mock.patch.dict(os.environ, env):
+            with mock.patch("api.services.jetton_wallets.get_jetton_wallet_address", return_value=wallet):
+                warm_jetton_wallet(owner)
+            self.assertFalse(system_flags.is_set(disabled))
+
+            # Пара уже в кэше — повторная привязка не ходит в Toncenter
+            with mock.patch("api.services.jetton_wallets.get_jetton_wallet_address") as fetch:
+                warm_jetton_wallet(owner)
+            fetch.assert_not_called()
+
+            # Toncenter не согласен с локальным кодом — дальше верим Toncenter
+            with mock.patch("api.services.jetton_wallets.get_jetton_wallet_address", return_value=wrong_wallet):
+                warm_jetton_wallet(second_owner)
+            self.assertTrue(system_flags.is_set(disabled))
+            with mock.patch("api.services.jetton_wallets.get_jetton_wallet_address") as fetch:
+                resolved = resolve_jetton_wallet(owner_address=second_owner, jetton_master_address=USDT_MASTER)
+            self.assertEqual(resolved, wrong_wallet)
+            fetch.assert_not_called()
+
+    def test_flag_set_elsewhere_bypasses_derived_lru_entry(self):
+        from api.models import SystemFlag
+        from api.services.jetton_wallets import resolve_jetton_wallet
+
+        owner, wallet = self.USDT_CORPUS[0]
+        env = {"USDT_JETTON_MASTER": USDT_MASTER, "USDT_JETTON_WALLET_CODE": USDT_WALLET_CODE}
+        with mock.patch.dict(os.environ, env):
+            self.assertEqual(resolve_jetton_wallet(owner_address=owner, jetton_master_address=USDT_MASTER), wallet)
+            # Флаг поставил другой процесс — наш LRU он не очищал
+            SystemFlag.objects.create(key="jetton_derivation_disabled")
+            with mock.patch("api.services.jetton_wallets.get_jetton_wallet_address", return_value="EQremote") as fetch:
+                resolved = resolve_jetton_wallet(owner_address=owner, jetton_master_address=USDT_MASTER)
+        self.assertEqual(resolved, "EQremote")
+        fetch.assert_called_once()
+
+
+class JettonTransferPayloadTests(TestCase):
+    RECEIVER_WALLET = "UQDxxCX7_5aISQzEaoPPGW69MblWkFW8mSuHgQzuSXhvZvOc"
+    SENDER_WALLET = "UQCD39VS5jcptHL8vMjEXrzGaRcCVYto7HUn4bpAOg8xqEBI"
+
+    def test_template_matches_builder_and_tlb_layout(self):
+        from api.services.jetton_transfer import OP_JETTON_TRANSFER, get_template, jetton_transfer_boc
+        from api.services.ton_address import parse_address
+        from api.services.ton_cells import parse_boc
+
+        boc = get_template(self.RECEIVER_WALLET, 15_000_000).render(
+            query_id=12345, response_destination=self.SENDER_WALLET, comment="Soulpull:42",
+        )
+        expected = jetton_transfer_boc(
+            query_id=12345,
+            jetton_amount=15_000_000,
+            destination=parse_address(self.RECEIVER_WALLET),
+            response_destination=parse_address(self.SENDER_WALLET),
+            comment="Soulpull:42",
+        )
+        self.assertEqual(boc, expected)
+
+        root = parse_boc(boc)
+        value = int.from_bytes(root.data, "big") >> (len(root.data) * 8 - root.bit_length)
+        pos = root.bit_length
+
+        def take(width: int) -> int:
+            nonlocal pos
+            pos -= width
+            return (value >> pos) & ((1 << width) - 1)
+
+        self.assertEqual(take(32), OP_JETTON_TRANSFER)
+        self.assertEqual(take(64), 12345)
+        self.assertEqual(take(4), 3)
+        self.assertEqual(take(24), 15_000_000)
+        self.assertEqual((take(3), take(8)), (0b100, 0))
+        self.assertEqual(take(256).to_bytes(32, "big"), parse_address(self.RECEIVER_WALLET).hash)
+        self.assertEqual((take(3), take(8)), (0b100, 0))
+        self.assertEqual(take(256).to_bytes(32, "big"), parse_address(self.SENDER_WALLET).hash)
+        # no custom_payload, forward_ton_amount = 1 nanoTON, forward_payload в ссылке
+        self.assertEqual([take(1), take(4), take(8), take(1)], [0, 1, 1, 1])
+        self.assertEqual(pos, 0)
+        self.assertEqual(root.refs[0].data, b"\x00\x00\x00\x00Soulpull:42")
+
+    def test_boc_round_trip_multi_cell(self):
+        from api.services.ton_cells import parse_boc, to_boc
+
+        code = parse_boc("".join(STANDARD_WALLET_CODE))
+        again = parse_boc(to_boc(code, crc=True))
+        self.assertEqual(again.hash(), code.hash())
+
+    def test_build_tx_returns_jetton_transfer(self):
+        import base64 as b64
+
+        from api.services.ton_cells import parse_boc
+
+        user = UserProfile.objects.create(telegram_id=5)
+        participation = Participation.objects.create(user=user)
+        env = {"RECEIVER_WALLET": self.RECEIVER_WALLET, "USDT_JETTON_MASTER": USDT_MASTER}
+        with mock.patch.dict(os.environ, env), \
+                mock.patch("api.views.resolve_jetton_wallet", return_value="EQjw"):
+            r = self.client.post(
+                "/api/v1/payment/build-tx",
+                data=json.dumps({"participation_id": participation.id, "sender_wallet": self.SENDER_WALLET}),
+                content_type="application/json",
+            )
+        self.assertEqual(r.status_code, 200)
+        body = r.json()
+        self.assertEqual(body["messages"][0]["address"], "EQjw")
+        root = parse_boc(b64.b64decode(body["messages"][0]["payload"]))
+        self.assertEqual(root.data[:4], bytes.fromhex("0f8a7ea5"))
+        self.assertEqual(root.refs[0].data[4:], f"Soulpull:{participation.id}".encode())
+
+
+class TransferIndexTests(TestCase):
+    def test_index_matches_same_as_linear_scan(self):
+        from api.services.tonapi import TransferIndex, find_ton_transfer_event
+
+        page = {"events": [
+            _ton_transfer_event(lt=1, comment="SP:aaa"),
+            _ton_transfer_event(lt=2, comment="SP:bbb", amount=5),
+            _ton_transfer_event(lt=3, comment="no key", sender="UQother"),
+        ]}
+        index = TransferIndex.from_events(page, receiver=RECEIVER)
+        for comment in ("SP:aaa", "SP:bbb", "SP:ccc"):
+            expected = find_ton_transfer_event(
+                page, receiver=RECEIVER, sender=SENDER, amount_nano=100000000, comment_contains=comment,
+            )
+            self.assertEqual(index.match(sender=SENDER, amount_nano=100000000, comment=comment), expected)
+
+        self.assertEqual(index.match(sender="UQother", amount_nano=100000000)["event_id"], "ev3")
+
+    def test_empty_sender_does_not_match(self):
+        from api.services.tonapi import TransferIndex
+
+        page = {"events": [_ton_transfer_event(lt=1, comment="SP:aaa", sender="")]}
+        index = TransferIndex.from_events(page, receiver=RECEIVER)
+        self.assertIsNone(index.match(sender=SENDER, amount_nano=100000000, comment="SP:aaa"))
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self) -> None:
+        from api.services.tonapi import events_cache
+
+        events_cache.clear()
+
+    def _slow_fetch(self, calls: list):
+        def fetch(account_id, limit, before_lt=None):
+            calls.append(account_id)
+            time.sleep(0.2)
+            return {"events": [{"event_id": "ev1"}]}
+        return fetch
+
+    def test_concurrent_callers_share_one_request(self):
+        import threading
+        from api.services import tonapi
+
+        calls, results = [], []
+        barrier = threading.Barrier(8)
+
+        def worker():
+            barrier.wait()
+            results.append(tonapi.get_account_events(RECEIVER, limit=30))
+
+        with mock.patch.object(tonapi, "TONAPI_SINGLEFLIGHT_DIR", ""), \
+                mock.patch.object(tonapi, "_fetch_account_events", self._slow_fetch(calls)):
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(r is results[0] for r in results))
+
+    def test_file_lease_shares_result_between_processes(self):
+        import tempfile
+        import threading
+        from api.services import tonapi
+
+        calls, results = [], []
+        fetch = self._slow_fetch(calls)
+
+        def worker():
+            # _file_lease напрямую — как если бы это были разные gunicorn воркеры
+            results.append(tonapi._file_lease("events|x", "events|x|30", lambda: fetch("x", 30)))
+
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(tonapi, "TONAPI_SINGLEFLIGHT_DIR", tmp):
+            first = threading.Thread(target=worker)
+            first.start()
+            time.sleep(0.05)
+            second = threading.Thread(target=worker)
+            second.start()
+            first.join()
+            second.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results[0], results[1])
+
+    def test_file_lease_keeps_one_lock_per_account(self):
+        import os
+        import tempfile
+        from api.services import tonapi
+
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(tonapi, "TONAPI_SINGLEFLIGHT_DIR", tmp):
+            for before_lt in range(5):
+                key = f"events|x|30|{before_lt}"
+                self.assertEqual(tonapi._file_lease("events|x", key, lambda: {"key": key}), {"key": key})
+            self.assertEqual(len(os.listdir(tmp)), 2)
+
+
+class EventsCacheTests(TestCase):
+    def setUp(self) -> None:
+        from api.services.tonapi import events_cache
+
+        events_cache.clear()
+
+    def test_hit_stale_and_background_refresh(self):
+        from api.services import tonapi
+
+        pages = iter([{"events": [{"event_id": "v1"}]}, {"events": [{"event_id": "v2"}]}])
+        with mock.patch.object(tonapi, "TONAPI_EVENTS_CACHE_TTL", 0.1), \
+                mock.patch.object(tonapi, "TONAPI_EVENTS_CACHE_STALE", 5), \
+                mock.patch.object(tonapi, "_fetch_account_events", side_effect=lambda *a: next(pages)):
+            first = tonapi.get_account_events(RECEIVER, limit=30)
+            self.assertIs(tonapi.get_account_events(RECEIVER, limit=30), first)
+
+            time.sleep(0.15)
+            # Протухло, но в окне stale: отдаём старое и обновляем в фоне
+            self.assertIs(tonapi.get_account_events(RECEIVER, limit=30), first)
+            for _ in range(50):
+                if tonapi.events_cache.stats()["stale"] and not tonapi.events_cache._refreshing:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(tonapi.get_account_events(RECEIVER, limit=30)["events"][0]["event_id"], "v2")
+
+        stats = tonapi.events_cache.stats()
+        self.assertEqual((stats["miss"], stats["hit"], stats["stale"]), (1, 2, 1))
+
+    def test_cursor_is_part_of_key(self):
+        from api.services import tonapi
+
+        with mock.patch.object(tonapi, "_fetch_account_events", return_value={"events": []}) as fetch:
+            tonapi.get_account_events(RECEIVER, limit=30)
+            tonapi.get_account_events(RECEIVER, limit=30, before_lt=100)
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_health_exposes_counters(self):
+        r = self.client.get("/api/v1/health")
+        self.assertIn("events_cache", r.json()["tonapi"])
+
+
+class HttpClientTests(TestCase):
+    def test_session_is_shared_and_pooled(self):
+        from api.services import http_client
+
+        s = http_client.session()
+        self.assertIs(http_client.session(), s)
+        adapter = s.get_adapter("https://tonapi.io/v2")
+        self.assertEqual(adapter._pool_maxsize, http_client.HTTP_POOL_MAXSIZE)
+        self.assertIn("gzip", s.headers["Accept-Encoding"])
+
+        # После fork воркер получает свой пул
+        with mock.patch.object(http_client.os, "getpid", return_value=-1):
+            self.assertIsNot(http_client.session(), s)
+
+    def test_per_host_timeouts(self):
+        from api.services import http_client
+
+        self.assertEqual(http_client.timeout_for("https://tonapi.io/v2/x"), http_client.HOST_TIMEOUTS["tonapi.io"])
+        self.assertEqual(http_client.timeout_for("https://example.org"), http_client.DEFAULT_TIMEOUT)
+
+    def test_toncenter_goes_through_shared_client(self):
+        from api.services import toncenter
+
+        resp = mock.Mock(status_code=200)
+        resp.json.return_value = {"jetton_wallets": [{"address": "EQjw"}]}
+        with mock.patch("api.services.http_client.get", return_value=resp) as get:
+            jw = toncenter.get_jetton_wallet_address(owner_address=SENDER, jetton_master_address="EQmaster")
+        self.assertEqual(jw, "EQjw")
+        self.assertIn("/jetton/wallets?", get.call_args.args[0])
+
+
+class AsyncTonApiTests(TestCase):
+    def setUp(self) -> None:
+        from api.services.tonapi import events_cache, tonapi_breaker
+
+        events_cache.clear()
+        tonapi_breaker.reset()
+
+    def _stub_client(self, calls: list, page: dict):
+        import asyncio
+        import httpx
+
+        async def handler(request):
+            calls.append(str(request.url))
+            await asyncio.sleep(0.1)
+            return httpx.Response(200, json=page)
+
+        return mock.patch(
+            "api.services.http_client._build_async_client",
+            side_effect=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+
+    async def test_concurrent_coroutines_share_one_request(self):
+        import asyncio
+        from api.services import tonapi_async
+
+        calls = []
+        with self._stub_client(calls, {"events": [{"event_id": "ev1"}]}):
+            results = await asyncio.gather(*(tonapi_async.get_account_events(RECEIVER, limit=30) for _ in range(50)))
+
+        self.assertEqual(len(calls), 1)
+        self.assertIn("limit=30", calls[0])
+        self.assertTrue(all(r is results[0] for r in results))
+
+    async def test_status_view_inline_verify_is_async(self):
+        import asyncio
+        from asgiref.sync import sync_to_async
+
+        from api import views
+
+        self.assertTrue(asyncio.iscoroutinefunction(views.payment_order_status))
+        order = await sync_to_async(_create_order)()
+        calls = []
+        page = {"events": [_ton_transfer_event(lt=100, comment=order.comment)]}
+        with self._stub_client(calls, page), \
+                mock.patch.multiple(views, PAYMENT_INLINE_VERIFY=True, PAYMENT_RECEIVER_TON=RECEIVER):
+            r = await self.async_client.get(f"/api/v1/payments/{order.public_id}/status")
+
+        self.assertEqual(r.json()["status"], "paid")
+        self.assertEqual(len(calls), 1)
+
+    async def test_create_order_is_csrf_exempt_and_post_only(self):
+        from django.test import AsyncClient
+
+        from api import views
+
+        with mock.patch.object(views, "PAYMENT_RECEIVER_TON", RECEIVER):
+            r = await AsyncClient(enforce_csrf_checks=True).post(
+                "/api/v1/payments/create",
+                data=json.dumps({"wallet_address": SENDER}),
+                content_type="application/json",
+            )
+        self.assertEqual(r.status_code, 201, r.content)
+        self.assertEqual(r.json()["receiver"], RECEIVER)
+
+        r = await self.async_client.get("/api/v1/payments/create")
+        self.assertEqual(r.status_code, 405)
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self) -> None:
+        from api.services.tonapi import events_cache, tonapi_breaker
+
+        events_cache.clear()
+        tonapi_breaker.reset()
+
+    def tearDown(self) -> None:
+        from api.services.tonapi import tonapi_breaker
+
+        tonapi_breaker.reset()
+
+    def test_open_half_open_closed(self):
+        from api.services.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+        b = CircuitBreaker("test", failure_threshold=2, base_cooldown=0.05, max_cooldown=0.05)
+        b.record_failure()
+        self.assertEqual(b.state, CLOSED)
+        b.record_failure()
+        self.assertEqual(b.state, OPEN)
+        self.assertFalse(b.allow())
+
+        time.sleep(0.06)
+        self.assertEqual(b.state, HALF_OPEN)
+        self.assertTrue(b.allow())
+        self.assertFalse(b.allow())  # только один пробный запрос
+        b.record_failure()
+        self.assertEqual(b.state, OPEN)
+
+        time.sleep(0.06)
+        self.assertTrue(b.allow())
+        b.record_success()
+        self.assertEqual(b.state, CLOSED)
+
+    def test_tonapi_fails_fast_when_open(self):
+        import requests
+        from api.services import tonapi
+
+        with mock.patch("api.services.http_client.get", side_effect=requests.Timeout("slow")) as get:
+            for _ in range(tonapi.tonapi_breaker.failure_threshold):
+                with self.assertRaises(tonapi.TonApiError):
+                    tonapi.get_account_events(RECEIVER, limit=30)
+            with self.assertRaisesRegex(tonapi.TonApiError, "circuit open"):
+                tonapi.get_account_events(RECEIVER, limit=30)
+        self.assertEqual(get.call_count, tonapi.tonapi_breaker.failure_threshold)
+
+        r = self.client.get("/api/v1/health")
+        self.assertEqual(r.json()["breakers"]["tonapi"]["state"], "open")
+
+    def test_client_errors_do_not_trip(self):
+        from api.services import tonapi
+
+        resp = mock.Mock(status_code=404, text="not found")
+        with mock.patch("api.services.http_client.get", return_value=resp):
+            for _ in range(tonapi.tonapi_breaker.failure_threshold + 1):
+                with self.assertRaises(tonapi.TonApiError):
+                    tonapi.get_account_events(RECEIVER, limit=30)
+        self.assertEqual(tonapi.tonapi_breaker.state, "closed")
+
+
+class PaymentOrderEventsTests(TestCase):
+    async def test_returns_immediately_when_paid(self):
+        from asgiref.sync import sync_to_async
+
+        order = await sync_to_async(_create_order)(status=PaymentOrderStatus.PAID)
+        r = await self.async_client.get(f"/api/v1/payments/{order.public_id}/events?wait=30")
+        self.assertEqual(r.json()["status"], "paid")
+
+    async def test_long_poll_wakes_up_on_payment(self):
+        import asyncio
+        from asgiref.sync import sync_to_async
+
+        order = await sync_to_async(_create_order)()
+
+        async def pay_later():
+            await asyncio.sleep(0.2)
+            await sync_to_async(order.mark_paid)(event_id="ev1")
+
+        with mock.patch("api.views.PAYMENT_EVENTS_POLL_INTERVAL", 0.05):
+            started = time.monotonic()
+            r, _ = await asyncio.gather(
+                self.async_client.get(f"/api/v1/payments/{order.public_id}/events?wait=5"),
+                pay_later(),
+            )
+        self.assertEqual(r.json()["status"], "paid")
+        self.assertLess(time.monotonic() - started, 2)
+
+    async def test_wait_timeout_returns_pending(self):
+        from asgiref.sync import sync_to_async
+
+        order = await sync_to_async(_create_order)()
+        with mock.patch("api.views.PAYMENT_EVENTS_POLL_INTERVAL", 0.05):
+            r = await self.async_client.get(f"/api/v1/payments/{order.public_id}/events?wait=0.2")
+        self.assertEqual(r.json()["status"], "pending")
+
+    async def test_inline_verify_only_on_entry(self):
+        from asgiref.sync import sync_to_async
+
+        order = await sync_to_async(_create_order)()
+        with mock.patch("api.views.PAYMENT_INLINE_VERIFY", True), \
+                mock.patch("api.views.PAYMENT_RECEIVER_TON", RECEIVER), \
+                mock.patch("api.views.PAYMENT_EVENTS_POLL_INTERVAL", 0.05), \
+                mock.patch("api.views.averify_payment", return_value=None) as verify:
+            r = await self.async_client.get(f"/api/v1/payments/{order.public_id}/events?wait=0.3")
+        self.assertEqual(r.json()["status"], "pending")
+        self.assertEqual(verify.await_count, 1)
+
+    async def test_sse_stream(self):
+        from asgiref.sync import sync_to_async
+
+        order = await sync_to_async(_create_order)(status=PaymentOrderStatus.PAID)
+        r = await self.async_client.get(
+            f"/api/v1/payments/{order.public_id}/events", headers={"Accept": "text/event-stream"},
+        )
+        self.assertEqual(r["Content-Type"], "text/event-stream")
+        body = b"".join([chunk async for chunk in r.streaming_content]).decode()
+        self.assertIn('event: status\ndata: {"ok": true, "status": "paid"', body)
+
+    async def test_unknown_order(self):
+        r = await self.async_client.get("/api/v1/payments/nope/events")
+        self.assertEqual(r.status_code, 404)
+
+
+class TonApiWebhookTests(TestCase):
+    SECRET = "whsec-test"
+
+    def setUp(self) -> None:
+        patcher = mock.patch.dict(os.environ, {"TONAPI_WEBHOOK_SECRET": self.SECRET, "PAYMENT_RECEIVER_TON": RECEIVER})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _post(self, payload: dict, secret: str = SECRET):
+        from api.services.webhooks import encode_signed
+
+        body, headers = encode_signed(payload, secret)
+        return self.client.post(
+            "/api/v1/webhooks/tonapi",
+            data=body,
+            content_type="application/json",
+            HTTP_X_TONAPI_SIGNATURE=headers["X-Tonapi-Signature"],
+        )
+
+    @override_settings(DEBUG=True)
+    def test_standin_notification_pays_order_once(self):
+        from api.services.webhooks import build_standin_notification
+
+        order = _create_order()
+        payload = build_standin_notification(order, receiver=RECEIVER)
+
+        r = self._post(payload)
+        self.assertEqual(r.status_code, 200, r.content)
+        self.assertEqual(r.json()["paid"], [order.public_id])
+        order.refresh_from_db()
+        self.assertEqual(order.status, PaymentOrderStatus.PAID)
+
+        again = self._post(payload)
+        self.assertTrue(again.json()["duplicate"])
+
+    def test_bad_signature_rejected(self):
+        r = self._post({"tx_hash": "abc"}, secret="wrong")
+        self.assertEqual(r.status_code, 403)
+
+    def test_fetches_event_when_not_embedded(self):
+        from api.services.webhooks import build_standin_notification
+
+        order = _create_order()
+        payload = build_standin_notification(order, receiver=RECEIVER)
+        event = payload.pop("event")
+        with mock.patch("api.services.webhooks.get_event", return_value=event) as get_event:
+            r = self._post(payload)
+        get_event.assert_called_once_with(payload["tx_hash"])
+        self.assertEqual(r.json()["paid"], [order.public_id])
+
+    def test_inline_event_ignored_without_debug(self):
+        from api.services.webhooks import build_standin_notification
+
+        order = _create_order()
+        payload = build_standin_notification(order, receiver=RECEIVER)
+        fetched = dict(payload["event"], actions=[])
+        with mock.patch("api.services.webhooks.get_event", return_value=fetched) as get_event:
+            r = self._post(payload)
+        get_event.assert_called_once_with(payload["tx_hash"])
+        self.assertEqual(r.json()["paid"], [])
+        order.refresh_from_db()
+        self.assertEqual(order.status, PaymentOrderStatus.PENDING)
+
+    def test_in_progress_event_not_recorded(self):
+        from api.services.webhooks import build_standin_notification
+
+        order = _create_order()
+        payload = build_standin_notification(order, receiver=RECEIVER)
+        event = dict(payload.pop("event"), in_progress=True)
+        with mock.patch("api.services.webhooks.get_event", return_value=event):
+            r = self._post(payload)
+        self.assertTrue(r.json()["in_progress"])
+        self.assertFalse(WebhookEvent.objects.filter(event_id=payload["tx_hash"]).exists())
+
+        event["in_progress"] = False
+        with mock.patch("api.services.webhooks.get_event", return_value=event):
+            r = self._post(payload)
+        self.assertEqual(r.json()["paid"], [order.public_id])
+
+    def test_unconfigured_receiver_not_recorded(self):
+        order = _create_order()
+        with mock.patch.dict(os.environ, {"PAYMENT_RECEIVER_TON": ""}):
+            r = self._post({"account_id": RECEIVER, "tx_hash": f"tx-{order.public_id}"})
+        self.assertEqual(r.status_code, 503)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+
+def _jetton_transfer_event(*, lt: int, comment: str, amount: int = 15_000_000, master: str = USDT_MASTER, **extra) -> dict:
+    ev = {
+        "event_id": f"jev{lt}",
+        "lt": lt,
+        "timestamp": int(time.time()),
+        "actions": [
+            {
+                "type": "JettonTransfer",
+                "status": "ok",
+                "JettonTransfer": {
+                    "sender": {"address": SENDER},
+                    "recipient": {"address": RECEIVER},
+                    "amount": str(amount),
+                    "comment": comment,
+                    "jetton": {"address": master},
+                },
+            }
+        ],
+    }
+    ev.update(extra)
+    return ev
+
+
+class UsdtAutoConfirmTests(TestCase):
+    def setUp(self) -> None:
+        self.user = UserProfile.objects.create(telegram_id=7)
+
+    def _run(self, events: list[dict]):
+        from api.services.usdt_payments import confirm_usdt_payments
+
+        with mock.patch("api.services.tonapi.get_account_events", return_value={"events": events}):
+            return confirm_usdt_payments(RECEIVER, master=USDT_MASTER)
+
+    def test_confirms_matching_participations_in_batch(self):
+        paid = Participation.objects.create(user=self.user)
+        short = Participation.objects.create(user=UserProfile.objects.create(telegram_id=8))
+        other_jetton = Participation.objects.create(user=UserProfile.objects.create(telegram_id=9))
+        unpaid = Participation.objects.create(user=UserProfile.objects.create(telegram_id=10))
+
+        result = self._run([
+            _jetton_transfer_event(lt=300, comment=f"Soulpull:{paid.id}"),
+            _jetton_transfer_event(lt=200, comment=f"Soulpull:{short.id}", amount=14_000_000),
+            _jetton_transfer_event(lt=100, comment=f"Soulpull:{other_jetton.id}", master=STANDARD_MASTER),
+        ])
+
+        self.assertEqual(result.open, 4)
+        self.assertEqual(result.confirmed, [paid.id])
+        paid.refresh_from_db()
+        self.assertEqual(paid.status, ParticipationStatus.CONFIRMED)
+        self.assertEqual(paid.tx_hash, "jev300")
+        for p in (short, other_jetton, unpaid):
+            p.refresh_from_db()
+            self.assertEqual(p.status, ParticipationStatus.NEW)
+
+    def test_in_progress_and_bounced_transfers_ignored(self):
+        participation = Participation.objects.create(user=self.user)
+        bounced = _jetton_transfer_event(lt=200, comment=f"Soulpull:{participation.id}")
+        bounced["actions"][0]["status"] = "failed"
+
+        result = self._run([
+            _jetton_transfer_event(lt=300, comment=f"Soulpull:{participation.id}", in_progress=True),
+            bounced,
+        ])
+        self.assertEqual(result.confirmed, [])
+
+    def test_reused_tx_hash_records_risk_event(self):
+        from api.models import RiskEvent, RiskEventKind
+
+        Participation.objects.create(
+            user=UserProfile.objects.create(telegram_id=11),
+            status=ParticipationStatus.CONFIRMED,
+            tx_hash="jev300",
+        )
+        participation = Participation.objects.create(user=self.user)
+
+        events = [_jetton_transfer_event(lt=300, comment=f"Soulpull:{participation.id}")]
+        result = self._run(events)
+
+        self.assertEqual(result.rejected, {participation.id: "dup_tx"})
+        participation.refresh_from_db()
+        self.assertEqual(participation.status, ParticipationStatus.NEW)
+        self.assertTrue(RiskEvent.objects.filter(user=self.user, kind=RiskEventKind.DUP_TX).exists())
+
+        # Событие уже за курсором — следующий проход не повторяет RiskEvent
+        again = self._run(events)
+        self.assertEqual((again.fetched, again.rejected, again.cursor_lt), (0, {}, 300))
+        self.assertEqual(RiskEvent.objects.filter(user=self.user, kind=RiskEventKind.DUP_TX).count(), 1)
+
+    def test_comment_must_name_exactly_one_participation(self):
+        first = Participation.objects.create(user=self.user)
+        second = Participation.objects.create(user=UserProfile.objects.create(telegram_id=12))
+
+        result = self._run([
+            _jetton_transfer_event(lt=300, comment=f"Soulpull:{first.id} Soulpull:{second.id}"),
+            _jetton_transfer_event(lt=200, comment=f"x Soulpull:{second.id}"),
+        ])
+        self.assertEqual(result.confirmed, [])
+        self.assertEqual(result.rejected, {})
+
+    def test_scan_stops_at_cursor(self):
+        from api.services.usdt_payments import confirm_usdt_payments
+
+        old = Participation.objects.create(user=self.user)
+        Participation.objects.filter(pk=old.pk).update(created_at=timezone.now() - timezone.timedelta(days=30))
+        self._run([_jetton_transfer_event(lt=300, comment="unrelated")])
+
+        calls = []
+
+        def fake_events(account_id, limit=25, before_lt=None):
+            calls.append(before_lt)
+            return {"events": [
+                _jetton_transfer_event(lt=400, comment=f"Soulpull:{old.id}"),
+                _jetton_transfer_event(lt=300, comment="unrelated"),
+            ], "next_from": 300}
+
+        with mock.patch("api.services.tonapi.get_account_events", side_effect=fake_events):
+            result = confirm_usdt_payments(RECEIVER, master=USDT_MASTER, limit=2)
+        self.assertEqual(calls, [None])
+        self.assertEqual(result.confirmed, [old.id])
+        self.assertEqual(result.cursor_lt, 400)
+
+
+class ReferralCounterTests(TestCase):
+    def setUp(self) -> None:
+        from django.core.cache import cache
+
+        cache.clear()
+        self.referrer = UserProfile.objects.create(telegram_id=100)
+        self.holder = Participation.objects.create(user=self.referrer, status=ParticipationStatus.CONFIRMED)
+
+    def _intent(self, tid: int):
+        UserProfile.objects.create(telegram_id=tid)
+        return self.client.post(
+            "/api/v1/intent",
+            data=json.dumps({"telegram_id": tid, "referrer_telegram_id": 100}),
+            content_type="application/json",
+        )
+
+    def _counters(self) -> tuple[int, int]:
+        self.holder.refresh_from_db()
+        return self.holder.used_slots, self.holder.confirmed_l1
+
+    def test_counters_follow_every_transition(self):
+        from api.admin import _set_status
+        from api.services.expiry import release_stale_participations
+        from api.services.participations import confirm_participation, reject_participation, rebuild_referral_counters
+
+        ids = [self._intent(tid).json()["participation"]["id"] for tid in (101, 102, 103)]
+        self.assertEqual(self._intent(104).status_code, 409)
+        self.assertEqual(self._counters(), (3, 0))
+
+        a, b, c = (Participation.objects.get(pk=pk) for pk in ids)
+        confirm_participation(a, tx_hash="tx-a")
+        self.assertEqual(self._counters(), (3, 1))
+        reject_participation(b)
+        self.assertEqual(self._counters(), (2, 1))
+        _create_order(participation=c).mark_paid(event_id="ev-c")
+        self.assertEqual(self._counters(), (2, 1))
+
+        Participation.objects.filter(user__telegram_id=104).delete()
+        stale = Participation.objects.get(pk=self._intent(105).json()["participation"]["id"])
+        Participation.objects.filter(pk=stale.pk).update(created_at=timezone.now() - timezone.timedelta(hours=2))
+        self.assertEqual(self._counters(), (3, 1))
+        release_stale_participations(ttl_minutes=60)
+        self.assertEqual(self._counters(), (2, 1))
+
+        _set_status(Participation.objects.filter(pk=a.pk), ParticipationStatus.REJECTED)
+        self.assertEqual(self._counters(), (1, 0))
+
+        r = self.client.get("/api/v1/me?telegram_id=100").json()
+        self.assertEqual((r["slots"]["used"], r["confirmed_l1"]), (1, 0))
+        self.assertEqual(rebuild_referral_counters(fix=False), [])
+
+    def test_paid_order_does_not_revive_expired_participation(self):
+        from api.services.expiry import release_stale_participations
+
+        stale = Participation.objects.get(pk=self._intent(101).json()["participation"]["id"])
+        order = _create_order(participation=stale, expires_at=timezone.now() - timezone.timedelta(minutes=30))
+        Participation.objects.filter(pk=stale.pk).update(created_at=timezone.now() - timezone.timedelta(hours=2))
+        release_stale_participations(ttl_minutes=60)
+        self.assertEqual(self._counters(), (0, 0))
+
+        order.mark_paid(event_id="ev-late")
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, ParticipationStatus.EXPIRED)
+        self.assertEqual(self._counters(), (0, 0))
+
+    def test_admin_status_change_respects_slots(self):
+        from api.admin import _set_status
+
+        ids = [self._intent(tid).json()["participation"]["id"] for tid in (101, 102, 103)]
+        Participation.objects.filter(pk=ids[0]).update(status=ParticipationStatus.EXPIRED)
+        Participation.objects.filter(pk=ids[1]).update(status=ParticipationStatus.REJECTED)
+        self.holder.used_slots = 1
+        self.holder.save(update_fields=["used_slots"])
+        self._intent(104)
+        self._intent(105)
+        self.assertEqual(self._counters(), (3, 0))
+
+        changed, skipped = _set_status(Participation.objects.filter(pk__in=ids[:2]), ParticipationStatus.CONFIRMED)
+        self.assertEqual(changed, 0)
+        self.assertEqual(set(skipped), set(ids[:2]))
+        self.assertEqual(self._counters(), (3, 0))
+
+        _set_status(Participation.objects.filter(user__telegram_id=105), ParticipationStatus.REJECTED)
+        changed, skipped = _set_status(Participation.objects.filter(pk=ids[0]), ParticipationStatus.CONFIRMED)
+        self.assertEqual((changed, skipped), (1, {}))
+        self.assertEqual(Participation.objects.get(pk=ids[0]).status, ParticipationStatus.CONFIRMED)
+        self.assertEqual(self._counters(), (3, 1))
+
+    def test_admin_reject_of_holder_zeroes_its_counters(self):
+        from api.admin import _set_status
+        from api.services.participations import confirm_participation, rebuild_referral_counters
+
+        confirm_participation(Participation.objects.get(pk=self._intent(101).json()["participation"]["id"]), tx_hash="tx-a")
+        self._intent(102)
+        self.assertEqual(self._counters(), (2, 1))
+
+        self.assertEqual(_set_status(Participation.objects.filter(pk=self.holder.pk), ParticipationStatus.REJECTED), (1, {}))
+        self.assertEqual(self._counters(), (0, 0))
+        self.assertEqual(rebuild_referral_counters(fix=False), [])
+
+    def test_rebuild_command_repairs_drift(self):
+        from django.core.management import CommandError, call_command
+
+        for tid, status in ((201, ParticipationStatus.CONFIRMED), (202, ParticipationStatus.NEW), (203, ParticipationStatus.REJECTED)):
+            Participation.objects.create(user=UserProfile.objects.create(telegram_id=tid), referrer=self.referrer, status=status)
+        orphan = Participation.objects.create(user=UserProfile.objects.create(telegram_id=204), used_slots=2)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_referral_counters", "--check", stdout=io.StringIO())
+        call_command("rebuild_referral_counters", stdout=io.StringIO())
+
+        self.assertEqual(self._counters(), (2, 1))
+        orphan.refresh_from_db()
+        self.assertEqual(orphan.used_slots, 0)
+        call_command("rebuild_referral_counters", "--check", stdout=io.StringIO())
+
+
+class MeQueryBudgetTests(TestCase):
+    def setUp(self) -> None:
+        from django.core.cache import cache
+
+        cache.clear()
+
+    def test_me_fits_in_two_queries(self):
+        from api.models import PayoutRequest
+
+        user = UserProfile.objects.create(telegram_id=300, username="root")
+        active = Participation.objects.create(
+            user=user, status=ParticipationStatus.CONFIRMED, used_slots=3, confirmed_l1=2,
+            confirmed_at=timezone.now(),
+        )
+        for tid, status in ((301, ParticipationStatus.CONFIRMED), (302, ParticipationStatus.CONFIRMED), (303, ParticipationStatus.NEW)):
+            Participation.objects.create(user=UserProfile.objects.create(telegram_id=tid), referrer=user, status=status)
+        PayoutRequest.objects.create(user=user)
+
+        with self.assertNumQueries(2) as ctx:
+            r = self.client.get("/api/v1/me?telegram_id=300")
+        # Активное участие — один JOIN и один подзапрос на его id, а не подзапрос на поле
+        self.assertEqual(ctx.captured_queries[0]["sql"].count('"participations"'), 2)
+
+        body = r.json()
+        self.assertEqual(body["participation"]["id"], active.id)
+        self.assertEqual(body["participation"]["created_at"], active.created_at.isoformat())
+        self.assertEqual([x["telegram_id"] for x in body["l1"]], [303, 302, 301])
+        self.assertEqual((body["slots"]["used"], body["confirmed_l1"]), (3, 2))
+        self.assertTrue(body["has_open_payout"])
+        self.assertFalse(body["eligible_payout"])
+
+    def test_me_without_participation_is_one_query(self):
+        UserProfile.objects.create(telegram_id=310)
+        with self.assertNumQueries(1):
+            r = self.client.get("/api/v1/me?telegram_id=310")
+        body = r.json()
+        self.assertIsNone(body["participation"])
+        self.assertEqual((body["l1"], body["slots"]["used"], body["has_open_payout"]), ([], 0, False))
+
+
+class MeCacheTests(TestCase):
+    def setUp(self) -> None:
+        from django.core.cache import cache
+
+        cache.clear()
+        self.user = UserProfile.objects.create(telegram_id=400)
+        self.active = Participation.objects.create(user=self.user, status=ParticipationStatus.CONFIRMED)
+
+    def _me(self, **headers):
+        return self.client.get("/api/v1/me?telegram_id=400", **headers)
+
+    def test_hit_is_one_query_and_etag_gives_304(self):
+        first = self._me()
+        etag = first["ETag"]
+
+        with mock.patch("api.views._me_payload", side_effect=AssertionError("rendered")), \
+                mock.patch("api.views._json_response", side_effect=AssertionError("serialized")):
+            with self.assertNumQueries(1):
+                again = self._me()
+            with self.assertNumQueries(1):
+                not_modified = self._me(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+
+    def test_writes_bump_version(self):
+        from api.models import PayoutRequest
+        from api.services.participations import confirm_participation
+
+        etag = self._me()["ETag"]
+
+        self.user.username = "renamed"
+        self.user.save(update_fields=["username", "updated_at"])
+        r = self._me(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()["user"]["username"], "renamed")
+        etag = r["ETag"]
+
+        for telegram_id in (401, 402, 403):
+            referral = Participation.objects.create(user=UserProfile.objects.create(telegram_id=telegram_id), referrer=self.user)
+            confirm_participation(referral, tx_hash=f"tx-{telegram_id}")
+            r = self._me(HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(r.status_code, 200)
+            etag = r["ETag"]
+        self.assertEqual(len(r.json()["l1"]), 3)
+
+        r = self.client.post("/api/v1/payout", data=json.dumps({"telegram_id": 400}), content_type="application/json")
+        self.assertEqual(r.status_code, 200)
+        r = self._me(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(PayoutRequest.objects.filter(user=self.user).exists())
+
+    def test_referral_rename_bumps_referrer_version(self):
+        Participation.objects.create(user=UserProfile.objects.create(telegram_id=401, username="old"), referrer=self.user)
+        etag = self._me()["ETag"]
+
+        r = self.client.post("/api/v1/register", data=json.dumps({"telegram_id": 401, "username": "new"}), content_type="application/json")
+        self.assertEqual(r.status_code, 200)
+        r = self._me(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([row["username"] for row in r.json()["l1"]], ["new"])
+
+
+class SystemFlagTests(TestCase):
+    def tearDown(self) -> None:
+        from api.services import system_flags
+
+        system_flags._known.clear()
+
+    def _intent(self, tid: int, referrer_tid=None):
+        UserProfile.objects.create(telegram_id=tid)
+        return self.client.post(
+            "/api/v1/intent",
+            data=json.dumps({"telegram_id": tid, "referrer_telegram_id": referrer_tid}),
+            content_type="application/json",
+        )
+
+    def test_seed_mode_ends_with_first_confirmation(self):
+        from api.models import SystemFlag
+        from api.services.participations import confirm_participation
+
+        r = self._intent(500)
+        self.assertEqual(r.status_code, 201)
+        self.assertFalse(SystemFlag.objects.exists())
+
+        confirm_participation(Participation.objects.get(id=r.json()["participation"]["id"]), tx_hash="tx-500")
+        self.assertTrue(SystemFlag.objects.filter(key="seeded").exists())
+
+        self.assertEqual(self._intent(501).json()["error"], "referrer_not_found")
+        self.assertEqual(self._intent(502, referrer_tid=500).status_code, 201)
+
+    def test_true_is_memoized_after_commit(self):
+        from api.services import system_flags
+
+        Participation.objects.create(user=UserProfile.objects.create(telegram_id=510), status=ParticipationStatus.CONFIRMED)
+        # Флаг поставлен мимо set_flag — его находит probe
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(system_flags.is_set(system_flags.SEEDED))
+        with self.assertNumQueries(0):
+            self.assertTrue(system_flags.is_set(system_flags.SEEDED))
+
+    def test_false_is_not_memoized(self):
+        from api.services import system_flags
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertFalse(system_flags.is_set(system_flags.SEEDED))
+        system_flags.set_flag(system_flags.SEEDED)
+        self.assertTrue(system_flags.is_set(system_flags.SEEDED))
+
+
+class ReferralTreeTests(TestCase):
+    def _join(self, tid: int, referrer_tid=None, confirm: bool = True) -> Participation:
+        from api.services.participations import confirm_participation
+
+        UserProfile.objects.create(telegram_id=tid)
+        r = self.client.post(
+            "/api/v1/intent",
+            data=json.dumps({"telegram_id": tid, "referrer_telegram_id": referrer_tid}),
+            content_type="application/json",
+        )
+        self.assertEqual(r.status_code, 201)
+        p = Participation.objects.get(id=r.json()["participation"]["id"])
+        if confirm:
+            confirm_participation(p, tx_hash=f"tx-{tid}")
+        return p
+
+    def _snapshot(self):
+        from api.models import ReferralClosure, ReferralNode
+
+        nodes = {
+            n.user.telegram_id: (n.parent.telegram_id if n.parent else None, n.depth, n.team_size, n.team_volume)
+            for n in ReferralNode.objects.select_related("user", "parent")
+        }
+        closure = set(ReferralClosure.objects.values_list("ancestor__telegram_id", "descendant__telegram_id", "depth"))
+        return nodes, closure
+
+    def setUp(self) -> None:
+        self._join(600)
+        self._join(601, 600)
+        self.deep = self._join(602, 601)
+        self._join(603, 600, confirm=False)
+
+    def test_aggregates_maintained_on_intent_and_confirm(self):
+        from api.services.referral_tree import rollup_referral_tree
+
+        # Переходы пишут только журнал, агрегаты догоняют его свёрткой
+        nodes, closure = self._snapshot()
+        self.assertEqual(nodes[600], (None, 0, 0, 0))
+        self.assertEqual(rollup_referral_tree(chunk_size=2), 3 + 3)
+        nodes, closure = self._snapshot()
+        self.assertEqual(nodes, {
+            600: (None, 0, 3, 2),
+            601: (600, 1, 1, 1),
+            602: (601, 2, 0, 0),
+            603: (600, 1, 0, 0),
+        })
+        self.assertIn((600, 602, 2), closure)
+        self.assertEqual(len(closure), 4 + 3 + 1)
+
+        from api.admin import _set_status
+
+        _set_status(Participation.objects.filter(id=self.deep.id), ParticipationStatus.REJECTED)
+        rollup_referral_tree()
+        nodes, _ = self._snapshot()
+        self.assertEqual((nodes[600][3], nodes[601][3]), (1, 0))
+
+    def test_rebuild_matches_incremental(self):
+        from api.models import ReferralClosure, ReferralNode, ReferralTreeDelta
+        from api.services.referral_tree import rollup_referral_tree
+
+        rollup_referral_tree()
+        expected = self._snapshot()
+        ReferralNode.objects.filter(user__telegram_id=600).update(team_size=0, team_volume=0)
+        ReferralClosure.objects.filter(depth=2).delete()
+
+        out = io.StringIO()
+        from django.core.management import call_command
+
+        call_command("rebuild_referral_tree", "--chunk-size", "2", stdout=out)
+        self.assertIn("nodes=4", out.getvalue())
+        self.assertEqual(self._snapshot(), expected)
+        self.assertFalse(ReferralTreeDelta.objects.exists())
+
+    def test_migration_backfills_existing_participations(self):
+        import importlib
+
+        from django.apps import apps
+
+        from api.models import ReferralClosure, ReferralNode
+        from api.services.referral_tree import rollup_referral_tree
+
+        rollup_referral_tree()
+        expected = self._snapshot()
+        ReferralClosure.objects.all().delete()
+        ReferralNode.objects.all().delete()
+
+        migration = importlib.import_module("api.migrations.0016_add_referral_tree_journal")
+        migration.backfill_referral_tree(apps, None)
+        self.assertEqual(self._snapshot(), expected)
+
+    def test_tree_endpoint_reads_levels(self):
+        from api.services.referral_tree import rollup_referral_tree
+
+        rollup_referral_tree()
+        with self.assertNumQueries(2):
+            r = self.client.get("/api/v1/tree?telegram_id=600&depth=2")
+        self.assertEqual(r.status_code, 200)
+        data = r.json()
+        self.assertEqual(data["root"]["team_size"], 3)
+        self.assertEqual(
+            [(n["telegram_id"], n["parent_telegram_id"], n["depth"]) for n in data["nodes"]],
+            [(601, 600, 1), (603, 600, 1), (602, 601, 2)],
+        )
+        self.assertFalse(data["truncated"])
+
+        self.assertEqual(len(self.client.get("/api/v1/tree?telegram_id=600").json()["nodes"]), 2)
+        self.assertEqual(self.client.get("/api/v1/tree?telegram_id=600&depth=0").status_code, 400)
+        self.assertEqual(self.client.get("/api/v1/tree?telegram_id=999").status_code, 404)
+
+    def test_tree_endpoint_tolerates_missing_parent(self):
+        from api.models import ReferralNode
+
+        # parent — SET_NULL: профиль реферера удалён
+        ReferralNode.objects.filter(user__telegram_id=602).update(parent=None)
+        r = self.client.get("/api/v1/tree?telegram_id=601")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([(n["telegram_id"], n["parent_telegram_id"]) for n in r.json()["nodes"]], [(602, None)])
+
+
+class SlotReservationTests(TestCase):
+    def test_reservation_is_a_conditional_increment(self):
+        from django.db import IntegrityError, transaction
+
+        from api.services.participations import reserve_referral_slot
+
+        holder = Participation.objects.create(
+            user=UserProfile.objects.create(telegram_id=700), status=ParticipationStatus.CONFIRMED
+        )
+        with self.assertNumQueries(1):
+            self.assertTrue(reserve_referral_slot(holder.id))
+        self.assertTrue(reserve_referral_slot(holder.id))
+        self.assertTrue(reserve_referral_slot(holder.id))
+        self.assertFalse(reserve_referral_slot(holder.id))
+        holder.refresh_from_db()
+        self.assertEqual(holder.used_slots, 3)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Participation.objects.filter(id=holder.id).update(used_slots=4)
+
+
+class SlotReservationConcurrencyTests(TransactionTestCase):
+    # Полный стресс через /intent — benchmarks/bench_slot_reservation.py
+    PARALLEL = 16
+
+    def test_parallel_reservations_claim_exactly_three_slots(self):
+        from api.services.participations import reserve_referral_slot
+        from api.views import _retry_on_lock
+
+        holder = Participation.objects.create(
+            user=UserProfile.objects.create(telegram_id=700), status=ParticipationStatus.CONFIRMED
+        )
+        barrier = threading.Barrier(self.PARALLEL)
+        claimed = []
+
+        def worker() -> None:
+            try:
+                barrier.wait()
+                claimed.append(_retry_on_lock(lambda: reserve_referral_slot(holder.id)))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.PARALLEL)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(sorted(claimed), [False] * (self.PARALLEL - 3) + [True] * 3)
+        holder.refresh_from_db()
+        self.assertEqual(holder.used_slots, 3)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self) -> None:
+        from django.core.cache import cache
+
+        from api.models import AuthorCode
+        from api.services.participations import confirm_participation
+
+        cache.clear()
+        # 800: 3 реферала, 801: 1, 802: 1 (делят ранг 2), 803 — без рефералов
+        self.top = {}
+        for tid in (800, 801, 802, 803):
+            self.top[tid] = UserProfile.objects.create(telegram_id=tid)
+            Participation.objects.create(user=self.top[tid], status=ParticipationStatus.CONFIRMED)
+        AuthorCode.objects.create(owner=self.top[803], code="AUTHOR")
+        tid = 810
+        for referrer_tid, n in ((800, 3), (801, 1), (802, 1)):
+            for _ in range(n):
+                UserProfile.objects.create(telegram_id=tid)
+                r = self.client.post(
+                    "/api/v1/intent",
+                    data=json.dumps({"telegram_id": tid, "referrer_telegram_id": referrer_tid, "author_code": "AUTHOR"}),
+                    content_type="application/json",
+                )
+                confirm_participation(Participation.objects.get(id=r.json()["participation"]["id"]), tx_hash=f"tx-{tid}")
+                tid += 1
+
+        from api.services.leaderboard import rollup_leaderboard
+        from api.services.points import rollup_points
+
+        rollup_points()
+        rollup_leaderboard()
+
+    def _page(self, **params):
+        return self.client.get("/api/v1/leaderboard?" + urlencode(params)).json()
+
+    def test_l1_board_and_pagination(self):
+        with self.assertNumQueries(3):
+            data = self._page(board="l1")
+        self.assertEqual(data["total"], 3)
+        self.assertEqual(
+            [(i["rank"], i["telegram_id"], i["score"]) for i in data["items"]],
+            [(1, 800, 3), (2, 801, 1), (2, 802, 1)],
+        )
+
+        first = self._page(board="l1", page=1, page_size=2)
+        second = self._page(board="l1", page=2, page_size=2)
+        self.assertTrue(first["has_next"])
+        self.assertFalse(second["has_next"])
+        self.assertEqual([(i["rank"], i["telegram_id"]) for i in second["items"]], [(2, 802)])
+
+        self.assertEqual(self.client.get("/api/v1/leaderboard?board=nope").status_code, 400)
+
+    def test_points_board_follows_awards(self):
+        data = self._page(board="points")
+        # владелец кода: 10 за каждого из 5 рефералов
+        self.assertEqual((data["items"][0]["telegram_id"], data["items"][0]["score"]), (803, 50))
+        self.assertEqual(data["total"], 6)
+        self.assertEqual({i["rank"] for i in data["items"][1:]}, {2})
+
+    def test_me_rank_without_extra_queries(self):
+        with self.assertNumQueries(2):
+            r = self.client.get("/api/v1/me?telegram_id=801")
+        self.assertEqual(r.json()["rank"]["l1"], {"rank": 2, "score": 1})
+        self.assertEqual(r.json()["rank"]["points"], {"rank": 7, "score": 0})
+        etag = r["ETag"]
+
+        # 802 обгоняет 801: ранг 801 меняется без записи в его профиль
+        from api.services.participations import confirm_participation
+
+        UserProfile.objects.create(telegram_id=900)
+        r = self.client.post(
+            "/api/v1/intent",
+            data=json.dumps({"telegram_id": 900, "referrer_telegram_id": 802}),
+            content_type="application/json",
+        )
+        confirm_participation(Participation.objects.get(id=r.json()["participation"]["id"]), tx_hash="tx-900")
+        from api.services.leaderboard import rollup_leaderboard
+
+        rollup_leaderboard()
+        r = self.client.get("/api/v1/me?telegram_id=801", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()["rank"]["l1"], {"rank": 3, "score": 1})
+
+    def test_rebuild_matches_incremental(self):
+        from django.core.management import call_command
+
+        from api.models import LeaderboardBucket, LeaderboardEntry
+
+        def snapshot():
+            return (
+                set(LeaderboardEntry.objects.values_list("user_id", "confirmed_l1", "points")),
+                set(LeaderboardBucket.objects.filter(users__gt=0).values_list("board", "score", "users")),
+            )
+
+        expected = snapshot()
+        LeaderboardEntry.objects.update(confirmed_l1=0)
+        out = io.StringIO()
+        call_command("rebuild_leaderboard", stdout=out)
+        self.assertIn("entries=9", out.getvalue())
+        self.assertEqual(snapshot(), expected)
+
+    def test_confirm_writes_journal_not_buckets(self):
+        from api.models import LeaderboardBucket, LeaderboardBucketDelta
+        from api.services.leaderboard import rollup_leaderboard
+        from api.services.participations import confirm_participation
+
+        buckets = set(LeaderboardBucket.objects.values_list("board", "score", "users"))
+        UserProfile.objects.create(telegram_id=900)
+        r = self.client.post(
+            "/api/v1/intent",
+            data=json.dumps({"telegram_id": 900, "referrer_telegram_id": 801}),
+            content_type="application/json",
+        )
+        participation = Participation.objects.get(id=r.json()["participation"]["id"])
+        confirm_participation(participation, tx_hash="tx-900")
+        self.assertEqual(set(LeaderboardBucket.objects.values_list("board", "score", "users")), buckets)
+        self.assertEqual(LeaderboardBucketDelta.objects.count(), 2)
+        # Корзины score=2 ещё нет — ранг по корзинам выше, без скачка вниз
+        self.assertEqual(
+            [(i["rank"], i["telegram_id"], i["score"]) for i in self._page(board="l1")["items"]],
+            [(1, 800, 3), (2, 801, 2), (2, 802, 1)],
+        )
+
+        self.assertEqual(rollup_leaderboard(), 2)
+        self.assertFalse(LeaderboardBucketDelta.objects.exists())
+        self.assertEqual(
+            [(i["rank"], i["telegram_id"], i["score"]) for i in self._page(board="l1")["items"]],
+            [(1, 800, 3), (2, 801, 2), (3, 802, 1)],
+        )
+
+    def test_deep_page_ranks(self):
+        data = self._page(board="points", page=2, page_size=3)
+        self.assertEqual([i["rank"] for i in data["items"]], [2, 2, 2])
+        self.assertEqual(data["total"], 6)
+
+
+class PointsLedgerTests(TestCase):
+    def setUp(self) -> None:
+        from api.models import AuthorCode
+
+        self.owner = UserProfile.objects.create(telegram_id=950)
+        Participation.objects.create(user=self.owner, status=ParticipationStatus.CONFIRMED)
+        AuthorCode.objects.create(owner=self.owner, code="HOT")
+
+    def _intent(self, tid: int):
+        UserProfile.objects.create(telegram_id=tid)
+        return self.client.post(
+            "/api/v1/intent",
+            data=json.dumps({"telegram_id": tid, "referrer_telegram_id": 950, "author_code": "HOT"}),
+            content_type="application/json",
+        )
+
+    def _points(self, tid: int) -> int:
+        return UserProfile.objects.get(telegram_id=tid).points
+
+    def test_awards_are_ledger_entries_until_rollup(self):
+        from api.models import PointsLedgerEntry
+        from api.services.points import rollup_points
+
+        for tid in (951, 952, 953):
+            self.assertEqual(self._intent(tid).status_code, 201)
+        self.assertEqual(PointsLedgerEntry.objects.filter(user=self.owner).count(), 3)
+        # Строка владельца в intent не пишется
+        self.assertEqual(self._points(950), 0)
+
+        result = rollup_points()
+        self.assertEqual((result.entries, result.users), (6, 4))
+        self.assertEqual([self._points(t) for t in (950, 951, 952, 953)], [30, 10, 10, 10])
+        self.assertFalse(PointsLedgerEntry.objects.filter(rolled_up_at__isnull=True).exists())
+        self.assertEqual(rollup_points().entries, 0)
+        self.assertEqual(UserProfile.objects.get(telegram_id=950).leaderboard.points, 30)
+
+    def test_rollup_picks_up_entries_behind_newer_ids(self):
+        from api.models import PointsLedgerEntry, PointsReason
+        from api.services.points import award, rollup_points
+
+        self._intent(951)
+        self._intent(952)
+        # Запись с меньшим id, закоммиченная после свёртки более новых
+        late = award(self.owner.id, 7, PointsReason.ADJUSTMENT)
+        PointsLedgerEntry.objects.filter(id=late.id).update(rolled_up_at=None)
+        PointsLedgerEntry.objects.exclude(id=late.id).update(rolled_up_at=timezone.now())
+        self.assertEqual(rollup_points().entries, 1)
+        self.assertEqual(self._points(950), 7)
+
+        PointsLedgerEntry.objects.update(rolled_up_at=None)
+        UserProfile.objects.update(points=0)
+        result = rollup_points(chunk_size=3)
+        self.assertEqual(result.entries, 5)
+        self.assertEqual(self._points(950), 27)
+
+    def test_admin_form_has_no_points_field(self):
+        from django.contrib import admin as django_admin
+        from django.test import RequestFactory
+
+        form = django_admin.site._registry[UserProfile].get_form(RequestFactory().get("/"))
+        self.assertNotIn("points", form.base_fields)
+
+    def test_admin_save_keeps_rolled_up_points(self):
+        from django.contrib import admin as django_admin
+        from api.services.points import rollup_points
+
+        stale = UserProfile.objects.get(telegram_id=950)  # форма открыта до свёртки
+        self._intent(951)
+        rollup_points()
+
+        stale.username = "edited"
+        django_admin.site._registry[UserProfile].save_model(None, stale, None, True)
+        self.assertEqual(UserProfile.objects.get(telegram_id=950).username, "edited")
+        self.assertEqual(self._points(950), 10)
+
+    def test_award_is_unique_per_participation(self):
+        from django.db import IntegrityError, transaction
+
+        from api.services.points import award_author_code
+
+        self._intent(951)
+        participation = Participation.objects.get(user__telegram_id=951)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            award_author_code(participation, self.owner.id)
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        from django.core.management import CommandError, call_command
+
+        from api.models import PointsReason
+        from api.services.points import award, rollup_points
+
+        self._intent(951)
+        award(self.owner.id, -5, PointsReason.ADJUSTMENT)
+        rollup_points()
+        self.assertEqual(self._points(950), 5)
+
+        UserProfile.objects.filter(id=self.owner.id).update(points=999)
+        with self.assertRaises(CommandError):
+            call_command("reconcile_points", "--check", stdout=io.StringIO())
+        self.assertEqual(self._points(950), 999)
+
+        out = io.StringIO()
+        call_command("reconcile_points", stdout=out)
+        self.assertIn("999→5", out.getvalue())
+        self.assertEqual(self._points(950), 5)
+        self.assertEqual(UserProfile.objects.get(id=self.owner.id).leaderboard.points, 5)
@@ -19,6 +19,8 @@ urlpatterns = [
     
     # Profile
     path("me", views.me, name="me"),
+    path("tree", views.tree, name="tree"),
+    path("leaderboard", views.leaderboard_view, name="leaderboard"),
     
     # Payout
     path("payout", views.payout, name="payout"),
@@ -32,8 +34,12 @@ urlpatterns = [
     # Payment Orders (TonConnect + TonAPI verification)
     path("payments/create", views.payment_create_order, name="payment_create_order"),
     path("payments/<str:order_id>/status", views.payment_order_status, name="payment_order_status"),
+    path("payments/<str:order_id>/events", views.payment_order_events, name="payment_order_events"),
     path("payments/confirm", views.payment_manual_confirm, name="payment_manual_confirm"),
     
+    # Webhooks
+    path("webhooks/tonapi", views.tonapi_webhook, name="tonapi_webhook"),
+    
     # TON Proof
     path("tonproof/payload", views.tonproof_payload, name="tonproof_payload"),
     path("tonproof/verify", views.tonproof_verify, name="tonproof_verify"),
@@ -13,19 +13,31 @@ Endpoints:
 - GET /api/v1/health — healthcheck
 """
 
+import asyncio
 import base64
+import functools
 import hashlib
 import json
 import logging
 import os
 import secrets
 import struct
+import time
 from datetime import datetime, timezone as dt_timezone
 from typing import Optional
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.db import transaction
-from django.http import JsonResponse
+from django.db import OperationalError, transaction
+from django.db.models import Exists, F, FilteredRelation, OuterRef, Q, Subquery
+from django.http import (
+    HttpResponse,
+    HttpResponseNotAllowed,
+    HttpResponseNotModified,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.utils.http import parse_etags
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
@@ -34,6 +46,7 @@ from nacl.exceptions import BadSignatureError
 from nacl.signing import VerifyKey
 
 from .models import (
+    REFERRAL_SLOT_LIMIT,
     AuthorCode,
     IdempotencyKey,
     Participation,
@@ -47,8 +60,30 @@ from .models import (
     TonProofPayload,
     UserProfile,
 )
-from .services.toncenter import ToncenterError, get_jetton_wallet_address
-from .services.tonapi import verify_payment, TonApiError
+from .services.auth import find_user_by_wallet
+from .services import leaderboard, me_cache, points, referral_tree, system_flags
+from .services.breaker import breakers_snapshot
+from .services.participations import (
+    ParticipationError,
+    confirm_participation,
+    reject_participation,
+    reserve_referral_slot,
+)
+from .services.payment_ingest import LATE_PAYMENT_GRACE_SECONDS, receiver_address as payment_receiver_address
+from .services.ton_address import TonAddressError, canonical_raw
+from .services.jetton_transfer import get_template as get_jetton_transfer_template
+from .services.jetton_wallets import resolve_jetton_wallet, warm_jetton_wallet
+from .services.toncenter import ToncenterError
+from .services.tonapi import events_cache, TonApiError
+from .services.tonapi_async import verify_payment as averify_payment
+from .services.usdt_payments import PAYMENT_USDT_AMOUNT
+from .services.webhooks import (
+    SIGNATURE_HEADER as WEBHOOK_SIGNATURE_HEADER,
+    WebhookError,
+    handle_account_tx,
+    verify_signature,
+    webhook_secret,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -98,8 +133,16 @@ def _get_user_by_telegram_id(telegram_id: int) -> Optional[UserProfile]:
 
 
 def _get_user_by_wallet(wallet: str) -> Optional[UserProfile]:
-    """Get user by wallet address."""
-    return UserProfile.objects.filter(wallet=wallet).first()
+    """Get user by wallet address (any form: raw, EQ…, UQ…)."""
+    return find_user_by_wallet(wallet)
+
+
+def _wallet_owner_qs(wallet: str):
+    """Users already holding this wallet, matched on canonical raw form when parseable."""
+    raw = canonical_raw(wallet)
+    if raw:
+        return UserProfile.objects.filter(wallet_raw=raw)
+    return UserProfile.objects.filter(wallet=wallet)
 
 
 # ============================================================================
@@ -120,28 +163,49 @@ def _active_participation(user: UserProfile) -> Optional[Participation]:
     )
 
 
-def _referrer_used_slots(referrer: UserProfile) -> int:
+def _referrer_used_slots(active: Optional[Participation]) -> int:
     """
-    Count occupied slots for referrer (NEW, PENDING, CONFIRMED participations).
+    Occupied slots (NEW, PENDING, CONFIRMED referrals) — counter on referrer's
+    CONFIRMED participation.
     """
-    return Participation.objects.filter(
-        referrer=referrer,
-        status__in=[ParticipationStatus.NEW, ParticipationStatus.PENDING, ParticipationStatus.CONFIRMED],
-    ).count()
+    if not active or active.status != ParticipationStatus.CONFIRMED:
+        return 0
+    return active.used_slots
 
 
-def _confirmed_l1_count(referrer: UserProfile) -> int:
+def _confirmed_l1_count(active: Optional[Participation]) -> int:
     """
-    Count CONFIRMED L1 referrals created after referrer's active participation.
+    CONFIRMED L1 referrals created after referrer's active participation —
+    counter on that participation.
     """
-    active = _active_participation(referrer)
     if not active or active.status != ParticipationStatus.CONFIRMED:
         return 0
-    return Participation.objects.filter(
-        referrer=referrer,
-        status=ParticipationStatus.CONFIRMED,
-        created_at__gt=active.created_at,
-    ).values("user_id").distinct().count()
+    return active.confirmed_l1
+
+
+# Lock conflicts worth retrying: SQLite busy / shared-cache lock, Postgres deadlock / serialization
+_LOCK_ERRORS = ("locked", "deadlock", "could not serialize")
+INTENT_LOCK_RETRIES = 12
+INTENT_RETRY_MAX_DELAY = 0.25
+
+
+def _retry_on_lock(fn, attempts: int = INTENT_LOCK_RETRIES):
+    """
+    Run fn (a whole transaction) again on a write-lock conflict. The failed
+    attempt is rolled back entirely, so a retry starts clean.
+
+    SQLite fails a deferred transaction that read before writing with
+    "database is locked" at once (busy timeout does not apply), so
+    contenders back off with full jitter instead of retrying in lockstep.
+    """
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except OperationalError as e:
+            if attempt == attempts - 1 or not any(s in str(e).lower() for s in _LOCK_ERRORS):
+                raise
+            cap = min(INTENT_RETRY_MAX_DELAY, 0.005 * 2 ** attempt)
+            time.sleep(cap * secrets.randbelow(1001) / 1000)
 
 
 def _create_intent(
@@ -153,6 +217,11 @@ def _create_intent(
     Create participation intent with slot reservation.
     Returns (participation, used_slots).
     Raises ValueError or RuntimeError on failure.
+
+    Validation reads run before the transaction. The transaction opens with
+    the slot reservation (a write), so SQLite waits for the write lock
+    instead of failing a read-then-write upgrade; the active cycle is
+    re-checked under that lock.
     """
     # Check active cycle — if exists with status NEW, return it (idempotent)
     existing = _active_participation(user)
@@ -168,13 +237,11 @@ def _create_intent(
     # Find referrer
     referrer = None
     if referrer_telegram_id is not None:
-        referrer = UserProfile.objects.select_for_update().filter(telegram_id=referrer_telegram_id).first()
+        referrer = UserProfile.objects.filter(telegram_id=referrer_telegram_id).first()
     
     # SEED USER LOGIC: Если нет ни одного CONFIRMED участника — разрешить без реферера
-    has_any_confirmed = Participation.objects.filter(status=ParticipationStatus.CONFIRMED).exists()
-    
     if not referrer:
-        if has_any_confirmed:
+        if system_flags.is_set(system_flags.SEEDED):
             # Уже есть пользователи — реферер обязателен
             raise ValueError("referrer_not_found")
         else:
@@ -190,32 +257,42 @@ def _create_intent(
         raise ValueError("self_referral")
 
     # Проверки только если есть реферер (не seed user)
-    used_slots = 0
+    referrer_active = None
     if referrer:
         # Check referrer has CONFIRMED participation
-        if not Participation.objects.filter(user=referrer, status=ParticipationStatus.CONFIRMED).exists():
+        referrer_active = Participation.objects.filter(user=referrer, status=ParticipationStatus.CONFIRMED).first()
+        if not referrer_active:
             raise ValueError("referrer_not_confirmed")
 
-        # Check 3/3 slots
-        used_slots = _referrer_used_slots(referrer)
-        if used_slots >= 3:
-            RiskEvent.objects.create(
-                user=user,
-                kind=RiskEventKind.REF_LIMIT,
-                meta={"referrer_tid": referrer_telegram_id, "slots": used_slots},
-            )
-            raise RuntimeError("referrer_limit")
+    with transaction.atomic():
+        # Claim one of 3/3 slots: conditional increment, no lock on the referrer
+        if referrer_active and not reserve_referral_slot(referrer_active.id):
+            participation = None
+        else:
+            participation = _create_participation(user, referrer, author_code)
+
+    if participation is None:
+        RiskEvent.objects.create(
+            user=user,
+            kind=RiskEventKind.REF_LIMIT,
+            meta={"referrer_tid": referrer_telegram_id, "slots": REFERRAL_SLOT_LIMIT},
+        )
+        raise RuntimeError("referrer_limit")
+
+    used_slots = 0
+    if referrer_active:
+        referrer_active.refresh_from_db(fields=["used_slots"])
+        used_slots = referrer_active.used_slots
+    return participation, used_slots
+
+
+def _create_participation(user: UserProfile, referrer: Optional[UserProfile], author_code: Optional[str]) -> Participation:
+    """Writes of _create_intent; runs in its transaction after the slot is claimed."""
+    # Concurrent intent of the same user got in first
+    if _active_participation(user):
+        raise ValueError("active_cycle")
 
-    # Handle author code
     code = (author_code or "").strip() or None
-    if code:
-        ac = AuthorCode.objects.filter(code=code).select_related("owner").first()
-        if ac:
-            # Award points
-            user.points = (user.points or 0) + 10
-            user.save(update_fields=["points", "updated_at"])
-            ac.owner.points = (ac.owner.points or 0) + 10
-            ac.owner.save(update_fields=["points", "updated_at"])
 
     # Create participation
     participation = Participation.objects.create(
@@ -225,7 +302,15 @@ def _create_intent(
         status=ParticipationStatus.NEW,
     )
 
-    return participation, used_slots + 1 if referrer else 0
+    # Author code points: ledger entries only, rollup_points applies them to user rows
+    if code:
+        owner_id = AuthorCode.objects.filter(code=code).values_list("owner_id", flat=True).first()
+        if owner_id:
+            points.award_author_code(participation, owner_id)
+    # used_slots already counted by reserve_referral_slot; None → NEW leaves confirmed_l1 as is
+    UserProfile.bump_me_version(user.id, participation.referrer_id)
+    referral_tree.attach(user.id, participation.referrer_id)
+    return participation
 
 
 # ============================================================================
@@ -299,6 +384,10 @@ def health(request):
         "debug": bool(settings.DEBUG),
         "receiver_wallet": receiver[:8] + "..." + receiver[-6:] if len(receiver) > 14 else receiver,
         "payment_amount": "15 USDT",
+        "tonapi": {
+            "events_cache": events_cache.stats(),
+        },
+        "breakers": breakers_snapshot(),
     })
 
 
@@ -324,10 +413,17 @@ def register(request):
 
     username = (body.get("username") or "").strip() or None
 
-    user, created = UserProfile.objects.update_or_create(
-        telegram_id=telegram_id,
-        defaults={"username": username},
-    )
+    with transaction.atomic():
+        previous = UserProfile.objects.filter(telegram_id=telegram_id).values_list("username", flat=True).first()
+        user, created = UserProfile.objects.update_or_create(
+            telegram_id=telegram_id,
+            defaults={"username": username},
+        )
+        if not created and previous != username:
+            # Username виден в списке L1 у реферера — его /me тоже устарел
+            UserProfile.bump_me_version(
+                *Participation.objects.filter(user=user).values_list("referrer_id", flat=True)
+            )
 
     return _json_response({
         "ok": True,
@@ -374,7 +470,7 @@ def wallet(request):
         return _error_response("not_found", "User not found", 404)
 
     # Check wallet not already used by another user
-    existing = UserProfile.objects.filter(wallet=wallet_addr).exclude(id=user.id).first()
+    existing = _wallet_owner_qs(wallet_addr).exclude(id=user.id).first()
     if existing:
         RiskEvent.objects.create(
             user=user,
@@ -385,6 +481,7 @@ def wallet(request):
 
     user.wallet = wallet_addr
     user.save(update_fields=["wallet", "updated_at"])
+    warm_jetton_wallet(wallet_addr)
 
     return _json_response({"ok": True})
 
@@ -432,8 +529,7 @@ def intent(request):
         return _error_response("not_found", "User not found. Call /register first.", 404)
 
     try:
-        with transaction.atomic():
-            participation, used_slots = _create_intent(user, referrer_telegram_id, author_code)
+        participation, used_slots = _retry_on_lock(lambda: _create_intent(user, referrer_telegram_id, author_code))
     except RuntimeError as e:
         if str(e) == "referrer_limit":
             return _error_response("referrer_limit", "Referrer has no free slots (3/3)", 409)
@@ -456,7 +552,7 @@ def intent(request):
         },
         "slots": {
             "used": used_slots,
-            "limit": 3,
+            "limit": REFERRAL_SLOT_LIMIT,
         },
     }
 
@@ -495,36 +591,54 @@ def confirm(request):
     except (Participation.DoesNotExist, ValueError):
         return _error_response("not_found", "Participation not found", 404)
 
-    if participation.status not in [ParticipationStatus.NEW, ParticipationStatus.PENDING]:
-        return _error_response("invalid_status", f"Participation already {participation.status}")
+    try:
+        if decision == "reject":
+            reject_participation(participation, tx_hash=tx_hash)
+            return _json_response({"ok": True, "status": "REJECTED"})
+        confirm_participation(participation, tx_hash=tx_hash)
+    except ParticipationError as e:
+        return _error_response(e.code, str(e), 400)
 
-    if decision == "reject":
-        participation.status = ParticipationStatus.REJECTED
-        if tx_hash:
-            participation.tx_hash = tx_hash
-        participation.confirmed_at = timezone.now()
-        participation.save(update_fields=["status", "tx_hash", "confirmed_at"])
-        return _json_response({"ok": True, "status": "REJECTED"})
-
-    # Check for duplicate tx_hash
-    if tx_hash:
-        dup = Participation.objects.filter(tx_hash=tx_hash).exclude(id=participation.id).exists()
-        if dup:
-            RiskEvent.objects.create(
-                user=participation.user,
-                kind=RiskEventKind.DUP_TX,
-                meta={"tx_hash": tx_hash, "participation_id": participation.id}
-            )
-            return _error_response("dup_tx", "Transaction hash already used", 400)
+    return _json_response({"ok": True, "status": "CONFIRMED"})
 
-    # TODO: Call verify_usdt_tx(tx_hash) here for real verification
 
-    participation.status = ParticipationStatus.CONFIRMED
-    participation.tx_hash = tx_hash or None
-    participation.confirmed_at = timezone.now()
-    participation.save(update_fields=["status", "tx_hash", "confirmed_at"])
+_ME_ACTIVE_FIELDS = ("id", "status", "created_at", "confirmed_at", "used_slots", "confirmed_l1")
 
-    return _json_response({"ok": True, "status": "CONFIRMED"})
+
+def _me_user(telegram_id: int) -> Optional[UserProfile]:
+    """
+    User + active participation + open payout flag + leaderboard ranks in one query.
+
+    The active participation is joined once (FilteredRelation on the id of the
+    latest active row) and its fields are read from that join (me_active_*);
+    the participation itself is rebuilt in _me_active without touching the DB.
+    Ranks (me_rank_*) are summed from leaderboard buckets above the user's score.
+    """
+    active_id = (
+        Participation.objects.filter(
+            user=OuterRef("pk"),
+            status__in=[ParticipationStatus.NEW, ParticipationStatus.PENDING, ParticipationStatus.CONFIRMED],
+        )
+        .order_by("-created_at")
+        .values("id")[:1]
+    )
+    return (
+        UserProfile.objects.filter(telegram_id=telegram_id)
+        .annotate(me_active=FilteredRelation("participations", condition=Q(participations__id=Subquery(active_id))))
+        .annotate(
+            **{f"me_active_{f}": F(f"me_active__{f}") for f in _ME_ACTIVE_FIELDS},
+            me_open_payout=Exists(PayoutRequest.objects.filter(user=OuterRef("pk"), status=PayoutStatus.REQUESTED)),
+            **{f"me_score_{b}": leaderboard.score_subquery(b) for b in leaderboard.BOARDS},
+        )
+        .annotate(**{f"me_rank_{b}": leaderboard.rank_subquery(b, OuterRef(f"me_score_{b}")) for b in leaderboard.BOARDS})
+        .first()
+    )
+
+
+def _me_active(user: UserProfile) -> Optional[Participation]:
+    if user.me_active_id is None:
+        return None
+    return Participation(user=user, **{f: getattr(user, f"me_active_{f}") for f in _ME_ACTIVE_FIELDS})
 
 
 @csrf_exempt
@@ -532,7 +646,15 @@ def confirm(request):
 def me(request):
     """
     GET /api/v1/me?telegram_id=...
-    Res: { "user": {...}, "participation": {...|null}, "l1": [...] }
+    Res: { "user": {...}, "participation": {...|null}, "l1": [...], "rank": {board: {rank, score}} }
+
+    Two queries: user with active participation, open payout and ranks
+    (_me_user), then the L1 list. Slot and confirmed-L1 counts are counters
+    on the active participation.
+
+    The serialized body is cached under its ETag (user, me_version and the
+    ranks, which move without writes to the user); a hit costs only the
+    _me_user query and no JSON encoding, If-None-Match gets a 304.
     """
     telegram_id = request.GET.get("telegram_id")
     if not telegram_id:
@@ -543,13 +665,33 @@ def me(request):
     except ValueError:
         return _error_response("validation_error", "telegram_id must be integer")
 
-    user = _get_user_by_telegram_id(telegram_id)
+    user = _me_user(telegram_id)
     if not user:
         return _error_response("not_found", "User not found", 404)
 
-    active = _active_participation(user)
-    confirmed_l1 = _confirmed_l1_count(user)
-    used_slots = _referrer_used_slots(user)
+    rank = {b: {"rank": getattr(user, f"me_rank_{b}"), "score": getattr(user, f"me_score_{b}")} for b in leaderboard.BOARDS}
+    etag = me_cache.etag(user.id, user.me_version, *(rank[b]["rank"] for b in leaderboard.BOARDS))
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        return _me_cache_headers(HttpResponseNotModified(), etag)
+    body = me_cache.get(etag)
+    if body is None:
+        body = _json_response({**_me_payload(user), "rank": rank}).content
+        me_cache.put(etag, body)
+    return _me_cache_headers(HttpResponse(body, content_type="application/json"), etag)
+
+
+def _me_cache_headers(response: HttpResponse, etag: str) -> HttpResponse:
+    response["ETag"] = etag
+    # Браузер перепроверяет ответ каждый раз (If-None-Match → 304)
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def _me_payload(user: UserProfile) -> dict:
+    active = _me_active(user)
+    confirmed_l1 = _confirmed_l1_count(active)
+    used_slots = _referrer_used_slots(active)
+    open_payout = user.me_open_payout
 
     # L1 list
     l1_list = []
@@ -558,20 +700,15 @@ def me(request):
             referrer=user,
             created_at__gt=active.created_at,
         ).select_related("user").order_by("-created_at")[:50]
-
-    for p in l1_qs:
+        for p in l1_qs:
             l1_list.append({
-                    "telegram_id": p.user.telegram_id,
+                "telegram_id": p.user.telegram_id,
                 "username": p.user.username,
                 "paid": p.status == ParticipationStatus.CONFIRMED,
                 "created_at": p.created_at.isoformat(),
             })
 
     # Check payout eligibility
-    open_payout = PayoutRequest.objects.filter(
-        user=user,
-        status=PayoutStatus.REQUESTED
-    ).exists()
     eligible_payout = (
         active is not None and
         active.status == ParticipationStatus.CONFIRMED and
@@ -579,8 +716,8 @@ def me(request):
         not open_payout
     )
 
-    return _json_response({
-                "user": {
+    return {
+        "user": {
             "id": user.id,
             "telegram_id": user.telegram_id,
             "username": user.username,
@@ -588,19 +725,111 @@ def me(request):
             "points": user.points,
         },
         "participation": {
-                        "id": active.id,
-                        "status": active.status,
-                        "created_at": active.created_at.isoformat(),
-                        "confirmed_at": active.confirmed_at.isoformat() if active.confirmed_at else None,
+            "id": active.id,
+            "status": active.status,
+            "created_at": active.created_at.isoformat(),
+            "confirmed_at": active.confirmed_at.isoformat() if active.confirmed_at else None,
         } if active else None,
         "l1": l1_list,
         "slots": {
             "used": used_slots,
-            "limit": 3,
+            "limit": REFERRAL_SLOT_LIMIT,
         },
-                "confirmed_l1": confirmed_l1,
-                "eligible_payout": eligible_payout,
+        "confirmed_l1": confirmed_l1,
+        "eligible_payout": eligible_payout,
         "has_open_payout": open_payout,
+    }
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def tree(request):
+    """
+    GET /api/v1/tree?telegram_id=...&depth=N
+    Res: { "root": {...}, "depth": N, "nodes": [...], "truncated": bool }
+
+    Reads the materialized referral tree (services/referral_tree): root with
+    its node aggregates, then one closure range scan for levels 1..N.
+    team_size / team_volume lag events by the rollup_referral_tree interval.
+    """
+    telegram_id = request.GET.get("telegram_id")
+    if not telegram_id:
+        return _error_response("validation_error", "telegram_id query param required")
+
+    try:
+        telegram_id = int(telegram_id)
+        depth = int(request.GET.get("depth", 1))
+    except ValueError:
+        return _error_response("validation_error", "telegram_id and depth must be integers")
+    if not 1 <= depth <= referral_tree.TREE_MAX_DEPTH:
+        return _error_response("validation_error", f"depth must be 1..{referral_tree.TREE_MAX_DEPTH}")
+
+    user = UserProfile.objects.filter(telegram_id=telegram_id).select_related("referral_node").first()
+    if not user:
+        return _error_response("not_found", "User not found", 404)
+
+    node = getattr(user, "referral_node", None)
+    rows = list(referral_tree.subtree(user.id, depth, referral_tree.TREE_MAX_NODES + 1)) if node else []
+    truncated = len(rows) > referral_tree.TREE_MAX_NODES
+
+    return _json_response({
+        "root": {
+            "telegram_id": user.telegram_id,
+            "username": user.username,
+            "team_size": node.team_size if node else 0,
+            "team_volume": node.team_volume if node else 0,
+        },
+        "depth": depth,
+        "nodes": [_tree_node(r) for r in rows[:referral_tree.TREE_MAX_NODES]],
+        "truncated": truncated,
+    })
+
+
+def _tree_node(row) -> dict:
+    # parent is SET_NULL when the referrer's profile is deleted
+    node = getattr(row.descendant, "referral_node", None)
+    parent = node.parent if node else None
+    return {
+        "telegram_id": row.descendant.telegram_id,
+        "username": row.descendant.username,
+        "parent_telegram_id": parent.telegram_id if parent else None,
+        "depth": row.depth,
+        "team_size": node.team_size if node else 0,
+        "team_volume": node.team_volume if node else 0,
+    }
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def leaderboard_view(request):
+    """
+    GET /api/v1/leaderboard?board=l1|points&page=1&page_size=50
+    Res: { "board": str, "page": int, "page_size": int, "total": int,
+           "has_next": bool, "items": [{"rank", "telegram_id", "username", "score"}] }
+
+    Served from the precomputed leaderboard (services/leaderboard): one
+    index range scan for the page, one read of the score buckets for ranks.
+    """
+    board = request.GET.get("board", leaderboard.L1)
+    if board not in leaderboard.BOARDS:
+        return _error_response("validation_error", f"board must be one of: {', '.join(leaderboard.BOARDS)}")
+
+    try:
+        page = int(request.GET.get("page", 1))
+        page_size = int(request.GET.get("page_size", leaderboard.PAGE_SIZE))
+    except ValueError:
+        return _error_response("validation_error", "page and page_size must be integers")
+    if page < 1 or not 1 <= page_size <= leaderboard.MAX_PAGE_SIZE:
+        return _error_response("validation_error", f"page must be >= 1, page_size 1..{leaderboard.MAX_PAGE_SIZE}")
+
+    result = leaderboard.get_page(board, page, page_size)
+    return _json_response({
+        "board": result.board,
+        "page": result.page,
+        "page_size": result.page_size,
+        "total": result.total,
+        "has_next": result.has_next,
+        "items": result.items,
     })
 
 
@@ -633,7 +862,7 @@ def payout(request):
     if not active or active.status != ParticipationStatus.CONFIRMED:
         return _error_response("not_eligible", "No confirmed participation", 400)
 
-    confirmed_l1 = _confirmed_l1_count(user)
+    confirmed_l1 = _confirmed_l1_count(active)
     if confirmed_l1 < 3:
         return _error_response("not_eligible", f"Need 3 confirmed L1 referrals, have {confirmed_l1}", 400)
 
@@ -642,7 +871,9 @@ def payout(request):
     if existing:
         return _error_response("already_requested", "Payout already requested", 409)
 
-    payout_req = PayoutRequest.objects.create(user=user, status=PayoutStatus.REQUESTED)
+    with transaction.atomic():
+        payout_req = PayoutRequest.objects.create(user=user, status=PayoutStatus.REQUESTED)
+        UserProfile.bump_me_version(user.id)
 
     return _json_response({
         "ok": True,
@@ -697,7 +928,9 @@ def payout_mark(request):
 
     payout_req.status = PayoutStatus.SENT
     payout_req.tx_hash = tx_hash
-    payout_req.save(update_fields=["status", "tx_hash", "updated_at"])
+    with transaction.atomic():
+        payout_req.save(update_fields=["status", "tx_hash", "updated_at"])
+        UserProfile.bump_me_version(payout_req.user_id)
 
     return _json_response({"ok": True, "status": "SENT"})
 
@@ -718,7 +951,7 @@ def jetton_wallet(request):
         return _error_response("server_error", "USDT_JETTON_MASTER not configured", 500)
 
     try:
-        jw = get_jetton_wallet_address(owner_address=owner, jetton_master_address=master)
+        jw = resolve_jetton_wallet(owner_address=owner, jetton_master_address=master)
         return _json_response({"wallet_address": jw})
     except ToncenterError as e:
         return _error_response("toncenter_error", str(e), 502)
@@ -830,7 +1063,7 @@ def payment_build_tx(request):
 
     # Get sender's jetton wallet
     try:
-        sender_jetton_wallet = get_jetton_wallet_address(
+        sender_jetton_wallet = resolve_jetton_wallet(
             owner_address=sender_wallet,
             jetton_master_address=usdt_master
         )
@@ -839,15 +1072,19 @@ def payment_build_tx(request):
 
     comment = f"Soulpull:{participation.id}"
     valid_until = int(timezone.now().timestamp()) + 600
+    # query_id: participation + срок — по нему транзакцию легко найти в эксплорере
+    query_id = ((participation.id & 0xFFFFFFFF) << 32) | (valid_until & 0xFFFFFFFF)
 
-    # Build simplified payload (comment only)
-    # In production, this would be proper TL-B encoded JettonTransfer cell
-    comment_bytes = comment.encode("utf-8")
-    payload_bytes = bytes([0, 0, 0, 0]) + comment_bytes  # op=0 (text comment)
-    payload_b64 = base64.b64encode(payload_bytes).decode("ascii")
+    try:
+        template = get_jetton_transfer_template(receiver_wallet, PAYMENT_USDT_AMOUNT)
+    except TonAddressError:
+        return _error_response("server_error", "RECEIVER_WALLET is not a valid TON address", 500)
+    try:
+        boc = template.render(query_id=query_id, response_destination=sender_wallet, comment=comment)
+    except TonAddressError:
+        return _error_response("validation_error", "Invalid sender_wallet")
+    payload_b64 = base64.b64encode(boc).decode("ascii")
 
-    # For MVP: return simple TON transfer to receiver
-    # Real implementation would build proper JettonTransfer message
     return _json_response({
         "valid_until": valid_until,
         "messages": [
@@ -859,7 +1096,8 @@ def payment_build_tx(request):
         ],
         "meta": {
             "receiver": receiver_wallet,
-            "usdt_amount": "15000000",
+            "usdt_amount": str(PAYMENT_USDT_AMOUNT),
+            "query_id": str(query_id),
             "comment": comment,
             "sender_jetton_wallet": sender_jetton_wallet,
         }
@@ -956,12 +1194,13 @@ def tonproof_verify(request):
             user = _get_user_by_telegram_id(telegram_id)
             if user:
                 # Check wallet not used by another
-                existing = UserProfile.objects.filter(wallet=wallet_address).exclude(id=user.id).first()
+                existing = _wallet_owner_qs(wallet_address).exclude(id=user.id).first()
                 if existing:
                     RiskEvent.objects.create(user=user, kind=RiskEventKind.WALLET_REUSED, meta={"wallet": wallet_address})
                     return _error_response("wallet_reused", "Wallet linked to another user", 409)
                 user.wallet = wallet_address
                 user.save(update_fields=["wallet", "updated_at"])
+                warm_jetton_wallet(wallet_address)
         except (TypeError, ValueError):
             pass
 
@@ -1045,11 +1284,38 @@ def admin_payouts_open(request):
 # Конфигурация из .env
 PAYMENT_RECEIVER_TON = os.getenv("PAYMENT_RECEIVER_TON", "")
 PAYMENT_TON_AMOUNT_NANO = int(os.getenv("PAYMENT_TON_AMOUNT_NANO", "100000000"))  # 0.1 TON default
+# 1 = проверять оплату прямо в status view (если воркер ingest_payments не запущен)
+PAYMENT_INLINE_VERIFY = os.getenv("PAYMENT_INLINE_VERIFY", "0") == "1"
+# Запас на расхождение часов сервера и блокчейна при поиске платежа по времени
+PAYMENT_CLOCK_SKEW_SECONDS = 60
+# Long-poll / SSE статуса заказа
+PAYMENT_EVENTS_MAX_WAIT = float(os.getenv("PAYMENT_EVENTS_MAX_WAIT", "30"))
+# Ожидание читает только строку заказа из БД; оплату отмечают ingest_payments/webhook
+PAYMENT_EVENTS_POLL_INTERVAL = float(os.getenv("PAYMENT_EVENTS_POLL_INTERVAL", "3"))
+PAYMENT_EVENTS_STREAM_TTL = float(os.getenv("PAYMENT_EVENTS_STREAM_TTL", "300"))
+
+
+def _async_endpoint(*methods: str):
+    """
+    require_http_methods + csrf_exempt для async views.
 
+    Декораторы Django 4.2 оборачивают view в sync функцию, и handler
+    выполнял бы async view в потоке; здесь обёртка остаётся корутиной.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+            return await view(request, *args, **kwargs)
 
-@csrf_exempt
-@require_http_methods(["POST"])
-def payment_create_order(request):
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+@_async_endpoint("POST")
+async def payment_create_order(request):
     """
     POST /api/v1/payments/create
     Req: { "wallet_address": "UQ...", "telegram_id": int }
@@ -1074,23 +1340,24 @@ def payment_create_order(request):
     user = None
     participation = None
     if telegram_id:
-        user = UserProfile.objects.filter(telegram_id=telegram_id).first()
+        user = await UserProfile.objects.filter(telegram_id=telegram_id).afirst()
         if user:
             # Найти активное участие
-            participation = Participation.objects.filter(
+            participation = await Participation.objects.filter(
                 user=user,
                 status__in=[ParticipationStatus.NEW, ParticipationStatus.PENDING]
-            ).first()
+            ).afirst()
     
     # Создаём заказ
     public_id = PaymentOrder.new_public_id()
     comment = f"SP:{public_id}"  # Уникальный комментарий для идентификации
     
-    order = PaymentOrder.objects.create(
+    order = await PaymentOrder.objects.acreate(
         public_id=public_id,
         user=user,
         participation=participation,
         wallet_address=wallet_address,
+        receiver_address=PAYMENT_RECEIVER_TON,
         amount_nano=PAYMENT_TON_AMOUNT_NANO,
         comment=comment,
         status=PaymentOrderStatus.PENDING,
@@ -1122,63 +1389,138 @@ def payment_create_order(request):
     }, status=201)
 
 
-@csrf_exempt
-@require_http_methods(["GET"])
-def payment_order_status(request, order_id: str):
+async def _order_status_payload(order_id: str, *, verify: bool = True) -> Optional[dict]:
     """
-    GET /api/v1/payments/<order_id>/status
-    Res: { "ok": true, "status": "pending|paid|expired" }
-    
-    Проверяет статус заказа. Если pending — проверяет через TonAPI.
+    Текущий статус заказа (None — заказ не найден).
+
+    Оплату отмечает воркер ingest_payments; при PAYMENT_INLINE_VERIFY=1 и
+    verify=True pending заказ дополнительно проверяется через TonAPI (async
+    клиент). Циклы ожидания передают verify=False — каждый опрос стоит
+    одного SELECT, а не запроса в TonAPI.
     """
-    try:
-        order = PaymentOrder.objects.get(public_id=order_id)
-    except PaymentOrder.DoesNotExist:
-        return _error_response("not_found", "Order not found", 404)
-    
+    order = await PaymentOrder.objects.select_related("participation").filter(public_id=order_id).afirst()
+    if order is None:
+        return None
+
     # Уже оплачен
     if order.status == PaymentOrderStatus.PAID:
-        return _json_response({
+        return {
             "ok": True,
             "status": "paid",
             "paid_at": order.paid_at.isoformat() if order.paid_at else None,
-        })
-    
-    # Истёк
+        }
+
+    # Истёк. Статус в БД меняем только после LATE_PAYMENT_GRACE_SECONDS:
+    # до этого ингестер ещё может засчитать перевод, отправленный вовремя
     if order.is_expired():
-        if order.status != PaymentOrderStatus.EXPIRED:
+        grace = timezone.timedelta(seconds=LATE_PAYMENT_GRACE_SECONDS)
+        if order.status != PaymentOrderStatus.EXPIRED and timezone.now() >= order.deadline() + grace:
             order.status = PaymentOrderStatus.EXPIRED
-            order.save(update_fields=["status"])
-        return _json_response({"ok": True, "status": "expired"})
-    
-    # Проверяем через TonAPI
-    if PAYMENT_RECEIVER_TON and order.wallet_address:
+            await order.asave(update_fields=["status"])
+        return {"ok": True, "status": "expired"}
+
+    # Проверяем через TonAPI (только в inline режиме)
+    if verify and PAYMENT_INLINE_VERIFY and PAYMENT_RECEIVER_TON and order.wallet_address:
         try:
-            hit = verify_payment(
+            hit = await averify_payment(
                 receiver_address=PAYMENT_RECEIVER_TON,
                 sender_address=order.wallet_address,
                 amount_nano=order.amount_nano,
                 order_id=order.public_id,  # Ищем комментарий SP:<order_id>
+                since=int(order.created_at.timestamp()) - PAYMENT_CLOCK_SKEW_SECONDS,
             )
-            
+
             if hit:
                 logger.info(f"[Payment] Order {order_id} paid! event_id={hit.get('event_id')}")
-                order.mark_paid(
+                await sync_to_async(order.mark_paid)(
                     event_id=hit.get("event_id", ""),
                     tx_hash=hit.get("tx_hash", ""),
                 )
-                return _json_response({
+                return {
                     "ok": True,
                     "status": "paid",
                     "paid_at": order.paid_at.isoformat() if order.paid_at else None,
                     "tx_hash": hit.get("tx_hash", ""),
-                })
-                
+                }
+
         except TonApiError as e:
             logger.warning(f"[Payment] TonAPI check failed: {e}")
             # Не фейлим — просто возвращаем pending
-    
-    return _json_response({"ok": True, "status": "pending"})
+
+    return {"ok": True, "status": "pending"}
+
+
+@_async_endpoint("GET")
+async def payment_order_status(request, order_id: str):
+    """
+    GET /api/v1/payments/<order_id>/status
+    Res: { "ok": true, "status": "pending|paid|expired" }
+    """
+    payload = await _order_status_payload(order_id)
+    if payload is None:
+        return _error_response("not_found", "Order not found", 404)
+    return _json_response(payload)
+
+
+@_async_endpoint("GET")
+async def payment_order_events(request, order_id: str):
+    """
+    GET /api/v1/payments/<order_id>/events?wait=25
+    Res: { "ok": true, "status": "pending|paid|expired" }
+
+    Long-poll: держит соединение до перехода заказа в paid/expired или до
+    wait секунд (максимум PAYMENT_EVENTS_MAX_WAIT). С заголовком
+    Accept: text/event-stream отдаёт Server-Sent Events (event: status)
+    и закрывает поток на финальном статусе.
+
+    Inline проверка TonAPI (PAYMENT_INLINE_VERIFY) делается один раз на
+    входе; дальше раз в PAYMENT_EVENTS_POLL_INTERVAL читается только БД.
+
+    Async view: под ASGI (backend.asgi) ожидающие клиенты не занимают воркеры.
+    Под WSGI (runserver, gunicorn sync/gthread) каждое открытое соединение
+    держит поток воркера до wait секунд (SSE — до PAYMENT_EVENTS_STREAM_TTL).
+    """
+    payload = await _order_status_payload(order_id)
+    if payload is None:
+        return _error_response("not_found", "Order not found", 404)
+
+    if "text/event-stream" in request.headers.get("Accept", ""):
+        response = StreamingHttpResponse(
+            _order_status_stream(order_id, payload),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # nginx: не буферизовать поток
+        return response
+
+    try:
+        wait = float(request.GET.get("wait") or 0)
+    except ValueError:
+        return _error_response("validation_error", "wait must be a number")
+    deadline = time.monotonic() + max(0.0, min(wait, PAYMENT_EVENTS_MAX_WAIT))
+
+    while payload["status"] == "pending" and time.monotonic() < deadline:
+        await asyncio.sleep(min(PAYMENT_EVENTS_POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+        payload = await _order_status_payload(order_id, verify=False) or payload
+
+    return _json_response(payload)
+
+
+async def _order_status_stream(order_id: str, payload: dict):
+    """SSE поток статусов заказа; keep-alive комментарий раз в ~15 секунд."""
+    yield f"event: status\ndata: {json.dumps(payload)}\n\n"
+    deadline = time.monotonic() + PAYMENT_EVENTS_STREAM_TTL
+    last_sent = time.monotonic()
+    while payload["status"] == "pending" and time.monotonic() < deadline:
+        await asyncio.sleep(PAYMENT_EVENTS_POLL_INTERVAL)
+        current = await _order_status_payload(order_id, verify=False) or payload
+        if current["status"] != payload["status"]:
+            payload = current
+            yield f"event: status\ndata: {json.dumps(payload)}\n\n"
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= 15:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
 
 
 @csrf_exempt
@@ -1220,3 +1562,52 @@ def payment_manual_confirm(request):
     logger.info(f"[Payment] Order {order_id} manually confirmed")
     
     return _json_response({"ok": True})
+
+
+# ============================================================================
+# WEBHOOKS
+# ============================================================================
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def tonapi_webhook(request):
+    """
+    POST /api/v1/webhooks/tonapi
+    Headers: X-Tonapi-Signature: <hex HMAC-SHA256 тела>
+    Req: { "account_id": "0:...", "lt": int, "tx_hash": "..." }
+    Res: { "ok": true, "event_id": "...", "duplicate": bool, "in_progress": bool, "paid": [order_id, ...] }
+
+    Push-уведомления TonAPI о транзакциях получателя: оплата подтверждается
+    сразу, без поллинга. Событие in_progress не записывается — его подберёт
+    ингестер.
+    """
+    secret = webhook_secret()
+    if not secret:
+        return _error_response("not_configured", "TONAPI_WEBHOOK_SECRET not configured", 503)
+    if not payment_receiver_address():
+        # 5xx — уведомление не отмечено обработанным, TonAPI повторит доставку
+        return _error_response("not_configured", "PAYMENT_RECEIVER_TON not configured", 503)
+    if not verify_signature(secret, request.body, request.headers.get(WEBHOOK_SIGNATURE_HEADER)):
+        return _error_response("forbidden", "Bad webhook signature", 403)
+
+    body, err = _parse_json_body(request)
+    if err:
+        return err
+
+    try:
+        result = handle_account_tx(body)
+    except WebhookError as e:
+        return _error_response("validation_error", str(e))
+    except TonApiError as e:
+        logger.warning(f"[Webhook] event fetch failed: {e}")
+        # 5xx — TonAPI повторит доставку
+        return _error_response("tonapi_error", str(e), 502)
+
+    return _json_response({
+        "ok": True,
+        "event_id": result.event_id,
+        "duplicate": result.duplicate,
+        "in_progress": result.in_progress,
+        "paid": result.paid,
+    })
+
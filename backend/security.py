@@ -18,18 +18,34 @@ TonConnect требует доступ к:
 
 import os
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
 
 class SecurityHeadersMiddleware:
     """
     Add security headers to all responses.
+
+    Поддерживает и sync, и async цепочку: под ASGI async views
+    (long-poll статуса оплаты) не должны уходить в sync поток из-за middleware.
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        response = self.get_response(request)
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._add_headers(self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._add_headers(await self.get_response(request))
 
+    def _add_headers(self, response):
         # CSP - МАКСИМАЛЬНО разрешающий для TonConnect
         # TonConnect использует несколько bridge серверов и загружает иконки кошельков
         csp_parts = [
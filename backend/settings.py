@@ -92,11 +92,35 @@ ASGI_APPLICATION = "backend.asgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": os.getenv("SQLITE_PATH") or BASE_DIR / "db.sqlite3",
     }
 }
 
 
+# CACHE
+# /me (api/services/me_cache) кэширует готовые ответы — кэш должен быть общим
+# для всех воркеров: LocMemCache у каждого процесса свой. REDIS_URL → Redis
+# (pip install redis), иначе файловый кэш на хосте (CACHE_DIR).
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_DIR") or BASE_DIR / ".cache" / "django",
+            # По умолчанию 300 записей: тела /me всех активных пользователей
+            # не поместились бы, и кэш вычищал бы сам себя на каждой записи.
+            # Для большой базы пользователей — REDIS_URL
+            "OPTIONS": {"MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "100000"))},
+        }
+    }
+
+
 # Auth token TTL (24 hours)
 AUTH_TOKEN_TTL_SECONDS = int(os.getenv("AUTH_TOKEN_TTL_SECONDS", 86400))
 
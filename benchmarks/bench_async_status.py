@@ -0,0 +1,188 @@
+"""
+Benchmark: GET /payments/<id>/status — WSGI (gunicorn gthread) vs ASGI (uvicorn worker).
+
+Оба сервера — один процесс, PAYMENT_INLINE_VERIFY=1 и SWR кэш выключен,
+так что каждый опрос ждёт локальную заглушку TonAPI (--latency секунд).
+C поллеров крутят свой заказ --duration секунд; под WSGI одновременно
+ждать TonAPI могут только --threads потоков, под ASGI — все корутины.
+
+    python benchmarks/bench_async_status.py [--pollers 100 1000] [--threads 8] [--latency 0.2]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RECEIVER = "UQDxxCX7_5aISQzEaoPPGW69MblWkFW8mSuHgQzuSXhvZvOc"
+SENDER = "UQBvW8Z5huBkMJYdnfAEM5JqTNkuWX3diqYENkWsIL0XggGG"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_stub(port: int, latency: float) -> None:
+    """Заглушка TonAPI: пустая страница событий через latency секунд."""
+    import uvicorn
+
+    body = json.dumps({"events": [], "next_from": 0}).encode()
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        await asyncio.sleep(latency)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+
+
+def prepare_db(path: str, n_orders: int) -> list[str]:
+    os.environ["SQLITE_PATH"] = path
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+    sys.path.insert(0, ROOT)
+
+    import django
+    from django.core.management import call_command
+    from django.utils import timezone
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+
+    from api.models import PaymentOrder
+
+    now = timezone.now()
+    orders = []
+    for _ in range(n_orders):
+        public_id = PaymentOrder.new_public_id()
+        orders.append(PaymentOrder(
+            public_id=public_id,
+            wallet_address=SENDER,
+            receiver_address=RECEIVER,
+            amount_nano=100_000_000,
+            comment=f"SP:{public_id}",
+            expires_at=now + timezone.timedelta(hours=1),
+        ))
+    PaymentOrder.objects.bulk_create(orders)
+    return [o.public_id for o in orders]
+
+
+def _wait_port(port: int, timeout: float = 20) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"port {port} did not open")
+
+
+def start_server(kind: str, port: int, env: dict, threads: int) -> subprocess.Popen:
+    if kind == "wsgi":
+        cmd = ["gunicorn", "backend.wsgi:application", "-k", "gthread", "--threads", str(threads)]
+    else:
+        cmd = ["gunicorn", "backend.asgi:application", "-k", "uvicorn.workers.UvicornWorker"]
+    cmd += ["--bind", f"127.0.0.1:{port}", "--workers", "1", "--timeout", "120", "--backlog", "4096", "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    _wait_port(port)
+    return proc
+
+
+async def load(port: int, order_ids: list[str], pollers: int, duration: float) -> dict:
+    import httpx
+
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def poller(client: httpx.AsyncClient, order_id: str) -> None:
+        nonlocal errors
+        url = f"http://127.0.0.1:{port}/api/v1/payments/{order_id}/status"
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                r = await client.get(url)
+                if r.status_code != 200 or r.json().get("status") != "pending":
+                    errors += 1
+                    continue
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.monotonic() - started)
+
+    limits = httpx.Limits(max_connections=pollers, max_keepalive_connections=pollers)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        await asyncio.gather(*(poller(client, order_ids[i % len(order_ids)]) for i in range(pollers)))
+
+    latencies.sort()
+    n = len(latencies)
+    return {
+        "rps": n / duration,
+        "p50": latencies[n // 2] if n else 0.0,
+        "p99": latencies[min(n - 1, int(n * 0.99))] if n else 0.0,
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pollers", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--threads", type=int, default=8, help="gthread threads of the WSGI worker")
+    parser.add_argument("--latency", type=float, default=0.2, help="TonAPI stub latency, seconds")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--serve-stub", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_stub:
+        serve_stub(args.serve_stub, args.latency)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.sqlite3")
+        order_ids = prepare_db(db_path, max(args.pollers))
+
+        stub_port = _free_port()
+        stub = subprocess.Popen([sys.executable, __file__, "--serve-stub", str(stub_port), "--latency", str(args.latency)])
+        env = {
+            **os.environ,
+            "SQLITE_PATH": db_path,
+            "TONAPI_BASE_URL": f"http://127.0.0.1:{stub_port}",
+            "PAYMENT_INLINE_VERIFY": "1",
+            "PAYMENT_RECEIVER_TON": RECEIVER,
+            "TONAPI_EVENTS_CACHE_TTL": "0",
+            "TONAPI_SINGLEFLIGHT_DIR": "",
+            "HTTP_POOL_MAXSIZE": "256",
+            "DEBUG": "0",
+        }
+        try:
+            _wait_port(stub_port)
+            for kind in ("wsgi", "asgi"):
+                port = _free_port()
+                server = start_server(kind, port, env, args.threads)
+                try:
+                    for pollers in args.pollers:
+                        r = asyncio.run(load(port, order_ids, pollers, args.duration))
+                        print(
+                            f"{kind}  pollers={pollers:>5}  rps={r['rps']:8.1f}  "
+                            f"p50={r['p50'] * 1000:8.1f} ms  p99={r['p99'] * 1000:8.1f} ms  errors={r['errors']}"
+                        )
+                finally:
+                    server.terminate()
+                    server.wait()
+        finally:
+            stub.terminate()
+            stub.wait()
+
+
+if __name__ == "__main__":
+    main()
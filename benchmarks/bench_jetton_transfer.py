@@ -0,0 +1,82 @@
+"""
+Benchmark: JettonTransfer payload — Builder + to_boc vs precompiled template.
+
+Каждый payload с новым query_id, адресом для сдачи и комментарием, как в
+payment_build_tx. Цель: > 50k payloads/s на ядро для шаблона.
+
+    python benchmarks/bench_jetton_transfer.py [--n 200000] [--senders 1000]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from api.services.jetton_transfer import get_template, jetton_transfer_boc  # noqa: E402
+from api.services.ton_address import TonAddress, parse_address  # noqa: E402
+
+RECEIVER = "UQDxxCX7_5aISQzEaoPPGW69MblWkFW8mSuHgQzuSXhvZvOc"
+AMOUNT = 15_000_000
+
+
+def _senders(n: int) -> list[str]:
+    return [
+        TonAddress(0, hashlib.sha256(f"sender-{i}".encode()).digest()).to_friendly(bounceable=False)
+        for i in range(n)
+    ]
+
+
+def bench(n: int, senders: list[str]) -> None:
+    receiver = parse_address(RECEIVER)
+    template = get_template(RECEIVER, AMOUNT)
+
+    # Builder проверяем на меньшей выборке — он заметно медленнее
+    n_builder = max(1, n // 10)
+    t0 = time.perf_counter()
+    for i in range(n_builder):
+        jetton_transfer_boc(
+            query_id=i,
+            jetton_amount=AMOUNT,
+            destination=receiver,
+            response_destination=parse_address(senders[i % len(senders)]),
+            comment=f"Soulpull:{i}",
+        )
+    t_builder = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for i in range(n):
+        template.render(query_id=i, response_destination=senders[i % len(senders)], comment=f"Soulpull:{i}")
+    t_template = time.perf_counter() - t0
+
+    sample = senders[0]
+    assert template.render(query_id=7, response_destination=sample, comment="Soulpull:7") == jetton_transfer_boc(
+        query_id=7, jetton_amount=AMOUNT, destination=receiver,
+        response_destination=parse_address(sample), comment="Soulpull:7",
+    )
+
+    builder_rate = n_builder / t_builder
+    template_rate = n / t_template
+    print(
+        f"builder={builder_rate:>10,.0f} payloads/s  template={template_rate:>10,.0f} payloads/s  "
+        f"({template_rate / builder_rate:.1f}x, {1e6 / template_rate:.2f} us/payload)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=200_000)
+    parser.add_argument("--senders", type=int, default=1000)
+    args = parser.parse_args()
+    bench(args.n, _senders(args.senders))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Stress: N параллельных POST /api/v1/intent к одному рефереру (лимит 3/3).
+
+Временная файловая SQLite (как в проде, не shared-cache :memory: тестов),
+N потоков стартуют через barrier и идут через WSGI handler (django.test.Client).
+Ровно 3 intent должны получить 201, остальные — 409 referrer_limit,
+used_slots реферера — 3. Печатает распределение ответов и intents/s.
+
+    python benchmarks/bench_slot_reservation.py [--parallel 200] [--json]
+
+Exit code 1, если инвариант нарушен.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REFERRER_TID = 1_000_000
+
+
+def setup_django(db_path: str) -> None:
+    os.environ["SQLITE_PATH"] = db_path
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+    sys.path.insert(0, ROOT)
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+
+
+def prepare(parallel: int) -> int:
+    from api.models import Participation, ParticipationStatus, UserProfile
+
+    referrer = UserProfile.objects.create(telegram_id=REFERRER_TID)
+    holder = Participation.objects.create(user=referrer, status=ParticipationStatus.CONFIRMED)
+    UserProfile.objects.bulk_create([UserProfile(telegram_id=REFERRER_TID + 1 + i) for i in range(parallel)])
+    return holder.id
+
+
+def fire(parallel: int) -> tuple[Counter, float]:
+    from django.db import connection
+    from django.test import Client
+
+    barrier = threading.Barrier(parallel)
+    results: list = []
+
+    def worker(tid: int) -> None:
+        try:
+            client = Client(raise_request_exception=False, HTTP_HOST="localhost")
+            barrier.wait()
+            r = client.post(
+                "/api/v1/intent",
+                data=json.dumps({"telegram_id": tid, "referrer_telegram_id": REFERRER_TID}),
+                content_type="application/json",
+            )
+            error = r.json().get("error") if r["Content-Type"] == "application/json" else None
+            results.append(f"{r.status_code} {error or ''}".strip())
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(REFERRER_TID + 1 + i,)) for i in range(parallel)]
+    for t in threads:
+        t.start()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    return Counter(results), time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--parallel", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="print one JSON line")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(os.path.join(tmp, "bench.sqlite3"))
+        holder_id = prepare(args.parallel)
+        responses, elapsed = fire(args.parallel)
+
+        from api.models import Participation
+
+        holder = Participation.objects.get(id=holder_id)
+        report = {
+            "parallel": args.parallel,
+            "responses": dict(responses),
+            "used_slots": holder.used_slots,
+            "referrals": Participation.objects.filter(referrer_id=holder.user_id).count(),
+            "seconds": round(elapsed, 3),
+            "intents_per_s": round(args.parallel / elapsed, 1),
+        }
+
+    ok = (
+        responses == Counter({"201": 3, "409 referrer_limit": args.parallel - 3})
+        and report["used_slots"] == report["referrals"] == 3
+    )
+    if args.json:
+        print(json.dumps({**report, "ok": ok}))
+    else:
+        for k, v in sorted(report["responses"].items()):
+            print(f"{k:<24} {v}")
+        print(
+            f"used_slots={report['used_slots']} referrals={report['referrals']}  "
+            f"{report['seconds']}s  {report['intents_per_s']} intents/s  {'OK' if ok else 'FAIL'}"
+        )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: per-order find_ton_transfer_event vs TransferIndex.
+
+Synthetic TonAPI events page (10k events) and K pending orders; half of
+the orders have a matching transfer somewhere on the page.
+
+    python benchmarks/bench_tonapi_match.py [--events 10000] [--orders 50 200]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from api.services.tonapi import TransferIndex, find_ton_transfer_event  # noqa: E402
+
+RECEIVER = "UQDxxCX7_5aISQzEaoPPGW69MblWkFW8mSuHgQzuSXhvZvOc"
+AMOUNT = 100_000_000
+
+
+def _wallet(i: int) -> str:
+    return f"UQ{i:046d}"
+
+
+def make_page(n_events: int, orders: list[tuple[str, str]]) -> dict:
+    rnd = random.Random(42)
+    events = []
+    for i in range(n_events):
+        sender, comment = _wallet(1_000_000 + i), f"random {i}"
+        events.append({
+            "event_id": f"ev{i}",
+            "lt": 10_000_000 + i,
+            "timestamp": 1_700_000_000 + i,
+            "actions": [
+                {"type": "ContractDeploy", "ContractDeploy": {}},
+                {
+                    "type": "TonTransfer",
+                    "TonTransfer": {
+                        "sender": {"address": sender},
+                        "recipient": {"address": RECEIVER},
+                        "amount": AMOUNT,
+                        "comment": comment,
+                    },
+                },
+            ],
+        })
+    # Оплаченные заказы (каждый второй) раскиданы по странице
+    for sender, comment in orders[::2]:
+        ev = events[rnd.randrange(n_events)]
+        ev["actions"][1]["TonTransfer"].update({"sender": {"address": sender}, "comment": comment})
+    return {"events": events}
+
+
+def bench(n_events: int, n_orders: int) -> None:
+    orders = [(_wallet(k), f"SP:{k:020x}") for k in range(n_orders)]
+    page = make_page(n_events, orders)
+
+    t0 = time.perf_counter()
+    old_hits = sum(
+        1 for sender, comment in orders
+        if find_ton_transfer_event(page, receiver=RECEIVER, sender=sender, amount_nano=AMOUNT, comment_contains=comment)
+    )
+    t_old = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    index = TransferIndex.from_events(page, receiver=RECEIVER)
+    new_hits = sum(
+        1 for sender, comment in orders
+        if index.match(sender=sender, amount_nano=AMOUNT, comment=comment)
+    )
+    t_new = time.perf_counter() - t0
+
+    assert old_hits == new_hits, (old_hits, new_hits)
+    print(
+        f"events={n_events:>6} orders={n_orders:>4} matched={new_hits:>4}  "
+        f"old={t_old * 1000:9.1f} ms  index={t_new * 1000:7.1f} ms  speedup={t_old / t_new:6.1f}x"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=10_000)
+    parser.add_argument("--orders", type=int, nargs="+", default=[1, 10, 50, 200])
+    args = parser.parse_args()
+    for k in args.orders:
+        bench(args.events, k)
+
+
+if __name__ == "__main__":
+    main()
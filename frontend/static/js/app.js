@@ -478,20 +478,21 @@
   }
 
   /**
-   * Поллинг статуса оплаты через backend (который проверяет TonAPI)
+   * Ожидание оплаты через long-poll: backend держит запрос до смены статуса
+   * заказа (paid/expired) или до wait секунд, затем запрос повторяется.
    * @param {string} orderId - ID заказа
-   * @param {number} maxAttempts - максимум попыток (по умолчанию 40 = ~2 минуты)
-   * @param {number} intervalMs - интервал между попытками (по умолчанию 3 секунды)
+   * @param {number} timeoutMs - сколько всего ждать (по умолчанию ~2 минуты)
+   * @param {number} waitSec - сколько backend держит один запрос
    * @returns {Promise<boolean>} - true если оплачено
    */
-  async function pollPaymentStatus(orderId, maxAttempts = 40, intervalMs = 3000) {
-    console.log(`[Payment] Starting poll for order ${orderId}...`);
+  async function pollPaymentStatus(orderId, timeoutMs = 120000, waitSec = 25) {
+    console.log(`[Payment] Waiting for order ${orderId}...`);
+    const deadline = Date.now() + timeoutMs;
     
-    for (let i = 0; i < maxAttempts; i++) {
+    while (Date.now() < deadline) {
+      const wait = Math.max(1, Math.min(waitSec, Math.ceil((deadline - Date.now()) / 1000)));
       try {
-        console.log(`[Payment] Poll attempt ${i + 1}/${maxAttempts}...`);
-        
-        const response = await api(`/payments/${orderId}/status`);
+        const response = await api(`/payments/${orderId}/events?wait=${wait}`);
         
         console.log(`[Payment] Status response:`, response);
         
@@ -505,13 +506,10 @@
           return false;
         }
         
-        // Ждём перед следующей попыткой
-        await sleep(intervalMs);
-        
       } catch (err) {
         console.warn(`[Payment] Poll error:`, err);
-        // Продолжаем поллить даже при ошибках
-        await sleep(intervalMs);
+        // Продолжаем ждать даже при ошибках, но не долбим сервер
+        await sleep(3000);
       }
     }
     